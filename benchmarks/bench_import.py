@@ -0,0 +1,88 @@
+"""
+Benchmark the time taken to import estuarial in a fresh interpreter.
+
+    python benchmarks/bench_import.py [--repeat 10] [module ...]
+
+Each import runs in its own subprocess with an empty scratch home directory.
+Reported are the median and best wall time of the import, the time of
+importing the third-party dependencies alone (which estuarial cannot avoid),
+the number of modules loaded, and whether the import wrote anything to the
+home directory, which it should not.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+MODULES = ["estuarial",
+           "estuarial.query.trqad",
+           "estuarial.query.raw_query",
+           "estuarial.browse.market_index",
+           "estuarial.data.query_handler"]
+
+# Third-party packages imported by estuarial's modules.
+DEPENDENCIES = ["numpy", "pandas", "sqlalchemy", "sqlalchemy.orm", "yaml",
+                "dateutil.parser", "six"]
+
+_SCRIPT = """
+import sys, json
+from timeit import default_timer
+start = default_timer()
+for module in {modules!r}:
+    __import__(module)
+print(json.dumps([default_timer() - start, len(sys.modules)]))
+"""
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(modules):
+    """
+    Import modules in a fresh interpreter with an empty home directory.
+
+    Returns
+    -------
+    (seconds, number of modules loaded, files written to the home directory)
+    """
+    home = tempfile.mkdtemp(prefix="estuarial-import-")
+    environment = dict(os.environ, HOME=home, USERPROFILE=home)
+    environment["PYTHONPATH"] = os.pathsep.join(
+        [_ROOT] + [path for path in [os.environ.get("PYTHONPATH")] if path])
+    try:
+        output = subprocess.check_output(
+            [sys.executable, "-c", _SCRIPT.format(modules=modules)],
+            env=environment, cwd=home)
+        seconds, loaded = json.loads(output.decode("ascii").splitlines()[-1])
+        written = sum(len(dirs) + len(files)
+                      for _, dirs, files in os.walk(home))
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    return seconds, loaded, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    print("{:<36} {:>10} {:>10} {:>8} {:>8}".format(
+        "module", "median ms", "best ms", "modules", "written"))
+    for name, modules in ([("(dependencies)", DEPENDENCIES)] +
+                          [(module, [module]) for module in args.modules]):
+        runs = [time_import(modules) for _ in range(args.repeat)]
+        seconds = np.array([run[0] for run in runs])
+        print("{:<36} {:>10.1f} {:>10.1f} {:>8} {:>8}".format(
+            name, 1000 * np.median(seconds), 1000 * seconds.min(),
+            runs[-1][1], max(run[2] for run in runs)))
+
+if __name__ == "__main__":
+    main()
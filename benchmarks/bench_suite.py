@@ -0,0 +1,250 @@
+"""
+Benchmark the main Estuarial entry points against a synthetic SQLite
+stand-in for the TR QAD database (see `qad_sqlite.py`).
+
+    python benchmarks/bench_suite.py [--scale 1] [--repeat 20]
+                                     [--only NAME] [--no-cache] [--phases]
+                                     [--json results.json]
+
+Everything runs in a scratch home directory, so the local caches start
+empty and ~/.estuarial is left alone. The first call of each benchmark is
+reported separately as the cold latency; the percentiles cover every call,
+so with the caches on they mostly measure the cached path. Use --no-cache to
+time the database path on every call. --phases adds a breakdown of each
+query into client construction, SQL compilation, execution, fetching,
+DataFrame construction and cache lookups (see
+`estuarial.util.instrumentation`). --json writes the results together
+with the current git commit so runs can be compared across commits.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+    import resource
+
+import qad_sqlite
+
+_INI = """[ESTUARIAL]
+ResultCache = {cache}
+IntervalCache = {cache}
+"""
+
+
+class MemoryPeak(object):
+    """
+    Peak memory in MB while the block runs: the traced Python allocations
+    where `tracemalloc` exists, and otherwise the growth of the process's
+    maximum resident set size (0 once an earlier benchmark reached it).
+    """
+
+    def __enter__(self):
+        if tracemalloc is not None:
+            tracemalloc.start()
+        else:
+            self._start = self._max_rss()
+        self.peak = 0.0
+        return self
+
+    @staticmethod
+    def _max_rss():
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on OS X.
+        return usage / 1024.0 if sys.platform != "darwin" else usage / 2**20
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if tracemalloc is not None:
+            self.peak = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        else:
+            self.peak = self._max_rss() - self._start
+
+
+def run_benchmark(function, repeat):
+    """
+    Call function repeat times, returning the latencies in seconds, the
+    rows of its last result, and the peak memory in MB.
+    """
+    latencies = []
+    rows = 0
+    with MemoryPeak() as memory:
+        for _ in range(repeat):
+            start = default_timer()
+            result = function()
+            latencies.append(default_timer() - start)
+            rows = len(result) if hasattr(result, "__len__") else 0
+    return latencies, rows, memory.peak
+
+
+def summarize(name, latencies, rows, peak):
+    """
+    Return the reported statistics of one benchmark.
+    """
+    latencies = np.asarray(latencies)
+    total = latencies.sum()
+    return {"name": name,
+            "calls": len(latencies),
+            "rows": rows,
+            "calls_per_s": len(latencies) / total if total else float("inf"),
+            "rows_per_s": rows * len(latencies) / total if total else 0.0,
+            "cold_ms": 1000 * latencies[0],
+            "p50_ms": 1000 * np.percentile(latencies, 50),
+            "p90_ms": 1000 * np.percentile(latencies, 90),
+            "p99_ms": 1000 * np.percentile(latencies, 99),
+            "peak_mb": peak}
+
+
+def benchmarks(scale):
+    """
+    Return (name, zero-argument callable) pairs for the entry points. The
+    imports happen here, once the registry builds clients on the stand-in.
+    """
+    from estuarial.util.munging import worldscope_align
+    from estuarial.test.mocking.worldscope_frames import make_worldscope_frame
+    from estuarial.query.trqad import TRQAD
+    from estuarial.query.raw_query import RAW_QUERY
+    from estuarial.browse.market_index import MarketIndex
+    from estuarial.browse.universe_builder import UniverseBuilder
+
+    universe = list(range(1, min(100, int(scale * 500)) + 1))
+    fiscal = ("2005-01-01", "2012-12-31")
+    prices = ("2010-01-01", "2010-12-31")
+    month_end = "2010-06-30"
+
+    trqad = TRQAD()
+    raw = RAW_QUERY()
+    market_index = MarketIndex()
+    queries = market_index._constituent_queries
+    frame = make_worldscope_frame(int(scale * 10**5))
+
+    return [
+        ("QueryHandler.dowjones_universe",
+         lambda: queries.dowjones_universe(
+             date__between=(month_end, month_end), iticker="DJX_IDX",
+             use_cache=False)),
+        ("MarketIndex.constituents",
+         lambda: market_index.constituents("S&P 500", month_end, month_end)),
+        ("TRQAD.fundamentals",
+         lambda: trqad.fundamentals(universe, [2001, 1751], fiscal,
+                                    "WORLDSCOPE")),
+        ("TRQAD.datastream",
+         lambda: trqad.datastream(universe, prices)),
+        ("UniverseBuilder.us", UniverseBuilder.us),
+        ("RAW_QUERY.raw_query",
+         lambda: raw.raw_query("select * from wsndata where item = 2001")),
+        ("worldscope_align", lambda: worldscope_align(frame.copy())),
+    ]
+
+
+def git_commit():
+    """
+    Return the current git commit of the repository, or None.
+    """
+    try:
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        return output.decode("ascii").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=float, default=1,
+                        help="Securities in units of {}.".format(
+                            qad_sqlite.SECURITIES_PER_SCALE))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", action="append",
+                        help="Run only the named benchmark (repeatable).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Turn off the result and interval caches.")
+    parser.add_argument("--phases", action="store_true",
+                        help="Also print where the time of each query went.")
+    parser.add_argument("--json", help="Write the results to this file.")
+    args = parser.parse_args()
+
+    # Estuarial reads its configuration directory from the home directory
+    # at import, so point it at a scratch one first.
+    workdir = tempfile.mkdtemp(prefix="estuarial-bench-")
+    os.environ["HOME"] = workdir
+    os.environ["USERPROFILE"] = workdir
+    os.makedirs(os.path.join(workdir, ".estuarial"))
+    with open(os.path.join(workdir, ".estuarial", "estuarial.ini"),
+              "w") as ini:
+        ini.write(_INI.format(cache="off" if args.no_cache else "on"))
+
+    try:
+        start = default_timer()
+        database = qad_sqlite.build_database(workdir, scale=args.scale)
+        os.environ["ESTUARIAL_BENCH_DB"] = database
+        print("Built stand-in database at scale {} in {:.1f}s".format(
+            args.scale, default_timer() - start))
+
+        from arraymanagement.client import ArrayClient
+        from estuarial.array.registry import registry
+
+        def client_factory(basepath, localdatapath):
+            return ArrayClient(basepath=basepath,
+                               configname="qad_sqlite_config",
+                               localdatapath=localdatapath)
+        registry.set_client_factory(client_factory)
+
+        from estuarial.util.instrumentation import instruments
+        if args.phases:
+            stats = instruments.enable_stats(window=args.repeat)
+
+        header = ("{:<32} {:>6} {:>8} {:>10} {:>12} {:>9} {:>9} {:>9} "
+                  "{:>9} {:>8}")
+        row = ("{name:<32} {calls:>6} {rows:>8} {calls_per_s:>10.1f} "
+               "{rows_per_s:>12.0f} {cold_ms:>9.1f} {p50_ms:>9.1f} "
+               "{p90_ms:>9.1f} {p99_ms:>9.1f} {peak_mb:>8.1f}")
+        print(header.format("benchmark", "calls", "rows", "calls/s",
+                            "rows/s", "cold ms", "p50 ms", "p90 ms",
+                            "p99 ms", "peak MB"))
+
+        results = []
+        for name, function in benchmarks(args.scale):
+            if args.only and name not in args.only:
+                continue
+            try:
+                latencies, rows, peak = run_benchmark(function, args.repeat)
+            except Exception as error:
+                # Report the failure and carry on with the other benchmarks.
+                results.append({"name": name, "error": repr(error)})
+                print("{:<32} failed: {!r}".format(name, error))
+                continue
+            results.append(summarize(name, latencies, rows, peak))
+            print(row.format(**results[-1]))
+
+        if args.phases:
+            print()
+            print(stats.table().to_string(float_format="{:.2f}".format))
+
+        if args.json:
+            with open(args.json, "w") as output:
+                json.dump({"commit": git_commit(), "scale": args.scale,
+                           "repeat": args.repeat,
+                           "cache": not args.no_cache,
+                           "results": results}, output, indent=2)
+    finally:
+        registry_module = sys.modules.get("estuarial.array.registry")
+        if registry_module is not None:
+            registry_module.registry.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark the vectorized `worldscope_align` against the original row-wise
+loop on synthetic Worldscope frames.
+
+    python benchmarks/bench_worldscope_align.py [--rowwise-limit N]
+
+The row-wise loop is only run up to --rowwise-limit rows (it takes tens of
+seconds at 10^4 rows); beyond that its time is extrapolated linearly from
+the largest size it was run at.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import time
+import argparse
+from estuarial.util import munging
+from estuarial.test.mocking.worldscope_frames import make_worldscope_frame
+
+SIZES = [10**4, 10**5, 10**6]
+
+
+def best_time(function, frame, repeat):
+    """
+    Best wall-clock time of function over repeat runs on copies of frame.
+    """
+    timings = []
+    for _ in range(repeat):
+        data = frame.copy()
+        start = time.time()
+        function(data)
+        timings.append(time.time() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rowwise-limit", type=int, default=10**4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>10} {:>14} {:>14} {:>10}".format(
+        "rows", "vectorized(s)", "rowwise(s)", "speedup"))
+
+    rowwise_rate = None
+    for rows in SIZES:
+        frame = make_worldscope_frame(rows, seed=rows)
+        vectorized = best_time(munging.worldscope_align, frame, args.repeat)
+
+        if rows <= args.rowwise_limit:
+            rowwise = best_time(munging._worldscope_align_rowwise, frame, 1)
+            rowwise_rate = rowwise / rows
+            rowwise_label = "{:.3f}".format(rowwise)
+        elif rowwise_rate is not None:
+            rowwise = rowwise_rate * rows
+            rowwise_label = "~{:.1f}".format(rowwise)
+        else:
+            rowwise = None
+            rowwise_label = "-"
+
+        speedup = "{:.0f}x".format(rowwise / vectorized) if rowwise else "-"
+        print("{:>10} {:>14.3f} {:>14} {:>10}".format(
+            rows, vectorized, rowwise_label, speedup))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Synthetic SQLite stand-in for the TR QAD tables queried by the catalog
+yamls, so that Estuarial can be benchmarked without access to the database.
+
+Tables live in attached databases named after their QAD schema (`dbo`,
+`prc`, `trqa`). SQLite resolves unqualified names through the attached
+databases, so both `DBO.IDXSPCMP` and `wsndata` work as written in the
+yamls. SQLite parses `isnull` as its postfix NULL test, so T-SQL's
+`isnull(value, default)` is rewritten to the equivalent `ifnull` as
+statements are executed. Dates are stored as TIMESTAMP text so they compare
+with bound datetimes and come back as datetimes.
+
+    path = build_database(directory, scale=1)
+    connect(path)  # sqlite3 connection with the schemas attached
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import re
+import sqlite3
+import datetime
+import numpy as np
+import pandas as pd
+from os.path import join as pjoin
+
+# Schema -> table -> columns, as (name, SQLite type).
+SCHEMAS = {
+    "dbo": {
+        "secmapx": [("seccode", "INTEGER"), ("vencode", "INTEGER"),
+                    ("ventype", "INTEGER"), ("exchange", "INTEGER"),
+                    ("rank", "INTEGER")],
+        "secmap": [("seccode", "INTEGER"), ("vencode", "INTEGER"),
+                   ("ventype", "INTEGER"), ("exchange", "INTEGER"),
+                   ("rank", "INTEGER")],
+        "wsndata": [("code", "INTEGER"), ("item", "INTEGER"),
+                    ("year_", "INTEGER"), ("seq", "INTEGER"),
+                    ("freq", "TEXT"), ("value_", "REAL"),
+                    ("date_", "TIMESTAMP")],
+        "wsfye": [("code", "INTEGER"), ("year_", "INTEGER"),
+                  ("date_", "TIMESTAMP")],
+        "wsitem": [("Number", "INTEGER"), ("Name", "TEXT")],
+        "idxinfo": [("code", "INTEGER"), ("name", "TEXT"),
+                    ("ticker", "TEXT")],
+        "idxspcmp": [("idxcode", "INTEGER"), ("seccode", "INTEGER"),
+                     ("date_", "TIMESTAMP"), ("shares", "REAL")],
+        "idxdjcmp": [("idxcode", "INTEGER"), ("seccode", "INTEGER"),
+                     ("date_", "TIMESTAMP"), ("shares", "REAL")],
+        "ds2primqtprc": [("infocode", "INTEGER"),
+                         ("marketdate", "TIMESTAMP"), ("open_", "REAL"),
+                         ("high", "REAL"), ("low", "REAL"),
+                         ("close_", "REAL"), ("isocurrcode", "TEXT"),
+                         ("volume", "REAL"), ("bid", "REAL"),
+                         ("ask", "REAL"), ("vwap", "REAL"),
+                         ("mosttrdprc", "REAL"), ("consolvol", "REAL"),
+                         ("mosttrdvol", "REAL"), ("priceunit", "TEXT"),
+                         ("exchintcode", "INTEGER")],
+        "ds2adj": [("infocode", "INTEGER"), ("adjdate", "TIMESTAMP"),
+                   ("endadjdate", "TIMESTAMP"), ("adjtype", "INTEGER")],
+        "ds2exchqtinfo": [("infocode", "INTEGER"),
+                          ("exchintcode", "INTEGER"),
+                          ("startdate", "TIMESTAMP")],
+    },
+    "prc": {
+        "idxsec": [("code", "INTEGER"), ("vendor", "INTEGER"),
+                   ("ticker", "TEXT"), ("cusip", "TEXT"), ("name", "TEXT"),
+                   ("prccode", "INTEGER")],
+        "prcdly": [("code", "INTEGER"), ("date_", "TIMESTAMP"),
+                   ("close_", "REAL")],
+    },
+    "trqa": {
+        "ds2eqmstr": [("seccode", "INTEGER"), ("infocode", "INTEGER"),
+                      ("dssecname", "TEXT"), ("ctrytradedin", "TEXT"),
+                      ("statuscode", "TEXT"), ("typecode", "TEXT")],
+    },
+}
+
+# Indices matching the join and filter columns of the yamls.
+INDICES = {
+    "dbo": [("secmapx", "vencode, ventype"), ("secmapx", "seccode"),
+            ("secmap", "seccode"), ("wsndata", "code, item"),
+            ("wsfye", "code, year_"), ("idxspcmp", "date_"),
+            ("idxdjcmp", "date_"), ("ds2primqtprc", "infocode, marketdate"),
+            ("ds2adj", "infocode"), ("ds2exchqtinfo", "infocode")],
+    "prc": [("idxsec", "code"), ("prcdly", "code, date_")],
+    "trqa": [("ds2eqmstr", "ctrytradedin, statuscode, typecode")],
+}
+
+# Securities and trading days per unit of scale.
+SECURITIES_PER_SCALE = 500
+START_DATE = "2010-01-01"
+TRADING_DAYS = 250
+FISCAL_YEARS = range(2005, 2013)
+WS_ITEMS = [(2001, "CASH"), (1751, "NET INCOME"), (1001, "NET SALES"),
+            (2999, "TOTAL ASSETS"), (3351, "TOTAL LIABILITIES")]
+INDEX_INFO = [(1, "S&P 500 INDEX", "SPX_IDX"), (2, "DOW JONES INDUSTRIALS",
+                                               "DJX_IDX")]
+
+# Vendor types of secmapx used by the yamls.
+_WORLDSCOPE, _IDC, _DATASTREAM = 10, 14, 33
+
+
+def _timestamp(value):
+    """
+    Return the TIMESTAMP text of a date, as the sqlite3 adapters write it.
+    """
+    return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _register_types():
+    """
+    Teach sqlite3 to bind the numpy and pandas values Estuarial passes.
+    """
+    sqlite3.register_adapter(pd.Timestamp, _timestamp)
+    sqlite3.register_adapter(datetime.date, _timestamp)
+    sqlite3.register_adapter(datetime.datetime, _timestamp)
+    for numpy_type in (np.int8, np.int16, np.int32, np.int64):
+        sqlite3.register_adapter(numpy_type, int)
+    for numpy_type in (np.float32, np.float64):
+        sqlite3.register_adapter(numpy_type, float)
+
+
+# T-SQL's two-argument isnull, which SQLite spells ifnull.
+_ISNULL = re.compile(r"\bisnull(\s*\()", re.IGNORECASE)
+
+
+def _statement(sql):
+    """
+    Return the T-SQL statement sql in the SQLite dialect.
+    """
+    return _ISNULL.sub(r"ifnull\1", sql)
+
+
+class _Cursor(sqlite3.Cursor):
+    """
+    Cursor executing T-SQL statements through `_statement`.
+    """
+
+    def execute(self, sql, *args):
+        return sqlite3.Cursor.execute(self, _statement(sql), *args)
+
+    def executemany(self, sql, *args):
+        return sqlite3.Cursor.executemany(self, _statement(sql), *args)
+
+
+class _Connection(sqlite3.Connection):
+    """
+    Connection whose cursors and shortcut `execute` methods accept T-SQL's
+    `isnull`.
+    """
+
+    def cursor(self, factory=_Cursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+
+def schema_paths(path):
+    """
+    Return {schema: file} for the database at path.
+    """
+    root, _ = os.path.splitext(path)
+    return dict((schema, "{}.{}.sqlite".format(root, schema))
+                for schema in SCHEMAS)
+
+
+def connect(path):
+    """
+    Return a sqlite3 connection to the stand-in database at path, with the
+    QAD schemas attached and T-SQL's `isnull` available.
+
+    It takes the place of `sqlite3.connect` as the catalog's `db_module`
+    connect function.
+    """
+    _register_types()
+    connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES,
+                                 check_same_thread=False,
+                                 factory=_Connection)
+    for schema, schema_path in sorted(schema_paths(path).items()):
+        connection.execute("ATTACH DATABASE ? AS {}".format(schema),
+                           (schema_path,))
+    return connection
+
+
+def _insert(connection, schema, table, rows):
+    columns = [name for name, _ in SCHEMAS[schema][table]]
+    statement = "INSERT INTO {}.{} ({}) VALUES ({})".format(
+        schema, table, ", ".join(columns), ", ".join("?" * len(columns)))
+    connection.executemany(statement, rows)
+
+
+def build_database(directory, scale=1, seed=0):
+    """
+    Create the stand-in database under directory with scale *
+    `SECURITIES_PER_SCALE` securities, and return the path of its main file.
+    Existing files are replaced.
+
+    Each security has Worldscope quarterly data for every item and fiscal
+    year, a year of Datastream and IDC daily prices, and a listing in the
+    US equity master; the first 500 are S&P 500 members and the first 30 Dow
+    Jones members at every month-end.
+    """
+    random = np.random.RandomState(seed)
+    path = pjoin(directory, "qad.sqlite")
+    for existing in [path] + list(schema_paths(path).values()):
+        if os.path.exists(existing):
+            os.remove(existing)
+
+    connection = connect(path)
+    for schema, tables in SCHEMAS.items():
+        for table, columns in tables.items():
+            connection.execute("CREATE TABLE {}.{} ({})".format(
+                schema, table,
+                ", ".join("{} {}".format(*column) for column in columns)))
+
+    securities = int(scale * SECURITIES_PER_SCALE)
+    seccodes = np.arange(1, securities + 1)
+    days = pd.bdate_range(START_DATE, periods=TRADING_DAYS)
+    month_ends = [_timestamp(day) for day in days.to_series()
+                  .groupby([days.year, days.month]).max()]
+    day_stamps = [_timestamp(day) for day in days]
+
+    mapping = []
+    for seccode in seccodes.tolist():
+        for ventype in (_WORLDSCOPE, _IDC, _DATASTREAM):
+            mapping.append((seccode, 100000 * ventype + seccode, ventype, 1,
+                            1))
+    _insert(connection, "dbo", "secmapx", mapping)
+    _insert(connection, "dbo", "secmap", mapping)
+    _insert(connection, "dbo", "wsitem", WS_ITEMS)
+
+    wsndata, wsfye = [], []
+    for seccode in seccodes.tolist():
+        code = 100000 * _WORLDSCOPE + seccode
+        for year in FISCAL_YEARS:
+            fiscal_end = _timestamp("{}-12-31".format(year))
+            wsfye.append((code, year, fiscal_end))
+            for seq in range(1, 5):
+                report = _timestamp(pd.Timestamp("{}-{:02d}-15".format(
+                    year + (seq == 4), 3 * seq % 12 + 1)))
+                for item, _ in WS_ITEMS:
+                    # Some rows only have a fiscal year end to align on.
+                    report_date = report if random.rand() > 0.2 else None
+                    wsndata.append((code, item, year, seq, "Q",
+                                    float(random.normal(100, 30)),
+                                    report_date))
+    _insert(connection, "dbo", "wsndata", wsndata)
+    _insert(connection, "dbo", "wsfye", wsfye)
+
+    _insert(connection, "dbo", "idxinfo", INDEX_INFO)
+    for table, members in (("idxspcmp", 500), ("idxdjcmp", 30)):
+        _insert(connection, "dbo", table,
+                [(1 if table == "idxspcmp" else 2, seccode, month_end,
+                  float(random.randint(10**6, 10**9)))
+                 for month_end in month_ends
+                 for seccode in seccodes[:members].tolist()])
+    _insert(connection, "prc", "idxsec",
+            [(seccode, vendor, "T{}".format(seccode), "C{:08d}".format(seccode),
+              "SECURITY {}".format(seccode), seccode)
+             for seccode in seccodes.tolist() for vendor in (1, 4)])
+
+    prices, prcdly, adjustments, exchanges = [], [], [], []
+    for seccode in seccodes.tolist():
+        infocode = 100000 * _DATASTREAM + seccode
+        close = 50 * np.exp(np.cumsum(random.normal(0, 0.02, len(days))))
+        for day, price in zip(day_stamps, close.tolist()):
+            prices.append((infocode, day, price, price * 1.01, price * 0.99,
+                           price, "USD", 1e6, price - 0.01, price + 0.01,
+                           price, price, 1e6, 1e6, "E+00", 1))
+            prcdly.append((100000 * _IDC + seccode, day, price))
+        adjustments.append((infocode, _timestamp("1990-01-01"), None, 2))
+        exchanges.append((infocode, 1, _timestamp("1990-01-01")))
+    _insert(connection, "dbo", "ds2primqtprc", prices)
+    _insert(connection, "prc", "prcdly", prcdly)
+    _insert(connection, "dbo", "ds2adj", adjustments)
+    _insert(connection, "dbo", "ds2exchqtinfo", exchanges)
+
+    _insert(connection, "trqa", "ds2eqmstr",
+            [(seccode, 100000 * _DATASTREAM + seccode,
+              "SECURITY {}".format(seccode), "US", "A", "EQ")
+             for seccode in seccodes.tolist()])
+
+    for schema, indices in INDICES.items():
+        for position, (table, columns) in enumerate(indices):
+            connection.execute("CREATE INDEX {0}.ix_{1}_{2} ON {1} ({3})"
+                               .format(schema, table, position, columns))
+    connection.commit()
+    connection.close()
+    return path
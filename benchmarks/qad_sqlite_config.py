@@ -0,0 +1,42 @@
+"""
+ArrayManagement catalog configuration pointing the yamls at the SQLite
+stand-in built by `qad_sqlite`, whose main file is named by the
+ESTUARIAL_BENCH_DB environment variable. It takes the place of the
+catalog's `datalib.config` (see `bench_suite.py`).
+
+The array client reloads this module whenever it reads its configuration,
+so it only defines values.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import collections
+import datetime as dt
+from sqlalchemy.pool import QueuePool
+from arraymanagement.nodes.sqlcaching import YamlSqlDateCaching
+import qad_sqlite
+
+database = os.environ.get("ESTUARIAL_BENCH_DB", "qad.sqlite")
+
+
+def _connect():
+    return qad_sqlite.connect(database)
+
+loaders = collections.OrderedDict([("*.yaml", YamlSqlDateCaching)])
+global_config = dict(is_dataset=False,
+                     csv_options={},
+                     datetime_type='datetime64[ns]',
+                     db_module=qad_sqlite,
+                     db_conn_args=(database,),
+                     db_conn_kwargs={},
+                     sqlalchemy_args=["sqlite://"],
+                     sqlalchemy_kwargs={"creator": _connect,
+                                        "poolclass": QueuePool},
+                     col_types={},
+                     min_itemsize={},
+                     db_string_types=[str],
+                     db_datetime_types=[dt.date, dt.datetime],
+                     loaders=loaders,
+                     cache_dir='~/.estuarial/')
+
+local_config = {}
@@ -1 +1 @@
-from . import arraymanagementclient
+from . import arraymanagementclient, registry
@@ -2,25 +2,52 @@ from __future__ import print_function, division, absolute_import
 
 import os
 from os.path import join as pjoin
-from arraymanagement.client import ArrayClient
-from estuarial.util.config.config import expanduser, UserConfigPath
+from estuarial.util.config.config import (expanduser, UserConfigPath,
+                                          ensure_user_config)
 from estuarial.util.logger import log
+from estuarial.util.instrumentation import instruments, CLIENT
+from estuarial.array.registry import registry
 
-if not 'ODBCINI' in os.environ:
-    os.environ['ODBCINI'] = UserConfigPath
+# Directory holding the query catalog.
+CATALOG_DIR = pjoin(os.path.dirname(__file__), '..', 'data', 'catalog',
+                    'SQL_DATA')
 
 class ArrayManagementClient(object):
     """
     Hangle ArrayManagement Connection
+
+    The underlying `ArrayClient` and its database connections are shared
+    process-wide through `estuarial.array.registry`, so constructing many
+    clients is cheap. `close` (or leaving a `with` block) releases this
+    client's use of the shared client, whose pooled connections are closed
+    once no open client uses it.
     """
 
     def __init__(self):
+        # The user directory and ODBC settings are set up by the first
+        # client rather than on import.
+        ensure_user_config()
+        if not 'ODBCINI' in os.environ:
+            os.environ['ODBCINI'] = UserConfigPath
+
         EstuarialDir = pjoin(expanduser('~'), '.estuarial')
-        self.basedir = pjoin(os.path.dirname(__file__), 
-                             '..',
-                             'data', 
-                             'catalog', 
-                             'SQL_DATA')
-        self.aclient = ArrayClient(basepath=self.basedir,
-                                   localdatapath=EstuarialDir)
-        self.aclient.set_logging(log)
+        self.basedir = CATALOG_DIR
+        with instruments.span(type(self).__name__, CLIENT):
+            self.aclient = registry.acquire(self.basedir, EstuarialDir,
+                                            log=log)
+
+    def close(self):
+        """
+        Release the shared array client, closing it and its pooled
+        connections if this was its last open client.
+        """
+        aclient = getattr(self, 'aclient', None)
+        self.aclient = None
+        if aclient is not None:
+            registry.release(aclient)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,265 @@
+"""
+Chunked, parallel execution of queries whose WHERE clause carries a large
+IN-list, such as a whole universe of seccodes.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import six
+import decimal
+import datetime
+import numpy as np
+import pandas as pd
+from multiprocessing.pool import ThreadPool
+from sqlalchemy import sql
+from estuarial.util.instrumentation import (instruments, EXECUTE, FETCH,
+                                            FRAME, SELECT)
+
+# SQL Server rejects statements with more than 2100 bound parameters. Stay
+# safely below that once the parameters of the other conditions are counted.
+_MAX_PARAMETERS = 2000
+
+# Worker count used when the client does not advertise a pool size.
+_DEFAULT_WORKERS = 4
+
+# Alias given to the yaml query when it is wrapped as a sub-select.
+_SOURCE_ALIAS = "X"
+
+# Python types of the values of a numeric column holding database decimals.
+_NUMBERS = (decimal.Decimal, float) + six.integer_types
+
+
+def chunk(values, chunk_size):
+    """
+    Split values into consecutive lists of at most chunk_size elements,
+    dropping duplicates but otherwise preserving order.
+
+    Params
+    ------
+    values: Iterable of the IN-list values.
+
+    chunk_size: Positive int, the largest allowed chunk.
+
+    Returns
+    -------
+    List of lists of values.
+    """
+    seen = set()
+    unique = []
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            unique.append(value)
+
+    return [unique[start:start + chunk_size]
+            for start in range(0, len(unique), chunk_size)]
+
+
+def parameter_count(conditions):
+    """
+    Return the number of bound parameters used by a sequence of alchemy
+    conditions.
+    """
+    if not conditions:
+        return 0
+    return len(sql.and_(*conditions).compile().params)
+
+
+def date_column(node):
+    """
+    Return the name of the node's date conditional, the first of its yaml
+    conditionals whose name contains 'date', as the array backend does.
+    """
+    return [f for f in (node.fields or []) if 'date' in f][0]
+
+
+def date_range_condition(node, select_kwargs):
+    """
+    Translate the date keyword arguments accepted by the array backend's
+    date-caching `select` (e.g. `date_1`/`date_2`) into an explicit condition
+    on the node's date conditional, mirroring how the backend interprets
+    them: the sorted date keywords give the start and the end, and the column
+    is the first conditional whose name contains 'date'. A single keyword, or
+    a bound of None, leaves the range open at the other end.
+
+    Params
+    ------
+    node: Array node exposing `fields`, the conditionals from its yaml.
+
+    select_kwargs: dict of keyword arguments that would be passed to
+    `node.select`.
+
+    Returns
+    -------
+    An alchemy condition, or None when no date bounds were given. Nodes
+    without a date conditional are only looked at when there are bounds.
+    """
+    date_keys = sorted(k for k in select_kwargs if 'date' in k)
+    bounds = [select_kwargs[key] for key in date_keys[:2]] + [None, None]
+    start, end = bounds[:2]
+    if start is None and end is None:
+        return None
+
+    column = sql.column(date_column(node))
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column <= end)
+    return sql.and_(*conditions)
+
+
+def normalize_frame(frame):
+    """
+    Give query results the layout the array backend's `select` produces, so
+    that callers see the same frame whichever path ran the query: a default
+    integer index, date and datetime values as datetime64[ns] (the backend's
+    `db_datetime_types`) and database decimals as float64. Numeric columns
+    left as objects by a null, e.g. where chunk results with and without
+    values were concatenated, become float64 too.
+    """
+    frame = frame.reset_index(drop=True)
+    for name in frame.columns:
+        column = frame[name]
+        if column.dtype.kind != 'O':
+            continue
+        values = column[column.notnull()]
+        if not len(values):
+            continue
+        if all(isinstance(value, (datetime.date, datetime.datetime))
+               for value in values):
+            frame[name] = pd.to_datetime(column)
+        elif ((len(values) < len(column) or
+               any(isinstance(value, (decimal.Decimal, float))
+                   for value in values)) and
+              all(isinstance(value, _NUMBERS) and not isinstance(value, bool)
+                  for value in values)):
+            frame[name] = column.where(column.notnull(),
+                                       np.nan).astype(np.float64)
+    return frame
+
+
+def node_statement(node, condition=None):
+    """
+    Build a SELECT over the node's yaml query wrapped as a sub-select, in the
+    same form the array backend issues when it populates its cache.
+    """
+    source = sql.text("({}) AS {}".format(node.query, _SOURCE_ALIAS))
+    statement = sql.select([sql.literal_column("*")]).select_from(source)
+    if condition is not None:
+        statement = statement.where(condition)
+    return statement
+
+
+def execute_frame(engine, statement, query="statement"):
+    """
+    Execute statement on a pooled connection and return the rows as a
+    DataFrame. The connection is returned to the pool before returning.
+    Its phases are reported to the instrumentation under the name query.
+    """
+    connection = engine.connect()
+    try:
+        with instruments.span(query, EXECUTE):
+            result = connection.execute(statement)
+        with instruments.span(query, FETCH) as fetch:
+            columns = list(result.keys())
+            rows = result.fetchall()
+            fetch.rows = len(rows)
+    finally:
+        connection.close()
+
+    with instruments.span(query, FRAME) as frame:
+        return frame.measure(normalize_frame(
+            pd.DataFrame.from_records(rows, columns=columns)))
+
+
+def select_in(aclient, url, column_name, values, conditions=(),
+              chunk_size=None, max_workers=None, direct=False,
+              **select_kwargs):
+    """
+    Select from the node at url restricted to `column_name IN values`,
+    splitting values into chunks that respect the database's parameter limit
+    and running the chunks concurrently on a bounded thread pool.
+
+    When all values fit into one chunk the query goes through the node's
+    regular `select`, so small queries behave exactly as before, unless
+    direct is set. Otherwise
+    each chunk is executed directly on a connection from the client's shared
+    engine, and the chunk results are concatenated in the order of values.
+    Either way the result goes through `normalize_frame`, so its index and
+    dtypes do not depend on the number of chunks.
+
+    Params
+    ------
+    aclient: The (pooled) array client used to resolve url.
+
+    url: String naming a yaml query relative to the catalog root.
+
+    column_name: String naming the conditional the IN-list applies to.
+
+    values: Iterable of values for the IN-list.
+
+    conditions: Sequence of additional alchemy conditions, ANDed with the
+    IN-list.
+
+    chunk_size: Optional int overriding the number of values per chunk. By
+    default it is `_MAX_PARAMETERS` less the parameters needed by the other
+    conditions.
+
+    max_workers: Optional int bounding the number of chunks in flight. By
+    default it is the client's connection pool size.
+
+    direct: If True, always execute on the shared engine, bypassing the
+    node's own local caching even for a single chunk.
+
+    select_kwargs: Additional keyword arguments for `node.select`, such as the
+    `date_1`/`date_2` date range.
+
+    Returns
+    -------
+    pandas DataFrame of the combined results.
+    """
+    conditions = list(conditions)
+    arr = aclient[url]
+    column = getattr(arr, column_name.lower())
+
+    if chunk_size is None:
+        reserved = parameter_count(conditions) + len(select_kwargs)
+        chunk_size = max(1, _MAX_PARAMETERS - reserved)
+
+    chunks = chunk(values, chunk_size)
+    if len(chunks) <= 1 and not direct:
+        with instruments.span(url, SELECT) as select:
+            return select.measure(normalize_frame(arr.select(
+                sql.and_(column.in_(chunks[0] if chunks else []),
+                         *conditions),
+                **select_kwargs)))
+
+    date_condition = date_range_condition(arr, select_kwargs)
+    if date_condition is not None:
+        conditions.append(date_condition)
+
+    engine = aclient.engine()
+
+    def run_chunk(values_chunk):
+        condition = sql.and_(column.in_(values_chunk), *conditions)
+        return execute_frame(engine, node_statement(arr, condition), url)
+
+    if max_workers is None:
+        max_workers = getattr(aclient, 'pool_size', _DEFAULT_WORKERS)
+
+    if len(chunks) <= 1:
+        return run_chunk(chunks[0] if chunks else [])
+
+    pool = ThreadPool(max(1, min(max_workers, len(chunks))))
+    try:
+        # `map` returns results in the order of the chunks.
+        frames = pool.map(run_chunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+
+    # A column that is all null in one chunk is left as objects there, so
+    # the dtypes of the chunks may differ.
+    return normalize_frame(pd.concat(frames, ignore_index=True))
@@ -0,0 +1,557 @@
+"""
+Date-range-aware local cache that only fetches missing intervals.
+
+For each query (yaml url plus any extra conditions such as the metric) and
+each universe member, the cache keeps the rows fetched so far together with
+the date intervals they cover, in one store per bucket of members. A request for [start, end] only issues SQL for
+the sub-ranges not yet covered, merges the new rows into the member's local
+rows, and answers from the merged data. Extending a 20 year window by one day
+therefore fetches one day.
+
+Dates are compared at a resolution of one day: intervals that touch or are
+a day apart are treated as contiguous. Coverage is only recorded up to the
+day before today, so ranges ending today are refetched until they are
+complete. Covered dates are never refetched otherwise, so the cache only
+suits data that is final once its date has passed, such as prices. Callers
+opt in per query through `select_in_range`; fundamentals, which are dated by
+fiscal period and restated or reported late, are not cached.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import zlib
+import shutil
+import datetime
+import threading
+import contextlib
+import numpy as np
+import pandas as pd
+from sqlalchemy import sql
+from os.path import join as pjoin
+from estuarial.util.columnar import ColumnarStore, write_frame
+from estuarial.util.config.config import Config, UserConfigDir
+from estuarial.array.execution import select_in, date_column
+from estuarial.array.execution import date_range_condition
+from estuarial.array.result_cache import cache_key
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: readers and writers are only serialized within a process.
+    fcntl = None
+
+_CACHE_DIR = pjoin(UserConfigDir, "interval_cache")
+_RESOLUTION = datetime.timedelta(days=1)
+_TEMP_PREFIX = ".tmp-"
+_DISABLED = ("off", "no", "false", "0")
+_ROWS_DIR = "rows"
+_LOCK_FILE = ".lock"
+_DEFAULT_BUCKETS = 64
+
+
+def merge_intervals(intervals):
+    """
+    Return the union of closed (start, end) intervals as a sorted list of
+    disjoint intervals, joining those less than `_RESOLUTION` apart.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + _RESOLUTION:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_intervals(covered, start, end):
+    """
+    Return the sub-intervals of [start, end] not covered by the merged
+    intervals in covered.
+
+    Examples
+    --------
+        >>> day = pd.Timestamp
+        >>> missing_intervals([(day('2000-01-01'), day('2013-12-31'))],
+        ...                   day('2000-01-01'), day('2014-01-02'))
+        [(Timestamp('2014-01-01 00:00:00'), Timestamp('2014-01-02 00:00:00'))]
+    """
+    gaps = []
+    cursor = start
+    for cover_start, cover_end in covered:
+        if cover_end < cursor:
+            continue
+        if cover_start > end:
+            break
+        if cover_start > cursor:
+            gaps.append((cursor, min(cover_start - _RESOLUTION, end)))
+        cursor = max(cursor, cover_end + _RESOLUTION)
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def normalize_member(member):
+    """
+    Return member as an int when it is integral, so that a seccode given as
+    an int, a numpy integer, a float or text has a single text in bucket
+    hashes and coverage records. Other members are returned unchanged.
+    """
+    try:
+        number = int(member)
+    except (TypeError, ValueError):
+        return member
+    return number if number == float(member) else member
+
+
+def unique_members(values):
+    """
+    Return the distinct normalized members of values, in order.
+    """
+    return list(pd.unique(np.asarray([normalize_member(value)
+                                      for value in values], dtype=object)))
+
+
+def bucket_of(member, buckets):
+    """
+    Return the bucket of a member: a stable hash of the text of the
+    normalized member, so that the same seccode lands in the same bucket in
+    every process.
+    """
+    text = str(normalize_member(member)).encode('utf-8')
+    return (zlib.crc32(text) & 0xffffffff) % buckets
+
+
+@contextlib.contextmanager
+def _flocked(bucket_dir, operation):
+    """
+    Hold the `fcntl.flock` lock given by operation on the lock file of a
+    bucket.
+    """
+    with open(pjoin(bucket_dir, _LOCK_FILE), 'a') as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _frame_column(frame, name):
+    """
+    Return the column of frame matching name case-insensitively.
+    """
+    for column in frame.columns:
+        if str(column).lower() == name.lower():
+            return column
+    raise KeyError("Result has no column '{}'".format(name))
+
+
+class _BucketLocks(object):
+    """
+    Locks of bucket directories, across threads and (where `fcntl` is
+    available) processes: exclusive for writers and shared among readers.
+    Without `fcntl` readers take the writers' thread lock.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def locked(self, bucket_dir, shared=False):
+        """
+        Hold the lock of the bucket at bucket_dir, creating the directory if
+        needed: exclusively, or shared with other readers if shared is set.
+        """
+        if not os.path.isdir(bucket_dir):
+            try:
+                os.makedirs(bucket_dir)
+            except OSError:
+                if not os.path.isdir(bucket_dir):
+                    raise
+
+        with self._lock:
+            lock = self._locks.setdefault(bucket_dir, threading.Lock())
+
+        if fcntl is None:
+            with lock:
+                yield
+            return
+
+        # flock locks belong to the open file, so readers, which open the
+        # lock file each, also exclude the writers of their own process.
+        if shared:
+            with _flocked(bucket_dir, fcntl.LOCK_SH):
+                yield
+            return
+        with lock:
+            with _flocked(bucket_dir, fcntl.LOCK_EX):
+                yield
+
+
+class IntervalCache(object):
+    """
+    Per (query, member) local rows plus the date intervals they cover.
+
+    Members are hashed into a fixed number of buckets. Each bucket is one
+    columnar directory holding the rows of its members sorted by member and
+    date, with the covered intervals of every member in its metadata, so a
+    universe of thousands of seccodes is read from a few stores. Writers of
+    a bucket hold its exclusive lock and readers a shared one, so a bucket
+    is never read while it is being replaced.
+
+    Examples
+    --------
+        cache = IntervalCache()
+        ohlc = cache.select_in(aclient, '/DATASTREAM/ohlc.yaml', 'seccode',
+                               universe, '1994-01-01', '2014-01-01')
+    """
+
+    def __init__(self, path=_CACHE_DIR, buckets=None):
+        """
+        Params
+        ------
+        path: Directory holding the cached queries. Created if needed.
+
+        buckets: Number of member buckets per query. Defaults to the
+        'IntervalCacheBuckets' entry of estuarial.ini.
+
+        Returns
+        -------
+        None.
+        """
+        if buckets is None:
+            buckets = Config().get('ESTUARIAL', 'IntervalCacheBuckets',
+                                   _DEFAULT_BUCKETS)
+        self.path = path
+        self.buckets = int(buckets)
+        self._locks = _BucketLocks()
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+
+    def query_key(self, node, url, column_name, conditions):
+        """
+        Return the key identifying a query and its layout: the yaml query
+        text, the url, the member column, the compiled extra conditions
+        (e.g. the metric) and the number of buckets.
+        """
+        if conditions:
+            compiled = sql.and_(*conditions).compile()
+            condition_text, params = str(compiled), compiled.params
+        else:
+            condition_text, params = "", {}
+        return cache_key(url, node.query, column_name.lower(),
+                         condition_text, params, self.buckets)
+
+    def _bucket_dir(self, query_key, bucket):
+        return pjoin(self.path, query_key, "bucket={:03d}".format(bucket))
+
+    def _load(self, query_key, bucket):
+        """
+        Return the store of a bucket, or None if there is none. Callers hold
+        the bucket lock.
+        """
+        try:
+            return ColumnarStore(pjoin(self._bucket_dir(query_key, bucket),
+                                       _ROWS_DIR))
+        except (IOError, OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _intervals(store):
+        """
+        Return {member text: merged date intervals} of a bucket store.
+        """
+        if store is None:
+            return {}
+        return dict((member, [(pd.Timestamp(start), pd.Timestamp(end))
+                              for start, end in intervals])
+                    for member, intervals
+                    in store.metadata.get("intervals", {}).items())
+
+    def _coverage(self, query_key, bucket):
+        """
+        Return {member text: merged date intervals} for a bucket.
+        """
+        bucket_dir = self._bucket_dir(query_key, bucket)
+        if not os.path.isdir(bucket_dir):
+            return {}
+        with self._locks.locked(bucket_dir, shared=True):
+            return self._intervals(self._load(query_key, bucket))
+
+    def covered(self, query_key, member):
+        """
+        Return the merged date intervals already cached for member.
+        """
+        member = normalize_member(member)
+        bucket = bucket_of(member, self.buckets)
+        return self._coverage(query_key, bucket).get(str(member), [])
+
+    def _write(self, query_key, bucket, updates, member_name, date_name):
+        """
+        Apply updates, a list of (members, gaps, fetched rows), to a bucket:
+        replace the cached rows of the members within their gaps by the
+        fetched rows, record the gaps as covered and atomically replace the
+        bucket's store.
+        """
+        bucket_dir = self._bucket_dir(query_key, bucket)
+        with self._locks.locked(bucket_dir):
+            store = self._load(query_key, bucket)
+            intervals = self._intervals(store)
+
+            frames = []
+            if store is not None:
+                old = store.to_frame()
+                if len(old):
+                    members = old[_frame_column(old, member_name)].values
+                    dates = old[_frame_column(old, date_name)].values
+                    stale = np.zeros(len(old), dtype=bool)
+                    for update_members, gaps, _ in updates:
+                        in_gap = np.zeros(len(old), dtype=bool)
+                        for gap_start, gap_end in gaps:
+                            in_gap |= ((dates >= np.datetime64(gap_start)) &
+                                       (dates <= np.datetime64(gap_end)))
+                        stale |= in_gap & np.in1d(members, update_members)
+                    old = old[~stale]
+                frames.append(old)
+            frames.extend(rows for _, _, rows in updates)
+            frames = [frame for frame in frames if len(frame.columns)]
+            merged = (pd.concat(frames, ignore_index=True) if frames
+                      else pd.DataFrame())
+
+            if len(merged):
+                date_col = _frame_column(merged, date_name)
+                merged[date_col] = pd.to_datetime(merged[date_col])
+                order = np.lexsort((
+                    merged[date_col].values,
+                    merged[_frame_column(merged, member_name)].values))
+                merged = merged.iloc[order]
+
+            # Data for today may still be arriving, so do not mark it
+            # covered.
+            horizon = pd.Timestamp(datetime.date.today()) - _RESOLUTION
+            for update_members, gaps, _ in updates:
+                gaps = [(gap_start, min(gap_end, horizon))
+                        for gap_start, gap_end in gaps
+                        if gap_start <= horizon]
+                for member in update_members:
+                    intervals[str(member)] = merge_intervals(
+                        intervals.get(str(member), []) + gaps)
+
+            metadata = {"intervals": dict(
+                (member, [(start.isoformat(), end.isoformat())
+                          for start, end in member_intervals])
+                for member, member_intervals in intervals.items())}
+            path = pjoin(bucket_dir, _ROWS_DIR)
+            suffix = "{}-{}".format(os.getpid(),
+                                    threading.current_thread().ident)
+            temp = pjoin(bucket_dir, _TEMP_PREFIX + suffix)
+            trash = pjoin(bucket_dir, _TEMP_PREFIX + "old-" + suffix)
+            write_frame(temp, merged.reset_index(drop=True),
+                        metadata=metadata)
+            if os.path.exists(path):
+                os.rename(path, trash)
+            os.rename(temp, path)
+            shutil.rmtree(trash, ignore_errors=True)
+
+    def _read(self, query_key, bucket, members, start, end, member_name,
+              date_name):
+        """
+        Return the cached rows of members within [start, end] from one
+        bucket, with the bucket's columns even if there are none, or None if
+        the bucket has no store.
+        """
+        bucket_dir = self._bucket_dir(query_key, bucket)
+        if not os.path.isdir(bucket_dir):
+            return None
+        with self._locks.locked(bucket_dir, shared=True):
+            store = self._load(query_key, bucket)
+            if store is None:
+                return None
+            columns = dict((name.lower(), name) for name in store.columns)
+            if date_name.lower() not in columns:
+                return store.to_frame()
+
+            dates = store.column(columns[date_name.lower()])
+            selected = ((dates >= np.datetime64(start)) &
+                        (dates <= np.datetime64(end)) &
+                        np.in1d(store.column(columns[member_name.lower()]),
+                                members))
+            return store.to_frame(rows=np.flatnonzero(selected))
+
+    def select_in(self, aclient, url, column_name, values, start, end,
+                  conditions=()):
+        """
+        Select the rows of the node at url with `column_name IN values` and
+        its date conditional within [start, end], fetching from the database
+        only the date ranges not yet cached for each member.
+
+        Params
+        ------
+        aclient: The (pooled) array client used to resolve url.
+
+        url: String naming a yaml query relative to the catalog root.
+
+        column_name: String naming the conditional identifying universe
+        members.
+
+        values: Iterable of universe members.
+
+        start, end: Inclusive date range, as anything `pd.Timestamp` accepts.
+
+        conditions: Sequence of additional alchemy conditions, such as the
+        metric, ANDed with the member and date conditions.
+
+        Returns
+        -------
+        pandas DataFrame of the rows of all members, in the order of values
+        and then by date.
+        """
+        arr = aclient[url]
+        conditions = list(conditions)
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        date_name = date_column(arr)
+        query_key = self.query_key(arr, url, column_name, conditions)
+        members = unique_members(values)
+
+        buckets = {}
+        for member in members:
+            buckets.setdefault(bucket_of(member, self.buckets),
+                               []).append(member)
+
+        # Group members by their missing intervals so that each distinct
+        # gap is fetched once for all of its members.
+        by_gaps = {}
+        for bucket, bucket_members in buckets.items():
+            coverage = self._coverage(query_key, bucket)
+            for member in bucket_members:
+                gaps = missing_intervals(coverage.get(str(member), []),
+                                         start, end)
+                if gaps:
+                    by_gaps.setdefault(tuple(gaps), []).append(member)
+
+        updates = {}
+        for gaps, gap_members in by_gaps.items():
+            fetched = []
+            for gap_start, gap_end in gaps:
+                date_condition = date_range_condition(
+                    arr, {"date_1": gap_start, "date_2": gap_end})
+                fetched.append(select_in(aclient, url, column_name,
+                                         gap_members,
+                                         conditions=conditions +
+                                         [date_condition],
+                                         direct=True))
+            fetched = pd.concat(fetched, ignore_index=True)
+
+            member_values = None
+            if len(fetched.columns):
+                member_values = fetched[_frame_column(fetched,
+                                                      column_name)].values
+            gap_buckets = {}
+            for member in gap_members:
+                gap_buckets.setdefault(bucket_of(member, self.buckets),
+                                       []).append(member)
+            # Members without rows are still recorded as covered.
+            for bucket, bucket_members in gap_buckets.items():
+                rows = fetched.iloc[:0]
+                if member_values is not None:
+                    rows = fetched[np.in1d(member_values, bucket_members)]
+                updates.setdefault(bucket, []).append(
+                    (bucket_members, list(gaps), rows))
+
+        for bucket, bucket_updates in sorted(updates.items()):
+            self._write(query_key, bucket, bucket_updates, column_name,
+                        date_name)
+
+        # The rows are read back from the stores, so the result has the
+        # same dtypes whether or not anything was fetched, and the columns
+        # of the query even without rows.
+        frames = []
+        for bucket, bucket_members in sorted(buckets.items()):
+            frame = self._read(query_key, bucket, bucket_members, start, end,
+                               column_name, date_name)
+            if frame is not None and len(frame.columns):
+                frames.append(frame)
+        if not frames:
+            return pd.DataFrame()
+
+        result = pd.concat(frames, ignore_index=True)
+        if not len(result):
+            return result
+        positions = dict((member, position)
+                         for position, member in enumerate(members))
+        member_order = [positions[member] for member in
+                        result[_frame_column(result, column_name)].tolist()]
+        order = np.lexsort((result[_frame_column(result, date_name)].values,
+                            member_order))
+        return result.iloc[order].reset_index(drop=True)
+
+    def clear(self):
+        """
+        Remove every cached query.
+        """
+        for name in os.listdir(self.path):
+            shutil.rmtree(pjoin(self.path, name), ignore_errors=True)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """
+    Return the process-wide `IntervalCache` under `~/.estuarial`, creating
+    it on first use, or None when the 'IntervalCache' entry of the ESTUARIAL
+    section of estuarial.ini turns it off.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            enabled = Config().get('ESTUARIAL', 'IntervalCache', "on")
+            if str(enabled).lower() in _DISABLED:
+                return None
+            _default_cache = IntervalCache()
+    return _default_cache
+
+
+def select_in_range(aclient, url, column_name, values, start, end,
+                    conditions=(), cached=False, **date_kwargs):
+    """
+    Select rows for the universe values between start and end through the
+    local price mirror when it is turned on and holds the query, and
+    otherwise, when cached is set, through the default `IntervalCache`.
+    Only queries whose rows are final once their date has passed, such as
+    prices, should set cached.
+
+    Without the cache this is a plain `execution.select_in`: date_kwargs
+    (e.g. `date_1`/`date_2`) are passed on to the node's `select` if given,
+    and otherwise the range becomes an explicit condition on the node's date
+    conditional.
+    """
+    # Imported here as the mirror builds on this module.
+    from estuarial.array import mirror
+    price_mirror = mirror.default_mirror()
+    if price_mirror is not None and mirror.serves(url, column_name,
+                                                  conditions):
+        return price_mirror.select_in(aclient, url, column_name, values,
+                                      start, end)
+
+    cache = default_cache() if cached else None
+    if cache is not None:
+        return cache.select_in(aclient, url, column_name, values, start, end,
+                               conditions=conditions)
+
+    conditions = list(conditions)
+    if not date_kwargs:
+        conditions.append(date_range_condition(
+            aclient[url], {"date_1": start, "date_2": end}))
+    return select_in(aclient, url, column_name, values,
+                     conditions=conditions, **date_kwargs)
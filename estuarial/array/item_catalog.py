@@ -0,0 +1,220 @@
+"""
+Shared catalog of the Worldscope, RKD and IBES item tables.
+
+The item tables are small and change rarely, but are needed by every
+`MetricsManager` and several `TRMETA` lookups. The catalog loads each table
+once per process, keeps it on disk under `~/.estuarial/catalog` for other
+processes, and refetches it after a time-to-live or on an explicit
+`refresh`. Each loaded table carries a version (a hash of its contents) so
+that structures derived from it, such as search indices, can tell when they
+are stale.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import six
+import time
+import threading
+import pandas as pd
+from os.path import join as pjoin
+from estuarial.util.config.config import Config, UserConfigDir
+from estuarial.array.arraymanagementclient import ArrayManagementClient
+from estuarial.array.execution import execute_frame, node_statement
+from estuarial.array.result_cache import ResultCache, cache_key
+
+_CATALOG_DIR = pjoin(UserConfigDir, "catalog")
+
+# Default for the 'CatalogTTL' entry (hours) of the ESTUARIAL section of
+# estuarial.ini.
+_DEFAULT_TTL_HOURS = 24 * 7
+
+# Catalog names and the item table queries backing them.
+CATALOG_URLS = {
+    "worldscope": "/FUNDAMENTALS/WORLDSCOPE/wsitems.yaml",
+    "rkd": "/FUNDAMENTALS/RKD/rkditems.yaml",
+    "ibes": "/UNORGANIZED/IBES/items.yaml",
+}
+
+
+class ItemFrame(pd.DataFrame):
+    """
+    Item table whose rows can also be looked up by code as attributes, e.g.
+    `items.MRSB` for the rows with COA 'MRSB'. The code positions are grouped
+    once, on first lookup, and each sub-frame is taken when it is asked for.
+    """
+
+    def __init__(self, data, code_column):
+        super(ItemFrame, self).__init__(data)
+        object.__setattr__(self, '_code_column', code_column)
+        object.__setattr__(self, '_code_positions', None)
+
+    def _positions(self):
+        """
+        Return {code: row positions}, grouping the code column on first use.
+        """
+        positions = self.__dict__.get('_code_positions')
+        if positions is None:
+            codes = self[self.__dict__['_code_column']]
+            positions = codes.groupby(codes.values).indices
+            object.__setattr__(self, '_code_positions', positions)
+        return positions
+
+    def __getattr__(self, name):
+        if not name.startswith('_') and '_code_column' in self.__dict__:
+            positions = self._positions().get(name)
+            if positions is not None:
+                return self.iloc[positions]
+        return super(ItemFrame, self).__getattr__(name)
+
+    def __dir__(self):
+        codes = [code for code in self._positions()
+                 if isinstance(code, six.string_types)]
+        return sorted(set(dir(type(self))) | set(codes))
+
+
+class ItemCatalog(object):
+    """
+    In-memory plus on-disk cache of item tables, shared by `WS`, `RKD` and
+    `TRMETA`. Returned frames are shared and must not be modified.
+
+    Examples
+    --------
+        catalog = default_catalog()
+        ws_items = catalog.items("worldscope")
+        catalog.refresh("rkd")
+    """
+
+    def __init__(self, path=_CATALOG_DIR, ttl=None):
+        """
+        Params
+        ------
+        path: Directory for the on-disk copies of the tables.
+
+        ttl: Seconds after which a table is refetched from the database.
+        Defaults to the configured time-to-live.
+
+        Returns
+        -------
+        None.
+        """
+        if ttl is None:
+            hours = Config().get('ESTUARIAL', 'CatalogTTL', _DEFAULT_TTL_HOURS)
+            ttl = float(hours) * 3600
+
+        self.ttl = ttl
+        self._store = ResultCache(path, max_bytes=2**31, max_age=ttl)
+        self._lock = threading.RLock()
+        self._tables = {}  # name -> (loaded at, version, frame)
+        self._enumerations = {}  # (name, column) -> (version, ItemFrame)
+
+    def _key(self, name, node):
+        """
+        Return the on-disk key of a table, which changes with its query.
+        """
+        return cache_key(name, CATALOG_URLS[name], node.query)
+
+    def _fetch(self, name, refresh):
+        """
+        Load a table from disk, or from the database when refresh is set or
+        there is no fresh copy on disk.
+        """
+        client = ArrayManagementClient()
+        try:
+            node = client.aclient[CATALOG_URLS[name]]
+            key = self._key(name, node)
+
+            frame = None if refresh else self._store.get(key)
+            if frame is None:
+                frame = execute_frame(client.aclient.engine(),
+                                      node_statement(node))
+                frame = self._store.put(key, frame)
+        finally:
+            client.close()
+
+        version = cache_key(list(map(str, frame.columns)),
+                            frame.values.tolist())
+        return time.time(), version, frame
+
+    def items(self, name, refresh=False):
+        """
+        Return the item table name (one of `CATALOG_URLS`), loading it on
+        first use or once older than the time-to-live.
+
+        Params
+        ------
+        name: Catalog name, e.g. "worldscope".
+
+        refresh: If True, refetch the table from the database.
+
+        Returns
+        -------
+        pandas DataFrame of the item table.
+        """
+        if name not in CATALOG_URLS:
+            message = "Unknown item catalog '{}', expected one of {}"
+            raise KeyError(message.format(name, sorted(CATALOG_URLS)))
+
+        with self._lock:
+            entry = self._tables.get(name)
+            if (refresh or entry is None or
+                    time.time() - entry[0] > self.ttl):
+                entry = self._tables[name] = self._fetch(name, refresh)
+        return entry[2]
+
+    def version(self, name):
+        """
+        Return the version of the table name, loading it if needed.
+        """
+        self.items(name)
+        with self._lock:
+            return self._tables[name][1]
+
+    def enumeration(self, name, code_column):
+        """
+        Return the table name as an `ItemFrame` keyed by code_column, built
+        once per table version and shared like the tables themselves.
+
+        Params
+        ------
+        name: Catalog name, e.g. "rkd".
+
+        code_column: Column of item codes, e.g. "COA".
+
+        Returns
+        -------
+        ItemFrame of the item table.
+        """
+        version = self.version(name)
+        with self._lock:
+            entry = self._enumerations.get((name, code_column))
+            if entry is None or entry[0] != version:
+                frame = ItemFrame(self.items(name).copy(), code_column)
+                entry = self._enumerations[(name, code_column)] = (version,
+                                                                   frame)
+        return entry[1]
+
+    def refresh(self, name=None):
+        """
+        Refetch the table name from the database, or every loaded table when
+        name is None.
+        """
+        with self._lock:
+            names = [name] if name is not None else list(self._tables)
+            for table_name in names:
+                self.items(table_name, refresh=True)
+
+
+_default_catalog = None
+_default_lock = threading.Lock()
+
+
+def default_catalog():
+    """
+    Return the process-wide `ItemCatalog`, creating it on first use.
+    """
+    global _default_catalog
+    with _default_lock:
+        if _default_catalog is None:
+            _default_catalog = ItemCatalog()
+    return _default_catalog
@@ -0,0 +1,469 @@
+"""
+Optional local mirror of the Datastream price tables.
+
+The mirror keeps the rows of whole price queries (no extra conditions) in
+columnar partitions under `~/.estuarial/mirror`, laid out as
+
+    <query key>/bucket=<seccode bucket>/year=<year>/
+
+plus a coverage file per bucket recording which date intervals are held for
+each member. Reads prune partitions by bucket and year and then select rows
+through memory-mapped member and date columns, so only the selected rows of
+the requested partitions are materialized. Only the date ranges a member is
+missing are fetched from SQL.
+
+Writers of a bucket hold an exclusive lock on its lock file and readers a
+shared one, so a grid of workers can share one mirror directory. Turn the
+mirror on with `Mirror = on` in the ESTUARIAL section of estuarial.ini, and
+fill it ahead of time with
+
+    python -m estuarial.array.mirror --start 1994-01-01 --end 2014-01-01 \\
+        seccodes.txt
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import datetime
+import threading
+import numpy as np
+import pandas as pd
+from os.path import join as pjoin
+from estuarial.util.columnar import ColumnarStore, write_frame
+from estuarial.util.config.config import Config, UserConfigDir
+from estuarial.array.execution import select_in, date_column
+from estuarial.array.execution import date_range_condition
+from estuarial.array.result_cache import cache_key
+from estuarial.array.interval_cache import (merge_intervals,
+                                            missing_intervals, _frame_column,
+                                            normalize_member, unique_members,
+                                            bucket_of, _BucketLocks,
+                                            _RESOLUTION, _TEMP_PREFIX,
+                                            _DISABLED, _DEFAULT_BUCKETS)
+
+_MIRROR_DIR = pjoin(UserConfigDir, "mirror")
+_COVERAGE_FILE = "_coverage.json"
+_EMPTY_DIR = "_empty"  # Empty store with the columns of a mirrored query
+
+# Queries served by the mirror and the conditional naming their members.
+MIRROR_URLS = {
+    "/DATASTREAM/datastream_basic.yaml": "seccode",
+    "/DATASTREAM/ohlc.yaml": "seccode",
+}
+
+
+class PriceMirror(object):
+    """
+    Partitioned columnar copy of the queries in `MIRROR_URLS`.
+
+    Examples
+    --------
+        mirror = PriceMirror()
+        mirror.sync(aclient, '/DATASTREAM/ohlc.yaml', seccodes,
+                    '1994-01-01', '2014-01-01')
+        ohlc = mirror.select_in(aclient, '/DATASTREAM/ohlc.yaml', 'seccode',
+                                seccodes, '2010-01-01', '2010-12-31')
+    """
+
+    def __init__(self, path=_MIRROR_DIR, buckets=None):
+        """
+        Params
+        ------
+        path: Directory holding the mirrored queries. Created if needed.
+
+        buckets: Number of member buckets per query. Defaults to the
+        'MirrorBuckets' entry of estuarial.ini. Mirrors with different bucket
+        counts live side by side under path.
+
+        Returns
+        -------
+        None.
+        """
+        if buckets is None:
+            buckets = Config().get('ESTUARIAL', 'MirrorBuckets',
+                                   _DEFAULT_BUCKETS)
+        self.path = path
+        self.buckets = int(buckets)
+        self._locks = _BucketLocks()
+
+    def query_key(self, node, url, column_name):
+        """
+        Return the key identifying a mirrored query and its layout.
+        """
+        return cache_key("mirror", url, node.query, column_name.lower(),
+                         self.buckets)
+
+    def _bucket_dir(self, query_key, bucket):
+        return pjoin(self.path, query_key, "bucket={:03d}".format(bucket))
+
+    def _partition_dir(self, query_key, bucket, year):
+        return pjoin(self._bucket_dir(query_key, bucket),
+                     "year={}".format(year))
+
+    def _locked(self, query_key, bucket, shared=False):
+        """
+        Hold the lock of a bucket: exclusively for writers, or shared with
+        other readers if shared is set.
+        """
+        return self._locks.locked(self._bucket_dir(query_key, bucket),
+                                  shared)
+
+    def _coverage(self, query_key, bucket):
+        """
+        Return {member text: merged date intervals} for a bucket.
+        """
+        path = pjoin(self._bucket_dir(query_key, bucket), _COVERAGE_FILE)
+        try:
+            with open(path) as coverage_file:
+                coverage = json.load(coverage_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        return dict((member, [(pd.Timestamp(start), pd.Timestamp(end))
+                              for start, end in intervals])
+                    for member, intervals in coverage.items())
+
+    def _write_coverage(self, query_key, bucket, coverage):
+        """
+        Atomically replace the coverage file of a bucket.
+        """
+        path = pjoin(self._bucket_dir(query_key, bucket), _COVERAGE_FILE)
+        serialized = dict((member, [(start.isoformat(), end.isoformat())
+                                    for start, end in intervals])
+                          for member, intervals in coverage.items())
+        temp_path = "{}.tmp-{}".format(path, os.getpid())
+        with open(temp_path, 'w') as coverage_file:
+            json.dump(serialized, coverage_file)
+        os.rename(temp_path, path)
+
+    def covered(self, query_key, member):
+        """
+        Return the merged date intervals mirrored for member.
+        """
+        member = normalize_member(member)
+        bucket = bucket_of(member, self.buckets)
+        return self._coverage(query_key, bucket).get(str(member), [])
+
+    def _years(self, query_key, bucket):
+        """
+        Return the years with a partition in a bucket.
+        """
+        bucket_dir = self._bucket_dir(query_key, bucket)
+        if not os.path.isdir(bucket_dir):
+            return []
+        return sorted(int(name.split("=")[1])
+                      for name in os.listdir(bucket_dir)
+                      if name.startswith("year="))
+
+    def _replace_partition(self, path, frame):
+        """
+        Atomically replace the partition at path with frame.
+        """
+        parent, name = os.path.split(path)
+        temp = pjoin(parent, _TEMP_PREFIX + "{}-{}".format(name, os.getpid()))
+        trash = pjoin(parent, _TEMP_PREFIX + "old-{}-{}".format(name,
+                                                                os.getpid()))
+        write_frame(temp, frame.reset_index(drop=True))
+        if os.path.exists(path):
+            os.rename(path, trash)
+        os.rename(temp, path)
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def _write(self, query_key, bucket, members, gaps, fetched, member_name,
+               date_name):
+        """
+        Replace the rows of members within gaps by the fetched rows, in the
+        year partitions of a bucket, and record the gaps as covered.
+        Callers hold the bucket lock.
+        """
+        members = np.asarray(members)
+        if len(fetched):
+            fetched = fetched.copy()
+            date_col = _frame_column(fetched, date_name)
+            fetched[date_col] = pd.to_datetime(fetched[date_col])
+            fetched_years = pd.DatetimeIndex(fetched[date_col]).year
+
+        years = set()
+        for gap_start, gap_end in gaps:
+            years.update(range(gap_start.year, gap_end.year + 1))
+
+        for year in sorted(years):
+            path = self._partition_dir(query_key, bucket, year)
+            frames = []
+            if os.path.isdir(path):
+                old = ColumnarStore(path).to_frame()
+                if len(old):
+                    dates = old[_frame_column(old, date_name)].values
+                    in_gap = np.zeros(len(old), dtype=bool)
+                    for gap_start, gap_end in gaps:
+                        in_gap |= ((dates >= np.datetime64(gap_start)) &
+                                   (dates <= np.datetime64(gap_end)))
+                    stale = in_gap & np.in1d(
+                        old[_frame_column(old, member_name)].values, members)
+                    frames.append(old[~stale])
+            if len(fetched):
+                frames.append(fetched[np.asarray(fetched_years) == year])
+
+            frames = [frame for frame in frames if len(frame)]
+            if not frames:
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+
+            merged = pd.concat(frames, ignore_index=True)
+            order = np.lexsort((
+                merged[_frame_column(merged, date_name)].values,
+                merged[_frame_column(merged, member_name)].values))
+            self._replace_partition(path, merged.iloc[order])
+
+        # Data for today may still be arriving, so do not mark it covered.
+        horizon = pd.Timestamp(datetime.date.today()) - _RESOLUTION
+        gaps = [(gap_start, min(gap_end, horizon))
+                for gap_start, gap_end in gaps if gap_start <= horizon]
+
+        coverage = self._coverage(query_key, bucket)
+        for member in members.tolist():
+            coverage[str(member)] = merge_intervals(
+                coverage.get(str(member), []) + gaps)
+        self._write_coverage(query_key, bucket, coverage)
+
+    def _write_empty(self, query_key, fetched):
+        """
+        Save the columns of a fetched result as an empty store, unless they
+        already are, for results of the query without rows.
+        """
+        path = pjoin(self.path, query_key, _EMPTY_DIR)
+        if not len(fetched.columns) or os.path.isdir(path):
+            return
+        temp = pjoin(self.path, query_key, _TEMP_PREFIX + "{}-{}-{}".format(
+            _EMPTY_DIR, os.getpid(), threading.current_thread().ident))
+        try:
+            write_frame(temp, fetched.iloc[:0])
+            os.rename(temp, path)
+        except (IOError, OSError):
+            # Saved concurrently by another process or thread.
+            shutil.rmtree(temp, ignore_errors=True)
+
+    def _empty(self, query_key):
+        """
+        Return an empty frame with the columns of the query, or without
+        columns if it has never been fetched.
+        """
+        try:
+            return ColumnarStore(pjoin(self.path, query_key,
+                                       _EMPTY_DIR)).to_frame()
+        except (IOError, OSError, ValueError):
+            return pd.DataFrame()
+
+    def _fetch_missing(self, aclient, url, column_name, members, start, end):
+        """
+        Fetch from SQL the date ranges of [start, end] that members are
+        missing, one query per distinct set of gaps, and write them into
+        their buckets.
+        """
+        arr = aclient[url]
+        date_name = date_column(arr)
+        query_key = self.query_key(arr, url, column_name)
+
+        coverages = {}
+        by_gaps = {}
+        for member in members:
+            bucket = bucket_of(member, self.buckets)
+            if bucket not in coverages:
+                coverages[bucket] = self._coverage(query_key, bucket)
+            gaps = missing_intervals(coverages[bucket].get(str(member), []),
+                                     start, end)
+            if gaps:
+                by_gaps.setdefault(tuple(gaps), []).append(member)
+
+        for gaps, gap_members in by_gaps.items():
+            fetched = []
+            for gap_start, gap_end in gaps:
+                date_condition = date_range_condition(
+                    arr, {"date_1": gap_start, "date_2": gap_end})
+                fetched.append(select_in(aclient, url, column_name,
+                                         gap_members,
+                                         conditions=[date_condition],
+                                         direct=True))
+            fetched = pd.concat(fetched, ignore_index=True)
+            self._write_empty(query_key, fetched)
+
+            buckets = {}
+            for member in gap_members:
+                buckets.setdefault(bucket_of(member, self.buckets),
+                                   []).append(member)
+
+            member_values = None
+            if len(fetched.columns):
+                member_values = fetched[_frame_column(fetched,
+                                                      column_name)].values
+            for bucket, bucket_members in sorted(buckets.items()):
+                rows = fetched.iloc[:0]
+                if member_values is not None:
+                    rows = fetched[np.in1d(member_values, bucket_members)]
+                with self._locked(query_key, bucket):
+                    self._write(query_key, bucket, bucket_members,
+                                list(gaps), rows, column_name, date_name)
+
+        return query_key, date_name
+
+    def _read(self, query_key, bucket, members, start, end, member_name,
+              date_name):
+        """
+        Return the mirrored rows of members within [start, end] from one
+        bucket, reading only the partitions of the years in range. The bucket
+        is read under its shared lock, so no partition is replaced meanwhile.
+        """
+        if not os.path.isdir(self._bucket_dir(query_key, bucket)):
+            return []
+
+        start64, end64 = np.datetime64(start), np.datetime64(end)
+        frames = []
+        with self._locked(query_key, bucket, shared=True):
+            for year in self._years(query_key, bucket):
+                if year < start.year or year > end.year:
+                    continue
+                store = ColumnarStore(self._partition_dir(query_key, bucket,
+                                                          year))
+                if not store.rows:
+                    continue
+
+                columns = dict((name.lower(), name)
+                               for name in store.columns)
+                dates = store.column(columns[date_name.lower()])
+                selected = ((dates >= start64) & (dates <= end64) &
+                            np.in1d(store.column(
+                                columns[member_name.lower()]), members))
+                rows = np.flatnonzero(selected)
+                if len(rows):
+                    frames.append(store.to_frame(rows=rows))
+        return frames
+
+    def sync(self, aclient, url, values, start, end):
+        """
+        Fetch into the mirror whatever it is missing of the query at url for
+        the members values over [start, end].
+        """
+        column_name = MIRROR_URLS[url]
+        members = unique_members(values)
+        self._fetch_missing(aclient, url, column_name, members,
+                            pd.Timestamp(start), pd.Timestamp(end))
+
+    def select_in(self, aclient, url, column_name, values, start, end):
+        """
+        Select the rows of the node at url with `column_name IN values` and
+        its date conditional within [start, end], fetching from SQL only the
+        ranges missing from the mirror.
+
+        Params
+        ------
+        aclient: The (pooled) array client used to resolve url.
+
+        url: String naming a query in `MIRROR_URLS`.
+
+        column_name: String naming the conditional identifying members.
+
+        values: Iterable of members (e.g. seccodes).
+
+        start, end: Inclusive date range, as anything `pd.Timestamp` accepts.
+
+        Returns
+        -------
+        pandas DataFrame of the rows of all members, in the order of values
+        and then by date.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        members = unique_members(values)
+        query_key, date_name = self._fetch_missing(aclient, url, column_name,
+                                                   members, start, end)
+
+        buckets = {}
+        for member in members:
+            buckets.setdefault(bucket_of(member, self.buckets),
+                               []).append(member)
+
+        frames = []
+        for bucket, bucket_members in sorted(buckets.items()):
+            frames.extend(self._read(query_key, bucket, bucket_members,
+                                     start, end, column_name, date_name))
+        if not frames:
+            return self._empty(query_key)
+
+        result = pd.concat(frames, ignore_index=True)
+        positions = dict((member, position)
+                         for position, member in enumerate(members))
+        member_order = [positions[member] for member in
+                        result[_frame_column(result, column_name)].tolist()]
+        order = np.lexsort((result[_frame_column(result, date_name)].values,
+                            member_order))
+        return result.iloc[order].reset_index(drop=True)
+
+    def clear(self):
+        """
+        Remove every mirrored query.
+        """
+        if os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                shutil.rmtree(pjoin(self.path, name), ignore_errors=True)
+
+
+_default_mirror = None
+_default_lock = threading.Lock()
+
+
+def default_mirror():
+    """
+    Return the process-wide `PriceMirror`, creating it on first use, or None
+    unless the 'Mirror' entry of the ESTUARIAL section of estuarial.ini turns
+    it on.
+    """
+    global _default_mirror
+    with _default_lock:
+        if _default_mirror is None:
+            enabled = Config().get('ESTUARIAL', 'Mirror', "off")
+            if str(enabled).lower() in _DISABLED:
+                return None
+            _default_mirror = PriceMirror()
+    return _default_mirror
+
+
+def serves(url, column_name, conditions):
+    """
+    Return True if the mirror holds the query at url selected by
+    column_name without extra conditions.
+    """
+    return (not conditions and
+            MIRROR_URLS.get(url) == column_name.lower())
+
+
+def main(argv=None):
+    """
+    Sync command: mirror a price query for the seccodes listed in a file
+    (one per line) over a date range.
+    """
+    from estuarial.array.arraymanagementclient import ArrayManagementClient
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("seccodes", help="File with one seccode per line.")
+    parser.add_argument("--start", required=True)
+    parser.add_argument("--end", required=True)
+    parser.add_argument("--url", default="/DATASTREAM/datastream_basic.yaml",
+                        choices=sorted(MIRROR_URLS))
+    parser.add_argument("--path", default=_MIRROR_DIR)
+    args = parser.parse_args(argv)
+
+    with open(args.seccodes) as seccode_file:
+        seccodes = [int(line) for line in seccode_file if line.strip()]
+
+    mirror = PriceMirror(args.path)
+    with ArrayManagementClient() as client:
+        mirror.sync(client.aclient, args.url, seccodes, args.start, args.end)
+    print("Mirrored {} seccodes of {} into {}".format(len(seccodes), args.url,
+                                                     args.path))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Process-wide registry of pooled ArrayManagement clients.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import atexit
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from estuarial.util.config.config import Config
+
+# The array backend caches selections in HDF5 stores shared process-wide per
+# file, which PyTables does not allow to be used from several threads at once.
+# Each store file gets its own lock, so selections from different yamls still
+# run concurrently.
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+
+
+def store_lock(path):
+    """
+    Return the lock guarding the HDF5 store at path, creating it on first
+    use.
+    """
+    with _store_locks_lock:
+        lock = _store_locks.get(path)
+        if lock is None:
+            lock = _store_locks[path] = threading.RLock()
+    return lock
+
+
+class _SerializedNode(object):
+    """
+    Forwards to an array node, holding the lock of its HDF5 store for the
+    duration of its `select` so that nodes of the same yaml used from
+    different threads never touch their shared store concurrently. Direct
+    database execution through the shared engine is unaffected.
+    """
+
+    def __init__(self, node, lock):
+        object.__setattr__(self, 'node', node)
+        object.__setattr__(self, 'lock', lock)
+
+    def select(self, *args, **kwargs):
+        with self.lock:
+            return self.node.select(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.node, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.node, name, value)
+
+
+class PooledArrayClient(object):
+    """
+    Wraps a single `ArrayClient` shared by every `ArrayManagementClient` that
+    uses the same (basedir, localdatapath) pair.
+
+    Nodes looked up through `__getitem__` are cached per thread (a node owns a
+    database session, which is not thread-safe) and rebound onto one shared
+    SQLAlchemy engine whose connection pool is bounded by `pool_size`. Their
+    `select` calls are serialized per local HDF5 cache file, which the nodes
+    of one yaml share across threads.
+    Any other attribute access is forwarded to the wrapped `ArrayClient`.
+    """
+
+    def __init__(self, key, aclient, pool_size):
+        """
+        Params
+        ------
+        key: The (basedir, localdatapath) pair this client is registered under.
+
+        aclient: The `arraymanagement.client.ArrayClient` being shared.
+
+        pool_size: Maximum number of simultaneous database connections opened
+        by the shared engine.
+
+        Returns
+        -------
+        None.
+        """
+        self.key = key
+        self.aclient = aclient
+        self.pool_size = pool_size
+        # Number of acquisitions not yet released, kept by the registry.
+        self.users = 0
+        self._engine = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def engine(self):
+        """
+        Return the shared SQLAlchemy engine, creating it on first use from the
+        `sqlalchemy_args` and `sqlalchemy_kwargs` of the catalog config.
+
+        The engine does not overflow its pool, so once `pool_size` connections
+        are checked out further callers wait for one to be returned instead of
+        opening a new ODBC connection.
+        """
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    config = self.aclient.config
+                    args = config.get('sqlalchemy_args') or []
+                    kwargs = dict(config.get('sqlalchemy_kwargs') or {})
+                    kwargs.setdefault('pool_size', self.pool_size)
+                    kwargs.setdefault('max_overflow', 0)
+                    self._engine = create_engine(*args, **kwargs)
+        return self._engine
+
+    def _nodes(self):
+        """
+        Return the calling thread's cache of resolved nodes.
+        """
+        nodes = getattr(self._local, 'nodes', None)
+        if nodes is None:
+            nodes = self._local.nodes = {}
+        return nodes
+
+    def __getitem__(self, url):
+        """
+        Resolve url to an array node, reusing the node already resolved by the
+        calling thread when there is one.
+        """
+        if self._closed:
+            raise ValueError("Operation on closed client {}".format(self.key))
+
+        nodes = self._nodes()
+        node = nodes.get(url)
+        if node is None:
+            node = self.aclient[url]
+
+            # SQL nodes create a private engine (and hence connection pool)
+            # on construction. Rebind them onto the shared engine. Sessions
+            # run in autocommit mode so connections go back to the pool once
+            # a result has been consumed rather than being held per node.
+            if hasattr(node, 'session'):
+                node.engine = self.engine()
+                node.session = sessionmaker(bind=node.engine,
+                                            autocommit=True)()
+            path = (node.cache_path() if hasattr(node, 'cache_path')
+                     else url)
+            node = nodes[url] = _SerializedNode(node, store_lock(path))
+        return node
+
+    def __getattr__(self, name):
+        # Guard against recursion before `aclient` has been assigned.
+        if name == 'aclient':
+            raise AttributeError(name)
+        return getattr(self.aclient, name)
+
+    def close(self):
+        """
+        Drop cached nodes and dispose of the shared engine, closing all pooled
+        connections.
+        """
+        with self._lock:
+            self._closed = True
+            self._local = threading.local()
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+
+
+class ClientRegistry(object):
+    """
+    Thread-safe mapping from (basedir, localdatapath) to a single shared
+    `PooledArrayClient`.
+
+    Examples
+    --------
+        client = registry.acquire(basedir, localdatapath)
+        arr = client['/DATASTREAM/ohlc.yaml']
+        registry.close_all()
+    """
+    # Default bound on connections per client, overridable through the
+    # 'PoolSize' entry of the ESTUARIAL section of estuarial.ini.
+    _DEFAULT_POOL_SIZE = 5
+
+    def __init__(self, client_factory=None):
+        """
+        Params
+        ------
+        client_factory: Callable taking `basepath` and `localdatapath`
+        keywords and returning an `ArrayClient`. Defaults to `ArrayClient`,
+        which is only imported once the first client is built since the
+        array backend is slow to import.
+
+        Returns
+        -------
+        None.
+        """
+        self._lock = threading.Lock()
+        self._clients = {}
+        self.client_factory = client_factory
+
+    def set_client_factory(self, client_factory):
+        """
+        Construct clients with client_factory from now on, e.g. to point the
+        catalog at a local stand-in database for benchmarks. Registered
+        clients are closed so that later lookups use the new factory.
+
+        Returns
+        -------
+        The previous client factory.
+        """
+        with self._lock:
+            previous = self.client_factory
+            self.client_factory = client_factory
+        self.close_all()
+        return previous
+
+    def pool_size(self):
+        """
+        Return the configured number of pooled connections per client.
+        """
+        size = Config().get('ESTUARIAL', 'PoolSize', self._DEFAULT_POOL_SIZE)
+        return int(size)
+
+    def acquire(self, basedir, localdatapath, log=None):
+        """
+        Return the shared client for (basedir, localdatapath), constructing it
+        the first time the pair is seen. It stays pooled until every
+        acquisition of it has been given back with `release`, or until it is
+        closed with `close` or `close_all`.
+
+        Params
+        ------
+        basedir: Directory holding the query catalog.
+
+        localdatapath: Directory for local configuration and cached data.
+
+        log: Optional logger whose handlers are attached to the array backend
+        when the client is first constructed.
+
+        Returns
+        -------
+        A `PooledArrayClient`.
+        """
+        key = (basedir, localdatapath)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client_factory = self.client_factory
+                if client_factory is None:
+                    from arraymanagement.client import ArrayClient
+                    client_factory = ArrayClient
+                aclient = client_factory(basepath=basedir,
+                                         localdatapath=localdatapath)
+                if log is not None:
+                    aclient.set_logging(log)
+                client = PooledArrayClient(key, aclient, self.pool_size())
+                self._clients[key] = client
+            client.users += 1
+        return client
+
+    def release(self, client):
+        """
+        Give back one acquisition of client, closing and forgetting it once
+        none are left. Clients already closed through `close`, `close_all` or
+        `set_client_factory` are ignored.
+        """
+        with self._lock:
+            if self._clients.get(client.key) is not client:
+                return
+            client.users -= 1
+            if client.users > 0:
+                return
+            del self._clients[client.key]
+        client.close()
+
+    def close(self, basedir, localdatapath):
+        """
+        Close and forget the client registered for (basedir, localdatapath).
+        """
+        with self._lock:
+            client = self._clients.pop((basedir, localdatapath), None)
+        if client is not None:
+            client.close()
+
+    def close_all(self):
+        """
+        Close and forget every registered client.
+        """
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_all()
+
+
+# The process-wide registry used by ArrayManagementClient.
+registry = ClientRegistry()
+atexit.register(registry.close_all)
@@ -0,0 +1,235 @@
+"""
+Persistent on-disk cache of query results.
+
+Each entry is a columnar store (see `estuarial.util.columnar`) in its own
+directory under `~/.estuarial/result_cache`, named by a hash of everything
+that determines the result: the source yaml, the compiled SQL and its bound
+parameters. Entries are evicted least-recently-used first once the cache
+exceeds its size limit, and are ignored once older than the age limit.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from os.path import join as pjoin
+from estuarial.util.columnar import ColumnarStore, write_frame
+from estuarial.util.config.config import Config, UserConfigDir
+
+_CACHE_DIR = pjoin(UserConfigDir, "result_cache")
+_TEMP_PREFIX = ".tmp-"  # Entries being written, invisible to readers.
+
+
+def _canonical(value):
+    """
+    Return value with arrays, series and tuples as lists, numpy scalars as
+    Python scalars and sets as sorted lists, so that equal values serialize
+    to the same json in full. The repr of a large array is truncated, and
+    the order of a set is arbitrary.
+    """
+    if isinstance(value, dict):
+        return dict((key, _canonical(item)) for key, item in value.items())
+    if isinstance(value, (np.ndarray, pd.Series, pd.Index)):
+        value = list(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonical(item) for item in value),
+                      key=lambda item: json.dumps(item, sort_keys=True,
+                                                  default=repr))
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def cache_key(*parts):
+    """
+    Return a hex digest identifying parts, which may be any nesting of
+    json-serializable values, numpy arrays and sets. Dicts and sets are
+    hashed independently of their order, and other values (dates, decimals)
+    by their repr.
+    """
+    canonical = json.dumps(_canonical(parts), sort_keys=True, default=repr)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    """
+    LRU cache of DataFrames stored as columnar directories, shared between
+    processes through the filesystem.
+
+    Cached frames come back with a default integer index, and object columns
+    that are not strings are stored as float64 or datetime64.
+
+    Examples
+    --------
+        cache = ResultCache(max_bytes=2**30, max_age=86400)
+        frame = cache.get(key)
+        if frame is None:
+            frame = cache.put(key, run_query())
+    """
+    # Defaults for the 'ResultCacheSize' (megabytes) and 'ResultCacheAge'
+    # (days) entries of the ESTUARIAL section of estuarial.ini.
+    _DEFAULT_SIZE_MB = 1024
+    _DEFAULT_AGE_DAYS = 30
+
+    def __init__(self, path=_CACHE_DIR, max_bytes=None, max_age=None):
+        """
+        Params
+        ------
+        path: Directory holding the cache entries. Created if needed.
+
+        max_bytes: Total size the cache is trimmed to after each write.
+        Defaults to the configured size.
+
+        max_age: Seconds after which an entry is treated as missing. Defaults
+        to the configured age.
+
+        Returns
+        -------
+        None.
+        """
+        config = Config()
+        if max_bytes is None:
+            size_mb = config.get('ESTUARIAL', 'ResultCacheSize',
+                                 self._DEFAULT_SIZE_MB)
+            max_bytes = int(float(size_mb) * 2**20)
+        if max_age is None:
+            age_days = config.get('ESTUARIAL', 'ResultCacheAge',
+                                  self._DEFAULT_AGE_DAYS)
+            max_age = float(age_days) * 86400
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+
+    def _entry(self, key):
+        return pjoin(self.path, key)
+
+    def get(self, key):
+        """
+        Return the cached DataFrame for key, or None if there is no usable
+        entry. Reading an entry marks it as recently used.
+        """
+        entry = self._entry(key)
+        try:
+            store = ColumnarStore(entry)
+            if time.time() - store.metadata.get("created", 0) > self.max_age:
+                self.discard(key)
+                return None
+            frame = store.to_frame()
+            os.utime(entry, None)
+        except (IOError, OSError, ValueError, KeyError):
+            # Missing, partially evicted or unreadable entries are misses.
+            return None
+        return frame
+
+    def put(self, key, frame):
+        """
+        Store frame under key, replacing any previous entry, then trim the
+        cache to its size limit.
+
+        Returns
+        -------
+        frame as read back from the entry, i.e. as it will be returned by
+        `get`, with the same index and dtypes.
+        """
+        temp = self._entry("{}{}-{}-{}".format(
+            _TEMP_PREFIX, key, os.getpid(), threading.current_thread().ident))
+
+        write_frame(temp, frame.reset_index(drop=True),
+                    metadata={"created": time.time()})
+        frame = ColumnarStore(temp).to_frame()
+        with self._lock:
+            self.discard(key)
+            try:
+                os.rename(temp, self._entry(key))
+            except OSError:
+                # Another writer stored the same key first; keep theirs.
+                shutil.rmtree(temp, ignore_errors=True)
+            self.evict()
+        return frame
+
+    def discard(self, key):
+        """
+        Remove the entry for key, if any.
+        """
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def _entries(self):
+        """
+        Return (last used, size in bytes, key) for every complete entry.
+        """
+        entries = []
+        for key in os.listdir(self.path):
+            if key.startswith(_TEMP_PREFIX):
+                continue
+            entry = self._entry(key)
+            try:
+                size = sum(os.path.getsize(pjoin(entry, name))
+                           for name in os.listdir(entry))
+                entries.append((os.path.getmtime(entry), size, key))
+            except OSError:
+                continue
+        return entries
+
+    def size(self):
+        """
+        Return the total size in bytes of the cached entries.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits max_bytes.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            self.discard(key)
+            total -= size
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        for key in os.listdir(self.path):
+            self.discard(key)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+_DISABLED = ("off", "no", "false", "0")
+
+
+def default_cache():
+    """
+    Return the process-wide `ResultCache` under `~/.estuarial`, creating it
+    on first use, or None when the 'ResultCache' entry of the ESTUARIAL
+    section of estuarial.ini turns caching off.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            enabled = Config().get('ESTUARIAL', 'ResultCache', "on")
+            if str(enabled).lower() in _DISABLED:
+                return None
+            _default_cache = ResultCache()
+    return _default_cache
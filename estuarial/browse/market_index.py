@@ -3,6 +3,7 @@ Encapsulate queries for market index constituent data.
 
 Author: Ben Zaitlen and Ely Spears
 """
+import six
 import pandas
 import numpy as np
 import posixpath
@@ -22,6 +23,8 @@ class MarketIndex(object):
         m.available_indices()
         m.constituents("Russell 1000", '2012-12-28', '2012-12-31')
         m["S&P 500", datetime.date(2012, 12, 28):datetime.date(2012, 12, 31)]
+        m.constituents_batch(["S&P 500", "Russell 3000"],
+                             ['2012-11-30', '2012-12-31'])
     """
 
     # Location relative to CUSTOM_SQL for the necessary queries.
@@ -32,6 +35,9 @@ class MarketIndex(object):
     # to maintain readability.
     _SUPPORTED_INDICES = market_index_config._SUPPORTED_INDICES
 
+    # Names of the levels of the index of `constituents_batch` results.
+    _BATCH_LEVELS = ("index", "date", "seccode")
+
 
     def __init__(self):
         """
@@ -128,6 +134,66 @@ class MarketIndex(object):
         return function_handle(date__between=(start_period, end_period),
                                iticker=index_iticker)
 
+    def constituents_batch(self, indices, dates):
+        """
+        Retrieve constituents for many indices on many dates, e.g. a
+        rebalance calendar.
+
+        Indices served by the same query (e.g. all Russell indices) are
+        fetched together, with one query per family filtered by
+        `ITICKER IN (...)` and `DATE_ IN (...)`. Its result is cached, so
+        repeating a calendar does not query again.
+
+        Params
+        ------
+        indices: A string or list of strings naming supported indices.
+
+        dates: Iterable of strings or datetimes. Only constituents recorded on
+        exactly these dates are returned, so they must be trading days of the
+        index: a month-end that falls on a weekend or holiday has no rows.
+        Use e.g. business month-ends, `pandas.date_range(..., freq='BM')`,
+        adjusted for holidays.
+
+        Returns
+        -------
+        pandas DataFrame with one row per (index, date, seccode), indexed by
+        those three levels, where index is the name as given in indices.
+        """
+        if isinstance(indices, six.string_types):
+            indices = [indices]
+
+        # Group the requested indices by the query serving them.
+        families, names = {}, {}
+        for index in indices:
+            index_function, index_iticker = self._SUPPORTED_INDICES[index]
+            families.setdefault(index_function, set()).add(index_iticker)
+            names[index_iticker] = index
+
+        dates = sorted(set(pandas.to_datetime(list(dates))))
+
+        frames = []
+        for index_function, itickers in sorted(families.items()):
+            function_handle = getattr(self._constituent_queries,
+                                      index_function)
+            # Lists are unpacked into the bound `in_`, so wrap them.
+            frames.append(function_handle(
+                date__in=[[d.to_pydatetime() for d in dates]],
+                iticker_in=[sorted(itickers)]))
+
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return pandas.DataFrame(
+                columns=self._BATCH_LEVELS).set_index(list(self._BATCH_LEVELS))
+
+        data = pandas.concat(frames, ignore_index=True)
+        columns = dict((str(c).lower(), c) for c in data.columns)
+        data[self._BATCH_LEVELS[0]] = data[columns["iticker"]].map(names)
+        data[self._BATCH_LEVELS[1]] = pandas.to_datetime(data[columns["date_"]])
+        data[self._BATCH_LEVELS[2]] = data[columns["seccode"]]
+
+        data = data.drop([columns["date_"], columns["seccode"]], axis=1)
+        return data.set_index(list(self._BATCH_LEVELS)).sort_index()
+
     def available_indices(self):
         """
         Provides a tuple of the strings that can be used as index names when
@@ -153,3 +219,6 @@ if __name__ == "__main__":
     tmp3 = m.constituents("Dow Jones", '2012-12-31', '2012-12-31')
     tmp4 = m["Dow Jones", '2012-12-28':'2012-12-31']
 
+    month_ends = pandas.date_range('2012-01-01', '2012-12-31', freq='BM')
+    tmp5 = m.constituents_batch(["S&P 500", "Russell 3000"], month_ends)
+
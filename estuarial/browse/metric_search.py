@@ -0,0 +1,246 @@
+"""
+Ranked search over the Worldscope, RKD and IBES item catalogs.
+
+A `SearchIndex` holds an inverted index from word tokens to catalog rows,
+a sorted vocabulary for prefix matches (so partially typed words match), and
+an index from character trigrams to vocabulary words for fuzzy matches of
+misspelt words. Indices are built from the shared `ItemCatalog`, persisted
+next to it on disk, and rebuilt when the catalog version changes.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import re
+import six
+import bisect
+import threading
+from collections import defaultdict
+from os.path import join as pjoin
+from six.moves import cPickle as pickle
+from estuarial.util.config.config import UserConfigDir
+from estuarial.array.item_catalog import default_catalog
+
+_INDEX_DIR = pjoin(UserConfigDir, "catalog")
+_INDEX_FILE = "search-{}-{}.pickle"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Scores of a query word matching a row word exactly, as a prefix, or
+# fuzzily (scaled by trigram similarity), and the least similarity accepted.
+_EXACT, _PREFIX, _FUZZY = 1.0, 0.9, 0.8
+_MIN_SIMILARITY = 0.4
+
+
+def tokenize(text):
+    """
+    Return the lower-case alphanumeric words of text.
+    """
+    if not isinstance(text, six.string_types):
+        return []
+    return _TOKEN.findall(text.lower())
+
+
+def trigrams(word):
+    """
+    Return the set of character trigrams of word, padded so that short words
+    and word boundaries are represented.
+    """
+    padded = "  {} ".format(word)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class SearchIndex(object):
+    """
+    Token, prefix and trigram index over the text of catalog rows.
+
+    Examples
+    --------
+        index = SearchIndex(["NET INCOME", "CASH", "NET SALES"])
+        index.search("net inc")   # row 0 first, then row 2
+        index.search("incme")     # fuzzy match of row 0
+    """
+
+    def __init__(self, texts):
+        """
+        Params
+        ------
+        texts: Sequence of strings, the searchable text of each row.
+
+        Returns
+        -------
+        None.
+        """
+        postings = defaultdict(set)
+        lengths = []
+        for row, text in enumerate(texts):
+            words = tokenize(text)
+            lengths.append(len(words))
+            for word in words:
+                postings[word].add(row)
+
+        self.postings = dict((word, sorted(rows))
+                             for word, rows in postings.items())
+        self.vocabulary = sorted(self.postings)
+        self.lengths = lengths
+
+        grams = defaultdict(list)
+        for word in self.vocabulary:
+            for gram in trigrams(word):
+                grams[gram].append(word)
+        self.trigrams = dict(grams)
+
+    def _prefixed(self, prefix):
+        """
+        Return the vocabulary words starting with prefix.
+        """
+        # Words are [a-z0-9]+, so prefix + "{" sorts after every extension.
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        stop = bisect.bisect_left(self.vocabulary, prefix + "{")
+        return self.vocabulary[start:stop]
+
+    def _similar(self, word):
+        """
+        Return {vocabulary word: trigram similarity} for words similar to
+        word.
+        """
+        query_grams = trigrams(word)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for candidate in self.trigrams.get(gram, ()):
+                shared[candidate] += 1
+
+        similar = {}
+        for candidate, count in shared.items():
+            union = len(query_grams) + len(trigrams(candidate)) - count
+            similarity = count / union
+            if similarity >= _MIN_SIMILARITY:
+                similar[candidate] = similarity
+        return similar
+
+    def _word_scores(self, word):
+        """
+        Return {row: score} for the best match of one query word in each row.
+        """
+        matches = {}
+        if word in self.postings:
+            matches[word] = _EXACT
+        for candidate in self._prefixed(word):
+            matches.setdefault(candidate, _PREFIX)
+        if not matches:
+            for candidate, similarity in self._similar(word).items():
+                matches[candidate] = _FUZZY * similarity
+
+        scores = {}
+        for candidate, score in matches.items():
+            for row in self.postings[candidate]:
+                if score > scores.get(row, 0):
+                    scores[row] = score
+        return scores
+
+    def search(self, query, limit=None):
+        """
+        Return the rows matching query, best first.
+
+        Every word of query is matched exactly, as a prefix or fuzzily
+        against the words of each row. A row's score is the mean over the
+        query words of its best match, so rows matching all words rank
+        first; ties go to rows with fewer words.
+
+        Params
+        ------
+        query: String to search for.
+
+        limit: Optional maximum number of results.
+
+        Returns
+        -------
+        List of (score, row) pairs, scores in (0, 1].
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+
+        totals = defaultdict(float)
+        for word in words:
+            for row, score in self._word_scores(word).items():
+                totals[row] += score
+
+        ranked = sorted(totals.items(),
+                        key=lambda item: (-item[1], self.lengths[item[0]],
+                                          item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(total / len(words), row) for row, total in ranked]
+
+
+def row_texts(frame):
+    """
+    Return the searchable text of each catalog row: its string cells joined.
+    """
+    return [" ".join(value for value in row
+                     if isinstance(value, six.string_types))
+            for row in frame.values.tolist()]
+
+
+_indices = {}
+_lock = threading.Lock()
+
+
+def search_index(name, path=None):
+    """
+    Return the `SearchIndex` for the catalog name, loading it from disk or
+    building (and persisting) it when the catalog version has changed.
+    Indices are kept under path, by default next to the catalog tables.
+    """
+    path = path or _INDEX_DIR
+    catalog = default_catalog()
+    version = catalog.version(name)
+
+    with _lock:
+        cached = _indices.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        index_path = pjoin(path, _INDEX_FILE.format(name, version))
+        try:
+            with open(index_path, 'rb') as index_file:
+                index = pickle.load(index_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            index = SearchIndex(row_texts(catalog.items(name)))
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            temp_path = "{}.tmp-{}".format(index_path, os.getpid())
+            with open(temp_path, 'wb') as index_file:
+                pickle.dump(index, index_file, protocol=2)
+            os.rename(temp_path, index_path)
+
+        _indices[name] = (version, index)
+        return index
+
+
+def find_items(name, query, limit=None):
+    """
+    Return the rows of the catalog name best matching query, best first.
+
+    Params
+    ------
+    name: Catalog name, e.g. "worldscope", "rkd" or "ibes".
+
+    query: String to search for in the item names and descriptions.
+
+    limit: Optional maximum number of rows.
+
+    Returns
+    -------
+    pandas DataFrame of the matching catalog rows with an added `score`
+    column, empty when nothing matches.
+    """
+    index = search_index(name)
+    matches = index.search(query, limit=limit)
+    items = default_catalog().items(name)
+
+    found = items.iloc[[row for _, row in matches]].copy()
+    found['score'] = [score for score, _ in matches]
+    return found
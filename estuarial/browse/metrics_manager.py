@@ -1,26 +1,100 @@
 from __future__ import print_function, division, absolute_import
 
+import re
+import six
 import string
+import threading
 from collections import Counter
 from difflib import get_close_matches
 from estuarial.array.arraymanagementclient import ArrayManagementClient
-
-class WS(ArrayManagementClient):
+from estuarial.array.item_catalog import default_catalog
+from estuarial.browse.metric_search import find_items
+
+def _find_metrics(enumeration, label, name, limit):
+    """
+    Search the item catalog of enumeration for name through its search index,
+    printing suggestions from its common words when nothing matches.
+    """
+    name = str(name)
+    found = find_items(enumeration._catalog, name, limit=limit)
+
+    if found.empty:
+        if not enumeration.word_list:
+            enumeration.word_list = enumeration._word_list()
+        close = get_close_matches(name, enumeration.word_list)
+        if close:
+            message = "Error: Could not find '%s' in %s Items"
+            message += '\n\nDid you mean one of these?\n'
+            message = message % (name, label)
+            for s in close:
+                message += '    %s' % s
+
+            #handle return gracefully
+            print(message)
+
+    return found
+
+_PUNCTUATION = re.compile("[{}]".format(re.escape(string.punctuation)))
+
+_metric_names = {}
+_metric_names_lock = threading.Lock()
+
+def metric_names(catalog):
+    """
+    Return {attribute name: item code} for the item catalog, built once per
+    catalog version. Names are item descriptions without punctuation and with
+    spaces replaced by underscores; items without a description are named by
+    their code.
+    """
+    items = default_catalog()
+    version = items.version(catalog)
+    with _metric_names_lock:
+        cached = _metric_names.get(catalog)
+        if cached is None or cached[0] != version:
+            table = items.items(catalog)
+            names = {}
+            for code, description in table.iloc[:, :2].values.tolist():
+                if isinstance(description, six.string_types):
+                    name = _PUNCTUATION.sub('', description).replace(' ', '_')
+                else:
+                    #description is None and has been translated to NaN
+                    name = code
+                names[name] = code
+            cached = _metric_names[catalog] = (version, names)
+    return cached[1]
+
+class _ItemEnumeration(ArrayManagementClient):
+    """
+    Resolve item codes of the catalog `_catalog` as attributes on first
+    access, rather than setting one attribute per item at construction.
+    """
+    _catalog = None
 
     def __init__(self):
-        super(WS, self).__init__()
-        arr = self.aclient['/FUNDAMENTALS/WORLDSCOPE/wsitems.yaml']
-        df = arr.select(query_filter=None)
+        super(_ItemEnumeration, self).__init__()
         self.word_list = None
-        for t_metric in df.values:
-            name = t_metric[1].translate(None,
-                                         string.punctuation).replace(' ','_')
-            value = t_metric[0]
-            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        try:
+            return metric_names(self._catalog)[name]
+        except KeyError:
+            message = "'{}' object has no attribute or item '{}'"
+            raise AttributeError(message.format(type(self).__name__, name))
+
+    def __dir__(self):
+        names = set(dir(type(self))) | set(self.__dict__)
+        return sorted(names | set(metric_names(self._catalog)))
+
+class WS(_ItemEnumeration):
+    """
+    Worldscope item codes as attributes, e.g. `WS().CASH`.
+    """
+    _catalog = 'worldscope'
 
     def _word_list(self):
-        arr = self.aclient['/FUNDAMENTALS/WORLDSCOPE/wsitems.yaml']
-        df = arr.select(query_filter=None)
+        df = default_catalog().items('worldscope')
         word_list = df.Name.values.tolist()
 
         #lots of cleanup :)
@@ -34,52 +108,22 @@ class WS(ArrayManagementClient):
 
         return common
 
-    def find_metrics(self,name=None):
-        arr = self.aclient['/FUNDAMENTALS/WORLDSCOPE/wsitems.yaml']
-        df = arr.select(query_filter=None)
-        if not self.word_list:
-            self.word_list = self._word_list()
-
-        name = str(name)
-        found = df[df.Name.str.contains(name,case=False)]
-
-        if found.empty:
-            close = get_close_matches(name, self.word_list)
-            if close:
-                message = "Error: Could not find '%s' in Worldscope Items"
-                message += '\n\nDid you mean one of these?\n'
-                message = message % name
-                for s in close:
-                    message += '    %s' % s
+    def find_metrics(self, name=None, limit=None):
+        """
+        Return the Worldscope items best matching name, best first, which
+        are none if nothing matches. Words of name may be partial or
+        misspelt.
+        """
+        return _find_metrics(self, 'Worldscope', name, limit)
 
-                #handle return gracefully
-                print(message)
-                return None
-
-        return found
-
-class RKD(ArrayManagementClient):
-    def __init__(self):
-        super(RKD, self).__init__()
-        arr = self.aclient['/FUNDAMENTALS/RKD/rkditems.yaml']
-        df = arr.select(query_filter=None)
-        self.word_list = None
-        for t_metric in df.values:
-            try:
-                name = t_metric[1].translate(None,
-                                             string.punctuation).replace(' ','_')
-            except AttributeError:
-                #description is None and has been translated to NaN
-                #set name to COA
-
-                name = t_metric[0]
-
-            value = t_metric[0]
-            setattr(self, name, value)
+class RKD(_ItemEnumeration):
+    """
+    RKD COA codes as attributes, e.g. `RKD().Restaurants`.
+    """
+    _catalog = 'rkd'
 
     def _word_list(self):
-        arr = self.aclient['/FUNDAMENTALS/RKD/rkditems.yaml']
-        df = arr.select(query_filter=None)
+        df = default_catalog().items('rkd')
 
         #remove non null values
         df = df[df.DESC_.notnull()]
@@ -96,31 +140,12 @@ class RKD(ArrayManagementClient):
 
         return common
 
-    def find_metrics(self,name=None):
-        arr = self.aclient['/FUNDAMENTALS/RKD/rkditems.yaml']
-        df = arr.select(query_filter=None)
-        if not self.word_list:
-            self.word_list = self._word_list()
-
-        name = str(name)
-
-        df = df[df.DESC_.notnull()]
-        found = df[df.DESC_.str.contains(name,case=False)]
-
-        if found.empty:
-            close = get_close_matches(name, self.word_list)
-            if close:
-                message = "Error: Could not find '%s' in Worldscope Items"
-                message += '\n\nDid you mean one of these?\n'
-                message = message % name
-                for s in close:
-                    message += '    %s' % s
-
-                #handle return gracefully
-                print(message)
-                return None
-
-        return found
+    def find_metrics(self, name=None, limit=None):
+        """
+        Return the RKD items best matching name, best first, which are none
+        if nothing matches. Words of name may be partial or misspelt.
+        """
+        return _find_metrics(self, 'RKD', name, limit)
 
 
 class DS(object):
@@ -0,0 +1,325 @@
+"""
+Point-in-time panels of fundamentals and prices for a `Universe`.
+
+A panel has one row per (calendar date, security) with, for each requested
+Worldscope metric, the value of the latest report available on that date,
+and for each requested price column, the latest price on or before it. All
+metrics are fetched by one query and all prices by another, run together,
+and the result is assembled in place rather than through merges.
+
+    panel = universe.panel([2001, 1751], pd.date_range("2012-01-31",
+                                                       "2012-12-31",
+                                                       freq="M"))
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import six
+import datetime as dt
+import numpy as np
+import pandas as pd
+from multiprocessing.pool import ThreadPool
+from estuarial.array.interval_cache import select_in_range
+from estuarial.browse.metrics_manager import metric_names
+from estuarial.util.munging import lower_columns
+
+_FUNDAMENTALS_URL = "/FUNDAMENTALS/WORLDSCOPE/worldscope_fundamentals.yaml"
+_PRICES_URL = "/DATASTREAM/datastream_basic.yaml"
+
+# Fundamentals are selected by fiscal year end, which for quarterly items
+# reported during a year can fall up to a year after the report.
+_FISCAL_YEAR = dt.timedelta(days=366)
+
+
+def _days(dates):
+    """
+    Return dates as int64 days since the epoch.
+    """
+    values = pd.DatetimeIndex(dates).values.astype("datetime64[D]")
+    return values.astype(np.int64)
+
+
+def asof_positions(codes, days, target_codes, target_days, max_age=None,
+                   tiebreak=()):
+    """
+    Find, for every target (code, day), the source row with the same code
+    and the latest day on or before the target day.
+
+    Params
+    ------
+    codes: int array of non-negative security positions of the source rows.
+
+    days: int array of the days of the source rows.
+
+    target_codes: int array of the security positions of the targets.
+
+    target_days: int array of the days of the targets.
+
+    max_age: Optional number of days beyond which a source row is too old
+    to be used.
+
+    tiebreak: Sequence of arrays ordering source rows sharing a code and day,
+    least significant first; the greatest is used.
+
+    Returns
+    -------
+    int array of source row positions, -1 where there is none.
+    """
+    positions = np.empty(len(target_codes), dtype=np.int64)
+    positions.fill(-1)
+    if not len(codes) or not len(target_codes):
+        return positions
+
+    order = np.lexsort(list(tiebreak) + [days, codes])
+    codes, days = codes[order], days[order]
+
+    # Combine code and day into one sorted key to search all codes at once.
+    first = min(days.min(), target_days.min())
+    span = max(days.max(), target_days.max()) - first + 1
+    keys = codes.astype(np.int64) * span + (days - first)
+    target_keys = target_codes.astype(np.int64) * span + (target_days - first)
+
+    found = np.searchsorted(keys, target_keys, side="right") - 1
+    valid = found >= 0
+    valid[valid] = codes[found[valid]] == target_codes[valid]
+    if max_age is not None:
+        valid[valid] = (target_days[valid] - days[found[valid]]) <= max_age
+    positions[valid] = order[found[valid]]
+    return positions
+
+
+class Panel(object):
+    """
+    Plans and builds the point-in-time panel of a universe.
+
+    The seccodes of the universe are taken once and passed unchanged to both
+    queries. Fundamentals are available from their report date. Worldscope
+    rows without a report date are dropped, unless report_lag is given: the
+    fiscal period end alone would make a value available before it was
+    reported, a look-ahead bias.
+
+    Examples
+    --------
+        panel = Panel(universe, {"cash": 2001, "ni": 1751}, calendar,
+                      prices=["close_", "volume"], dtype="float32")
+        panel.build()
+    """
+
+    def __init__(self, universe, metrics, calendar, prices=("close_",),
+                 freq="Q", dtype="float64", fundamentals_age=366,
+                 price_age=7, report_lag=None):
+        """
+        Params
+        ------
+        universe: The `Universe` whose securities make up the panel.
+
+        metrics: Worldscope items, given as a list of item codes or metric
+        names (see `WS.find_metrics`), or as a dict of column names to item
+        codes.
+
+        calendar: Dates of the panel rows.
+
+        prices: Datastream price columns to include, e.g. "close_",
+        "volume" or "vwap".
+
+        freq: Worldscope frequency of the metrics.
+
+        dtype: Float dtype of the metric and price columns, e.g. "float32"
+        to halve their size.
+
+        fundamentals_age: Days after its report date for which a value is
+        used.
+
+        price_age: Days after its market date for which a price is used.
+
+        report_lag: Optional days after its fiscal period end from which a
+        value without a report date is taken as available, e.g. 90. Such
+        values are dropped when it is None.
+
+        Returns
+        -------
+        None.
+        """
+        self.universe = universe
+        self.metrics = self._resolve_metrics(metrics)
+        self.calendar = pd.DatetimeIndex(sorted(set(
+            pd.DatetimeIndex(calendar).normalize())))
+        self.prices = [price.lower() for price in prices]
+        self.freq = freq
+        self.dtype = np.dtype(dtype)
+        self.fundamentals_age = fundamentals_age
+        self.price_age = price_age
+        self.report_lag = report_lag
+
+    @staticmethod
+    def _resolve_metrics(metrics):
+        """
+        Return a list of (column name, item code) pairs.
+        """
+        if isinstance(metrics, dict):
+            return sorted(metrics.items())
+
+        names = None
+        resolved = []
+        for metric in metrics:
+            if isinstance(metric, six.string_types):
+                if names is None:
+                    names = metric_names('worldscope')
+                if metric not in names:
+                    raise KeyError("Unknown Worldscope metric '{}'. Use "
+                                   "WS.find_metrics to look up items."
+                                   .format(metric))
+                resolved.append((metric, int(names[metric])))
+            else:
+                resolved.append((metric, int(metric)))
+        return resolved
+
+    def queries(self):
+        """
+        Return the planned queries as (url, start, end, conditions, cached)
+        tuples, at most one for all fundamentals and one for all prices.
+        Only prices go through the interval cache, as fundamentals are
+        restated and reported late.
+        """
+        if not len(self.calendar):
+            return []
+        first, last = self.calendar[0], self.calendar[-1]
+
+        planned = []
+        if self.metrics:
+            arr = self.universe.aclient[_FUNDAMENTALS_URL]
+            items = sorted(set(code for _, code in self.metrics))
+            age = self.fundamentals_age + (self.report_lag or 0)
+            planned.append((_FUNDAMENTALS_URL,
+                            first - dt.timedelta(days=age),
+                            last + _FISCAL_YEAR,
+                            [arr.item.in_(items), arr.freq == self.freq],
+                            False))
+        if self.prices:
+            planned.append((_PRICES_URL,
+                            first - dt.timedelta(days=self.price_age), last,
+                            [], True))
+        return planned
+
+    def fetch(self):
+        """
+        Run the planned queries concurrently.
+
+        Returns
+        -------
+        dict of url to the DataFrame fetched, with lower case columns.
+        """
+        seccodes = self.universe.seccodes.tolist()
+        aclient = self.universe.aclient
+
+        def run(query):
+            url, start, end, conditions, cached = query
+            return url, lower_columns(select_in_range(
+                aclient, url, 'seccode', seccodes, start, end,
+                conditions=conditions, cached=cached))
+
+        planned = self.queries()
+        if len(planned) <= 1:
+            return dict(run(query) for query in planned)
+
+        pool = ThreadPool(len(planned))
+        try:
+            return dict(pool.map(run, planned))
+        finally:
+            pool.close()
+            pool.join()
+
+    def build(self):
+        """
+        Fetch and align the data.
+
+        Returns
+        -------
+        pandas DataFrame with columns date, seccode, the metrics and the
+        prices, sorted by date and then seccode. seccode is categorical where
+        pandas supports it.
+        """
+        seccodes = self.universe.seccodes
+        dates = self.calendar
+        target_codes = np.tile(np.arange(len(seccodes)), len(dates))
+        target_days = np.repeat(_days(dates), len(seccodes))
+
+        columns = [name for name, _ in self.metrics] + self.prices
+        block = np.empty((len(target_codes), len(columns)), dtype=self.dtype)
+        block.fill(np.nan)
+
+        fetched = self.fetch()
+        column = 0
+
+        fundamentals = fetched.pop(_FUNDAMENTALS_URL, None)
+        if fundamentals is not None and len(fundamentals):
+            codes, known = self._positions(seccodes, fundamentals.seccode)
+            available = pd.to_datetime(fundamentals.ddate)
+            if self.report_lag is not None:
+                lag = np.timedelta64(self.report_lag, 'D')
+                available = available.fillna(
+                    pd.to_datetime(fundamentals.date) + lag)
+            days = _days(available)
+            items = fundamentals.item.values
+            values = fundamentals.value_.values
+            tiebreak = [fundamentals.seq.values, fundamentals.year_.values]
+            del fundamentals
+
+            for name, code in self.metrics:
+                rows = known & (items == code) & ~pd.isnull(available.values)
+                positions = asof_positions(
+                    codes[rows], days[rows], target_codes, target_days,
+                    self.fundamentals_age, [key[rows] for key in tiebreak])
+                self._gather(block[:, column], values[rows], positions)
+                column += 1
+        else:
+            column += len(self.metrics)
+
+        prices = fetched.pop(_PRICES_URL, None)
+        if prices is not None and len(prices):
+            codes, known = self._positions(seccodes, prices.seccode)
+            positions = asof_positions(
+                codes[known], _days(prices.marketdate)[known], target_codes,
+                target_days, self.price_age)
+            for price in self.prices:
+                self._gather(block[:, column], prices[price].values[known],
+                             positions)
+                column += 1
+
+        panel = pd.DataFrame(block, columns=columns, copy=False)
+        panel.insert(0, 'seccode', self._seccode_column(seccodes,
+                                                        target_codes))
+        panel.insert(0, 'date', np.repeat(dates.values, len(seccodes)))
+        return panel
+
+    @staticmethod
+    def _positions(seccodes, column):
+        """
+        Return the positions in the sorted seccodes of the values of column,
+        and the mask of the values that are in the universe.
+        """
+        values = np.asarray(column, dtype=seccodes.dtype)
+        positions = np.searchsorted(seccodes, values)
+        positions[positions == len(seccodes)] = 0
+        known = seccodes[positions] == values if len(seccodes) else (
+            np.zeros(len(values), dtype=bool))
+        return positions, known
+
+    @staticmethod
+    def _gather(out, values, positions):
+        """
+        Fill out with values at positions, leaving NaN where there is none.
+        """
+        found = positions >= 0
+        out[found] = np.asarray(values, dtype=float)[positions[found]]
+
+    @staticmethod
+    def _seccode_column(seccodes, target_codes):
+        """
+        Return the seccode column, categorical when pandas supports it.
+        """
+        if hasattr(pd.Categorical, 'from_codes'):
+            return pd.Categorical.from_codes(target_codes.astype(np.int32),
+                                             seccodes)
+        return seccodes[target_codes]
@@ -0,0 +1,132 @@
+"""
+Local store of saved universes keyed by the content hash of their
+definition, so that a universe built once, e.g. the S&P 500 on a given date,
+is loaded from disk by every later process instead of being queried again.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import shutil
+import threading
+import datetime as dt
+import pandas as pd
+from os.path import join as pjoin
+from estuarial.browse.universe import Universe
+from estuarial.util.config.config import Config, UserConfigDir
+
+_SNAPSHOT_DIR = pjoin(UserConfigDir, "universes")
+_TEMP_PREFIX = ".tmp-"
+_DISABLED = ("off", "no", "false", "0")
+
+
+class SnapshotStore(object):
+    """
+    Saved universes, one columnar directory per `Universe.key`.
+
+    Examples
+    --------
+        store = SnapshotStore()
+        universe = store.get(snapshot_key(query, params))
+        if universe is None:
+            universe = store.put(build(query, params))
+    """
+
+    def __init__(self, path=_SNAPSHOT_DIR):
+        """
+        Params
+        ------
+        path: Directory holding the saved universes. Created if needed.
+
+        Returns
+        -------
+        None.
+        """
+        self.path = path
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+
+    def get(self, key, max_age=None):
+        """
+        Return the universe saved under key, or None if there is none, it
+        was saved in an older format, or it is older than max_age.
+
+        Params
+        ------
+        key: The `Universe.key` of the universe.
+
+        max_age: Optional timedelta. A universe whose as-of time is longer
+        ago is removed and treated as missing.
+
+        Returns
+        -------
+        A `Universe` or None.
+        """
+        try:
+            universe = Universe.load(pjoin(self.path, key))
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+        if (max_age is not None and
+                pd.Timestamp(dt.datetime.utcnow()) - universe.as_of >
+                max_age):
+            shutil.rmtree(pjoin(self.path, key), ignore_errors=True)
+            return None
+        return universe
+
+    def put(self, universe):
+        """
+        Save universe under its key, unless another process already has.
+
+        Returns
+        -------
+        The universe saved under its key as loaded back, so that it has the
+        same dtypes as later loads, or universe itself if it could not be
+        saved.
+        """
+        path = pjoin(self.path, universe.key)
+        if not os.path.isdir(path):
+            temp = pjoin(self.path, "{}{}-{}-{}".format(
+                _TEMP_PREFIX, universe.key, os.getpid(),
+                threading.current_thread().ident))
+            try:
+                universe.save(temp)
+                os.rename(temp, path)
+            except (IOError, OSError):
+                # Saved concurrently by another process or thread, or the
+                # disk is not writable; the universe is still usable.
+                shutil.rmtree(temp, ignore_errors=True)
+
+        saved = self.get(universe.key)
+        return universe if saved is None else saved
+
+    def clear(self):
+        """
+        Remove every saved universe.
+        """
+        for name in os.listdir(self.path):
+            shutil.rmtree(pjoin(self.path, name), ignore_errors=True)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """
+    Return the process-wide `SnapshotStore` under `~/.estuarial`, creating
+    it on first use, or None when the 'UniverseSnapshots' entry of the
+    ESTUARIAL section of estuarial.ini turns it off.
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            enabled = Config().get('ESTUARIAL', 'UniverseSnapshots', "on")
+            if str(enabled).lower() in _DISABLED:
+                return None
+            _default_store = SnapshotStore()
+    return _default_store
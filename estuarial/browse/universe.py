@@ -1,19 +1,160 @@
 from __future__ import print_function, division, absolute_import
 
 import datetime as dt
+import numpy as np
+import pandas as pd
 import estuarial.util.indexing as indexing
+from estuarial.browse.panel import Panel
+from estuarial.array.result_cache import cache_key
+from estuarial.util.columnar import ColumnarStore, write_frame
 from sqlalchemy.sql import column, and_, or_
 from estuarial.array.arraymanagementclient import ArrayManagementClient
 
+# Bumped whenever the saved metadata changes incompatibly.
+SNAPSHOT_VERSION = 1
+
+def snapshot_key(query, params):
+    """
+    Return the content hash of a universe definition: the query text and
+    the parameters (e.g. index ticker and date) it was selected with.
+    """
+    return cache_key(SNAPSHOT_VERSION, query, params)
+
 class Universe(ArrayManagementClient):
     """
     universe object
     """
 
-    def __init__(self, DataFrame, Query=None):
+    def __init__(self, DataFrame, Query=None, params=None, as_of=None):
         super(Universe, self).__init__()
         self.data = DataFrame
         self._sql = Query
+        self.params = dict(params or {})
+        self.as_of = pd.Timestamp(as_of if as_of is not None
+                                  else dt.datetime.utcnow())
+        self._seccodes = None
+
+    @property
+    def key(self):
+        """
+        Content hash of the universe definition, see `snapshot_key`.
+        """
+        return snapshot_key(self._sql, self.params)
+
+    def save(self, path):
+        """
+        Save the universe as a columnar store, with its query, parameters and
+        as-of time.
+
+        Params
+        ------
+        path: Directory of the store. An existing store there is replaced.
+
+        Returns
+        -------
+        path.
+        """
+        metadata = {"snapshot_version": SNAPSHOT_VERSION,
+                    "query": self._sql,
+                    "params": self.params,
+                    "as_of": self.as_of.isoformat(),
+                    "key": self.key}
+        return write_frame(path, self.data, metadata=metadata)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a universe saved by `save`.
+
+        Params
+        ------
+        path: Directory of the store.
+
+        Returns
+        -------
+        Universe.
+        """
+        store = ColumnarStore(path)
+        metadata = store.metadata
+        if metadata.get("snapshot_version") != SNAPSHOT_VERSION:
+            message = "Universe {} has snapshot version {}, expected {}"
+            raise ValueError(message.format(
+                path, metadata.get("snapshot_version"), SNAPSHOT_VERSION))
+        return cls(store.to_frame(), metadata["query"],
+                   params=metadata["params"], as_of=metadata["as_of"])
+
+    @property
+    def seccodes(self):
+        """
+        Sorted unique seccodes of the universe, computed once for as long as
+        `data` is not replaced.
+        """
+        if self._seccodes is None or self._seccodes[0] is not self.data:
+            codes = np.unique(np.asarray(self.data.seccode, dtype=np.int64))
+            self._seccodes = (self.data, codes)
+        return self._seccodes[1]
+
+    def panel(self, metrics, calendar, prices=("close_",), freq="Q",
+              dtype="float64", fundamentals_age=366, price_age=7,
+              report_lag=None):
+        """
+        Build a point-in-time panel of the universe.
+
+        Params
+        ------
+        metrics: Worldscope item codes or metric names, or a dict of column
+        names to item codes.
+
+        calendar: Dates of the panel rows.
+
+        prices: Datastream price columns to include.
+
+        freq: Worldscope frequency of the metrics.
+
+        dtype: Float dtype of the metric and price columns, e.g. "float32".
+
+        fundamentals_age: Days after its report date for which a value is
+        used.
+
+        price_age: Days after its market date for which a price is used.
+
+        report_lag: Optional days after its fiscal period end from which a
+        value without a report date is used. Such values are dropped when it
+        is None.
+
+        Returns
+        -------
+        pandas DataFrame with one row per date and seccode. See `Panel`.
+
+        Examples
+        --------
+            universe.panel({"ni": 1751, "cash": 2001},
+                           pd.date_range("2012-01-31", "2012-12-31",
+                                         freq="M"), dtype="float32")
+        """
+        return Panel(self, metrics, calendar, prices=prices, freq=freq,
+                     dtype=dtype, fundamentals_age=fundamentals_age,
+                     price_age=price_age, report_lag=report_lag).build()
+
+    @property
+    def metrics(self):
+        """
+        Items of the metric registry by name, fetched together per source,
+        e.g. `universe.metrics['cash', 'ni'][start:stop]`. See
+        `estuarial.util.indexing.register_metric`.
+        """
+        if self.__dict__.get('_metrics') is None:
+            self._metrics = indexing._MetricSelector(self)
+        return self._metrics
+
+    def __getattr__(self, name):
+        # Metrics registered after import, e.g. universe.eps[start:stop].
+        if not name.startswith('_') and name in indexing.registered_metrics():
+            indexer = indexing._MetricIndexer(self, name)
+            setattr(self, name, indexer)
+            return indexer
+        message = "'{}' object has no attribute '{}'"
+        raise AttributeError(message.format(type(self).__name__, name))
 
     def __repr__(self):
         return ("TR Universe")
@@ -1,11 +1,25 @@
 from __future__ import print_function, division, absolute_import
 
+import datetime
+import pandas as pd
 from sqlalchemy.sql import column, and_, or_
-from arraymanagement.client import ArrayClient
-from estuarial.browse.universe import Universe
+from estuarial.browse.universe import Universe, snapshot_key
+from estuarial.browse.snapshots import default_store
 from estuarial.array.arraymanagementclient import ArrayManagementClient
+from estuarial.array.execution import select_in
 from estuarial.util.munging import lower_columns
 
+_COUNTRY_URL = '/UNIVERSE_SQL/country_universe.yaml'
+
+# index ticker -> membership query
+_INDEX_URLS = {'SPX_IDX': '/UNIVERSE_SQL/spx_universe.yaml',
+               'DJX_IDX': '/UNIVERSE_SQL/dowjones_universe.yaml'}
+
+# Index membership of dates less than _SETTLED ago may still be loaded or
+# revised, so their snapshots are only reused for _RECENT_AGE.
+_SETTLED = datetime.timedelta(days=7)
+_RECENT_AGE = datetime.timedelta(days=1)
+
 class UniverseBuilder(ArrayManagementClient):
     """
     universe builder and pre-defined universes
@@ -17,26 +31,170 @@ class UniverseBuilder(ArrayManagementClient):
         super(UniverseBuilder, self).__init__()
 
     @classmethod
-    def us(self):
+    def countries(cls, codes, statuscode='A', typecode='EQ', snapshots=True):
+        """
+        Build the universes of many countries with one query.
+
+        :type codes: list
+        :param codes: Country codes of the trading country, e.g. ['US', 'CA']
+
+        :type statuscode: string
+        :param statuscode: Security status, 'A' for active
+
+        :type typecode: string
+        :param typecode: Security type, 'EQ' for equities
+
+        :type snapshots: bool
+        :param snapshots: Load universes already built today from the
+        snapshot store, and save the others to it
+
+        :rtype: dict
+        :return: Universe of each country code, empty for codes without
+        securities
+        """
+        # Country universes reflect the current status, so a snapshot is
+        # only valid on the day it was built.
+        today = datetime.date.today().isoformat()
+        params = dict((code, {'url': _COUNTRY_URL, 'ctrytradedin': code,
+                              'statuscode': statuscode,
+                              'typecode': typecode, 'date': today})
+                      for code in codes)
+
         conn = ArrayManagementClient()
-        arr = conn.aclient['/UNIVERSE_SQL/country_universe.yaml']
-        df = arr.select(and_(arr.ctrytradedin=='US',
-			     arr.statuscode=='A',
-			     arr.typecode=='EQ'))
-        query = arr.query
-        df = lower_columns(df)
-        return Universe(df,query)
+        try:
+            arr = conn.aclient[_COUNTRY_URL]
+            store, universes, missing = cls._snapshots(arr.query, params,
+                                                       snapshots)
+            if missing:
+                df = select_in(conn.aclient, _COUNTRY_URL, 'ctrytradedin',
+                               sorted(missing),
+                               conditions=[arr.statuscode==statuscode,
+                                           arr.typecode==typecode])
+                df = lower_columns(df)
+                countries = cls._text(df.ctrytradedin)
+                universes.update(cls._split(df, arr.query, store, [
+                    (code, countries == code, params[code])
+                    for code in missing]))
+        finally:
+            conn.close()
+        return universes
 
     @classmethod
-    def can(self):
+    def indices(cls, pairs, snapshots=True):
+        """
+        Build the universes of many (index, date) pairs with one query per
+        index membership yaml.
+
+        :type pairs: list
+        :param pairs: (index ticker, date) pairs, where the ticker is one of
+        'SPX_IDX' or 'DJX_IDX'
+
+        :type snapshots: bool
+        :param snapshots: Load universes already built from the snapshot
+        store, and save the others to it. Universes of the last week are only
+        loaded for a day after they were built
+
+        :rtype: dict
+        :return: Universe of each (index ticker, date) pair, empty for dates
+        without membership data
+        """
+        by_url = {}
+        for ticker, date in pairs:
+            if ticker not in _INDEX_URLS:
+                valid = ' '.join(sorted(_INDEX_URLS))
+                raise KeyError("Not a valid index please use one of: "
+                               "{}".format(valid))
+            url = _INDEX_URLS[ticker]
+            by_url.setdefault(url, {})[(ticker, date)] = {
+                'url': url, 'iticker': ticker,
+                'date_': pd.Timestamp(date).strftime('%Y-%m-%d')}
+
+        settled = pd.Timestamp(datetime.date.today() - _SETTLED)
+        universes = {}
         conn = ArrayManagementClient()
-        arr = conn.aclient['/UNIVERSE_SQL/country_universe.yaml']
-        df = arr.select(and_(arr.ctrytradedin=='CA',
-			     arr.statuscode=='A',
-			     arr.typecode=='EQ'))
-        query = arr.query
-        df = lower_columns(df)
-        return Universe(df,query)
+        try:
+            for url, params in sorted(by_url.items()):
+                arr = conn.aclient[url]
+                max_ages = dict((key, _RECENT_AGE) for key in params
+                                if pd.Timestamp(key[1]) > settled)
+                store, found, missing = cls._snapshots(arr.query, params,
+                                                       snapshots, max_ages)
+                universes.update(found)
+                if not missing:
+                    continue
+                tickers = sorted(set(ticker for ticker, _ in missing))
+                dates = sorted(set(pd.Timestamp(date).to_pydatetime()
+                                   for _, date in missing))
+                df = select_in(conn.aclient, url, 'date_', dates,
+                               conditions=[arr.iticker.in_(tickers)])
+                df = lower_columns(df)
+                members = cls._text(df.iticker)
+                member_dates = pd.to_datetime(df.date_)
+                universes.update(cls._split(df, arr.query, store, [
+                    ((ticker, date),
+                     (members == ticker) &
+                     (member_dates == pd.Timestamp(date)).values,
+                     params[(ticker, date)])
+                    for ticker, date in missing]))
+        finally:
+            conn.close()
+        return universes
+
+    @staticmethod
+    def _snapshots(query, params, enabled, max_ages=None):
+        """
+        Load the saved universes of the {key: params} definitions, those of
+        the keys of max_ages only if saved less than their timedelta ago.
+
+        :rtype: tuple
+        :return: (snapshot store or None, {key: Universe} of those loaded,
+        list of the keys of the others)
+        """
+        store = default_store() if enabled else None
+        found = {}
+        for key, key_params in params.items():
+            universe = None
+            if store is not None:
+                universe = store.get(snapshot_key(query, key_params),
+                                     (max_ages or {}).get(key))
+            if universe is not None:
+                found[key] = universe
+        missing = [key for key in params if key not in found]
+        return store, found, missing
+
+    @staticmethod
+    def _text(column):
+        """
+        Return the values of a text column without the trailing blanks the
+        database ignores when comparing.
+        """
+        return column.astype(str).str.strip().values
+
+    @staticmethod
+    def _split(df, query, store, selections):
+        """
+        Return {key: Universe} of the rows of df selected by each
+        (key, mask, params), saving them to store unless it is None. Saved
+        universes are returned as loaded back, with the dtypes of later
+        loads. Empty universes are not saved, as their data may only be
+        missing so far.
+        """
+        universes = {}
+        for key, mask, params in selections:
+            universe = Universe(df[mask].reset_index(drop=True), query,
+                                params=params)
+            if store is not None and len(universe.data):
+                universe = store.put(universe)
+            universes[key] = universe
+        return universes
+
+    @classmethod
+    def us(self, snapshots=True):
+        return self.countries(['US'], snapshots=snapshots)['US']
+
+    @classmethod
+    def can(self, snapshots=True):
+        return self.countries(['CA'], snapshots=snapshots)['CA']
 
     @classmethod
     def djx_idx(self, dt):
@@ -44,12 +202,7 @@ class UniverseBuilder(ArrayManagementClient):
         :param dt: DateTime
         :return: Dow Jones Universe on a given date
         """
-        conn = ArrayManagementClient()
-        arr = conn.aclient['/UNIVERSE_SQL/dowjones_universe.yaml']
-        df = arr.select(and_(arr.iticker=='DJX_IDX',arr.date_==dt))
-        query = arr.query
-        df = lower_columns(df)
-        return Universe(df,query)
+        return self.indices([('DJX_IDX', dt)])[('DJX_IDX', dt)]
 
     @classmethod
     def spx_idx(self,dt):
@@ -57,12 +210,4 @@ class UniverseBuilder(ArrayManagementClient):
         :param dt: DateTime
         :return: SP500 Universe on a given date
         """
-        conn = ArrayManagementClient()
-        arr = conn.aclient['/UNIVERSE_SQL/spx_universe.yaml']
-        df = arr.select(and_(arr.iticker=='SPX_IDX',arr.date_==dt))
-        query = arr.query
-        df = lower_columns(df)
-        return Universe(df,query)
-
-
-
+        return self.indices([('SPX_IDX', dt)])[('SPX_IDX', dt)]
@@ -5,12 +5,24 @@ queries including support for common SQL operations on keyword args.
 Author: Ben Zaitlen and Ely Spears
 """
 import os
+import time
 import yaml
-from sqlalchemy import sql
+import six
+import hashlib
+import collections
+import numpy as np
+import pandas as pd
+from sqlalchemy import sql, exc
 import posixpath
+import threading
 from estuarial.util.config.config import expanduser
 from estuarial.data.keyword_handler import KeywordHandler
-from estuarial.array.arraymanagementclient import ArrayManagementClient
+from estuarial.array.arraymanagementclient import (ArrayManagementClient,
+                                                   CATALOG_DIR)
+from estuarial.array import execution, result_cache
+from estuarial.util.instrumentation import (instruments, CALL, COMPILE,
+                                            SELECT, CACHE_HIT, CACHE_MISS,
+                                            CACHE_WRITE)
 
 class QueryHandler(object):
     """
@@ -27,8 +39,7 @@ class QueryHandler(object):
     """
     # Base directory where the array backend searches for all files.
     # Should be determined by settings in library config. 
-    _BASE_DIR = os.path.abspath(ArrayManagementClient().basedir)
-    # TODO: remove reliance on constructing client to get directory name.
+    _BASE_DIR = os.path.abspath(CATALOG_DIR)
 
     _FILE_DIR = posixpath.join(_BASE_DIR, "CUSTOM_SQL")  # Dir for user-supplied yaml
     _DATA_ROOT = os.path.split(_BASE_DIR)[1]    # Root query dir name
@@ -39,11 +50,13 @@ class QueryHandler(object):
     _NO_ARG_DOC = "None.\n"                 # Param doc when no kwargs given
     _PARAMS_HEADER = "\n\nParams\n------\n" # Param header for docstring text
     _AUTOGEN_SUFFIX = ".autogen"            # Autogen dir name suffix
+    _SOURCE_HASH_FILE = ".source_sha1"      # Hash of yaml an autogen came from
     _SINGLE_QUERY_HEADER = "SQL"            # Required in single-query yamls
 
     _DOC = "doc"                   # docstring infor from yaml
     _QUERY = "query"               # raw query string from yaml
     _CONDITIONALS = "conditionals" # keyword arg names from yaml
+    _CACHE = "cache"               # whether results are cached, from yaml
     _KW_DELIMITER = "_"            # Used when augmenting keyword arg names.
 
     # Label for raised exception displayed when generated functions encounter
@@ -56,6 +69,11 @@ class QueryHandler(object):
     _QUERY_ATTR = "__{}_query"
     _KWARGS_ATTR = "_{}_kwargs"
 
+    # Types already created in this process, keyed by class_url, as
+    # (source hash, type) pairs. Shared by all QueryHandler instances.
+    _TYPE_CACHE = {}
+    _TYPE_CACHE_LOCK = threading.Lock()
+
     
     def _path_sanitizer(self, some_path):
         """
@@ -78,12 +96,64 @@ class QueryHandler(object):
         dirs = dirs.replace(os.path.sep, self._PATH_SEP)
         return dirs + self._PATH_SEP + file_name
 
+    def _read_source(self, class_url):
+        """
+        Read the composite yaml named by class_url.
+
+        Params
+        ------
+        class_url: String naming a relative path to a composite yaml. Path must
+        be relative to "<QueryHandler._BASEDIR>/CUSTOM_SQL/"
+
+        Returns
+        -------
+        As a 2-tuple, the raw contents of the file and their sha1 hex digest.
+        """
+        full_url = posixpath.join(self._FILE_DIR, class_url)
+        with open(full_url, 'rb') as stream:
+            source = stream.read()
+        return source, hashlib.sha1(source).hexdigest()
+
+    def _class_dir(self, class_url):
+        """
+        Return the autogen directory for the composite yaml class_url.
+        """
+        sanitized_url = self._path_sanitizer(class_url)
+        return (posixpath.join(self._AUTOGEN_DIR, sanitized_url) +
+                self._AUTOGEN_SUFFIX)
+
+    def _published_hash(self, class_dir):
+        """
+        Return the source hash recorded in an autogen directory, or None if
+        it was never completely published.
+        """
+        try:
+            with open(posixpath.join(class_dir, self._SOURCE_HASH_FILE)) as f:
+                return f.read().strip()
+        except IOError:
+            return None
+
+    def _atomic_write(self, path, text):
+        """
+        Write text to path through a temporary file and a rename, so that
+        concurrent readers and writers never see a partially written file.
+        """
+        temp_path = "{}.tmp-{}-{}".format(path, os.getpid(),
+                                          threading.current_thread().ident)
+        with open(temp_path, 'w') as output:
+            output.write(text)
+        os.rename(temp_path, path)
+
     def _publish_queries(self, class_url):
         """
         Creates a CUSTOM_SQL directory where the autogenerated queries will go.
         Publishes one yaml file per function key found in composite yaml named
         by class_url.
 
+        Publishing is content-addressed: the files are only written when the
+        sha1 of the composite yaml differs from the one recorded in the autogen
+        directory, and each file is written atomically (temp file + rename).
+
         Expects class_url to specify valid yaml, and for the url to be relative
         to "<_BASEDIR>/CUSTOM_SQL/".
 
@@ -114,11 +184,10 @@ class QueryHandler(object):
         # Ensure the relative class_url is extended to specify the full path
         # according to QueryHandler._FILE_DIR -- a parameter that should be 
         # part of the library config.
-        full_url = posixpath.join(self._FILE_DIR, class_url)
+        source, source_hash = self._read_source(class_url)
 
         # Acquire the query annotations from yaml file.
-        with open(full_url, 'r') as stream:
-            obj = yaml.load(stream, Loader=yaml.CLoader)
+        obj = yaml.load(source, Loader=yaml.CLoader)
 
         type_name = obj.keys()[0]     # Class name at absolute top of yaml.
         type_data = obj[type_name]    # Sub-dict of all data for this yaml.
@@ -126,9 +195,7 @@ class QueryHandler(object):
 
         # Create a sub-directory for placing any autogenerated single-query
         # yaml files that arise from the class_url's composite yaml.
-        sanitized_url = self._path_sanitizer(class_url)
-        class_dir = (posixpath.join(self._AUTOGEN_DIR, sanitized_url) +
-                     self._AUTOGEN_SUFFIX)
+        class_dir = self._class_dir(class_url)
 
         try:
             os.mkdir(class_dir)
@@ -138,9 +205,18 @@ class QueryHandler(object):
             if os_error.errno != 17:
                 raise os_error
 
+        # Only rewrite the autogen files when the source yaml has changed
+        # since they were last published, or some of them are missing.
+        query_files = dict(
+            (f_name, posixpath.join(class_dir, f_name) + self._YAML_EXT)
+            for f_name in func_names
+        )
+        if (self._published_hash(class_dir) == source_hash and
+                all(os.path.exists(f) for f in query_files.values())):
+            return query_files, type_name, type_data, func_names
+
         # Prepare the names of the autogenerated single-query yamls. Key these
         # on the name of the function they correspond to.
-        query_files = {}
         for f_name in func_names:
 
             # The single-query yaml files have a fixed convention of starting
@@ -151,14 +227,14 @@ class QueryHandler(object):
 
             # The file's path points to the created class directory and is
             # named <function_name>.yaml.
-            output_file = posixpath.join(class_dir, f_name) + self._YAML_EXT
-            
+            output_file = query_files[f_name]
+
             # Dump the contents as yaml to the file.
-            with open(output_file, 'w') as output:
-                yaml.dump(function_yaml, output)
+            self._atomic_write(output_file, yaml.dump(function_yaml))
 
-            # Record this autogen file location for later use.
-            query_files[f_name] = output_file
+        # Record the source hash last, marking the publish as complete.
+        self._atomic_write(posixpath.join(class_dir, self._SOURCE_HASH_FILE),
+                           source_hash)
 
         # Return a bunch of the metadata needed for creating the class
         # from the composite yaml.
@@ -206,7 +282,8 @@ class QueryHandler(object):
         return (known_args,   # List of known keyword arg names.
                 function_doc) # The full docstring for the created function.
 
-    def _function_factory(self, query_url, function_name, known_args):
+    def _function_factory(self, query_url, function_name, known_args,
+                          cached=False):
         """
         Given a query file path (containing a single query), the name of the
         function to be created, the data (doc and query string) from the yaml 
@@ -214,6 +291,14 @@ class QueryHandler(object):
         this method will create and return a function that performs the 
         described query.
 
+        The created function delegates to a `_CompiledQuery` which builds the
+        array node handle and the keyword dispatch table on first call and
+        reuses them afterwards. The `_CompiledQuery` is also exposed as the
+        `compiled_query` attribute of the returned function, and its
+        `iter_pages` as the `iter_pages` attribute. When cached is set,
+        results are cached on disk keyed by the contents of query_url and the
+        keyword arguments (see `estuarial.array.result_cache`).
+
         Params
         ------
         query_url: full path to single query file (optionally can just be the
@@ -224,93 +309,32 @@ class QueryHandler(object):
         known_args: a list of the keyword arguments, derived from the 
         "conditionals" key in the yaml.
 
+        cached: whether results are cached by default, from the "cache" key
+        in the yaml.
+
         Returns
         -------
         function: The created function object.
         """
         # Ensure that the url is relative to QueryHandler._DATA_ROOT.
         url = query_url.split(self._DATA_ROOT)[1]
-        
-        # Grab needed QueryHandler constants since referring to 'self' won't
-        # refer to QueryHandler in the function body below.
-        KW_DELIMITER = self._KW_DELIMITER
-        INVALID_KWARG_MSG = self._INVALID_KWARG_MSG
-
-        def function(self, **kwargs):                    
-            kwarg_responses = {}                   # Contain alchemy functions
-            alchemy_where_statements = []          # Contain WHERE clauses
-            aclient = ArrayManagementClient()      # Instantiate array backend
-            arr = aclient.aclient[url]             # Connect array to url
-            kw_handler = KeywordHandler(arr)       # Handler for sql binding
-            op_names = kw_handler.supported_ops()  # Supported comparison ops
-            sql_names = kw_handler.supported_sql() # Supported sql attributes
-
-            # Extend each basic kw_arg that comes form the yaml "conditionals"
-            # into a series of many keyword args, one for each supported SQL or
-            # OP known to KeywordHandler.
-            for base_arg in known_args:
-
-                # Remove case-sensitivity of conditional column names.
-                base_arg = base_arg.lower()
-
-                # For each alchemy attribute, bind that attribute of the 
-                # array's alchemy-based version of base_arg to a new keyword 
-                # arg name that augments base_arg with the sql attribute name.
-                for sql_name in sql_names:
-                    compound_arg = base_arg + KW_DELIMITER + sql_name
-                    kwarg_responses[compound_arg] = (
-                        kw_handler.sql_bind(base_arg, sql_name))
-
-                # For each regular comparison operator, "op", supported, bind a 
-                # lambda (from KeywordHandler) that will perform 
-                # op(base_arg, val) whenever passed "val" as an argument.
-                for op_name in op_names:
-                    if op_name == "": # Special case of "==" bound to base_arg.
-                        compound_arg = base_arg
-                    else:
-                        compound_arg = base_arg + KW_DELIMITER + op_name
-                    kwarg_responses[compound_arg] = (
-                        kw_handler.op_bind(base_arg, op_name))
-
-            # Look at the actual keywords and values supplied when the user 
-            # calls the function. Look up the appropriate bound response as 
-            # added to kwarg_responses above, and invoke it on the user 
-            # supplied value. This generates a bound alchemy WHERE conditon.
-            # Accumulate all such WHERE conditions for passing into select.
-            for user_supplied_kw, user_supplied_val in kwargs.iteritems():
-                lower_kw = user_supplied_kw.lower()
-
-                # Fetch the function to use in response to this keyword.
-                try:
-                    response_function = kwarg_responses[lower_kw]
-                except KeyError as key_error:
-                    message = (INVALID_KWARG_MSG + 
-                               "unrecognized keyword argument '{}'")
-                    raise TypeError(message.format(lower_kw))
-
-                # Depending on what type of sequence the user supplied value
-                # is, call the response function on the value's contents.
-                if isinstance(user_supplied_val, (tuple, list, set)):
-                    where_condition = response_function(*user_supplied_val)
-                elif isinstance(user_supplied_val, dict):
-                    where_condition = response_function(**user_supplied_val)
-                else:
-                    where_condition = response_function(user_supplied_val)
-                # TODO: should the arg unpacking above handle numpy arrays or
-                # Pandas?
-
-                # Append the resultant alchemy-bound statement to build the
-                # list of WHERE conditionals.
-                alchemy_where_statements.append(where_condition)
-                    
-            # Combine all of the WHERE conditionals with AND. If there are no
-            # conditions, use None to denote running an unconditional query.
-            select_arg = (sql.and_(*alchemy_where_statements) 
-                          if alchemy_where_statements else None)
-                    
-            # Return the result of the array client's selection using the built
-            # WHERE conditionals.
-            return arr.select(select_arg)
+
+        # All per-call setup (array client, node lookup, keyword bindings) is
+        # deferred to the compiled query and performed at most once.
+        compiled_query = _CompiledQuery(url,
+                                        known_args,
+                                        self._KW_DELIMITER,
+                                        self._INVALID_KWARG_MSG,
+                                        source_path=query_url,
+                                        cached=cached)
+
+        def function(self, **kwargs):
+            return compiled_query(**kwargs)
+
+        # Expose the compiled query so callers can inspect or reset it, and
+        # its paginated form, e.g. `obj.econ_data.iter_pages(...)`.
+        function.compiled_query = compiled_query
+        function.iter_pages = compiled_query.iter_pages
 
         # Return the constructed function.
         return function
@@ -320,7 +344,21 @@ class QueryHandler(object):
         Expects class_url to point to a properly formatted .yaml file
         for ingesting a set of related queries as functions exposed
         on a new class.
+
+        Created types are cached per class_url for the life of the process and
+        reused while the yaml and its published autogen files are unchanged.
         """
+        # Reuse the type created earlier from identical yaml, as long as its
+        # autogen files are still published.
+        source, source_hash = self._read_source(class_url)
+        with self._TYPE_CACHE_LOCK:
+            cached_hash, cached_type = self._TYPE_CACHE.get(class_url,
+                                                            (None, None))
+        if (cached_hash == source_hash and
+                self._published_hash(self._class_dir(class_url)) ==
+                source_hash):
+            return cached_type
+
         type_dict = {} # Container for attributes for created class.
 
         # Get necessary data extracted from composite yaml.
@@ -343,8 +381,10 @@ class QueryHandler(object):
             # Argument names and function docstring.
             known_args, function_doc = self._publish_docstring(function_desc)
 
-            # Create the function wrapper for this query.
-            f = self._function_factory(query_url, function_name, known_args)
+            # Create the function wrapper for this query, caching its results
+            # only when the yaml asks for it.
+            f = self._function_factory(query_url, function_name, known_args,
+                                       function_desc.get(self._CACHE, False))
 
             # Patch name and docstring intended by the user.
             f.__name__, f.__doc__ = function_name, function_doc
@@ -355,9 +395,407 @@ class QueryHandler(object):
             type_dict[self._QUERY_ATTR.format(function_name)] = query
             type_dict[self._KWARGS_ATTR.format(function_name)] = known_args
 
-        # Return created class object.
-        return type(type_name, (object,), type_dict)        
-        
+        # Cache and return created class object.
+        created_type = type(type_name, (object,), type_dict)
+        with self._TYPE_CACHE_LOCK:
+            self._TYPE_CACHE[class_url] = (source_hash, created_type)
+        return created_type
+
+
+class Page(collections.namedtuple("Page", ["frame", "after"])):
+    """
+    One page yielded by `_CompiledQuery.iter_pages`: the DataFrame of its
+    rows, and the key of its last row, to be passed as `after` to resume the
+    iteration following this page.
+    """
+    __slots__ = ()
+
+
+def _key_value(value):
+    """
+    Convert a value taken from a DataFrame into a plain Python value that
+    database drivers can bind.
+    """
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class _CompiledQuery(object):
+    """
+    The array node handle and keyword dispatch table behind a single function
+    generated by `QueryHandler._function_factory`.
+
+    Both are built lazily on the first call and then reused, so that each call
+    of the generated function only does work proportional to the number of
+    keyword arguments actually supplied.
+
+    When constructed with the path of its yaml and cached set, results are
+    also kept in a persistent `ResultCache`. The reserved keyword arguments
+    `use_cache` (True or False to cache this call or not, whatever cached
+    says) and `refresh_cache=True` (query and replace the cached result)
+    control it per call.
+    """
+    _USE_CACHE = "use_cache"
+    _REFRESH_CACHE = "refresh_cache"
+
+    # Attempts made at a page whose connection failed, and the delay in
+    # seconds before the first retry, doubled for each further one.
+    _PAGE_RETRIES = 3
+    _RETRY_DELAY = 1.0
+
+    def __init__(self, url, known_args, kw_delimiter, invalid_kwarg_msg,
+                 source_path=None, cache=None, cached=False):
+        """
+        Record what is needed to compile the query, without touching the array
+        backend.
+
+        Params
+        ------
+        url: String naming the single-query yaml relative to the data root.
+
+        known_args: A list of the keyword arguments, derived from the
+        "conditionals" key in the yaml.
+
+        kw_delimiter: String used to join conditional names with the names of
+        supported SQL attributes and operators.
+
+        invalid_kwarg_msg: Label prefixed to the message of the `TypeError`
+        raised for unrecognized keyword arguments.
+
+        source_path: Optional full path of the single-query yaml. Its
+        contents are part of the result cache key; results are only cached
+        when it is given.
+
+        cache: Optional `ResultCache`, defaulting to the process-wide one.
+
+        cached: Whether calls are cached when they do not pass `use_cache`.
+        Off by default, since a cached result goes stale once the data it
+        covers changes, e.g. for a query of the latest prices.
+
+        Returns
+        -------
+        None.
+        """
+        self.url = url
+        self.known_args = known_args
+        self.source_path = source_path
+        self.cached = cached
+        self._kw_delimiter = kw_delimiter
+        self._invalid_kwarg_msg = invalid_kwarg_msg
+        self._cache = cache
+        self._source = None
+
+        # Array nodes hold a database session, which must not be shared
+        # between threads, so node handles are kept per thread. The dispatch
+        # table only binds alchemy column objects and is shared.
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._kwarg_responses = None
+
+    def node(self):
+        """
+        Return the array node for this query, connecting on first use in the
+        calling thread.
+        """
+        arr = getattr(self._local, "arr", None)
+        if arr is None:
+            aclient = ArrayManagementClient()  # Instantiate array backend
+            arr = aclient.aclient[self.url]    # Connect array to url
+            self._local.arr = arr
+        return arr
+
+    def dispatch_table(self):
+        """
+        Return the dict mapping every supported keyword argument name to the
+        alchemy function it binds to, building it on first use.
+        """
+        if self._kwarg_responses is None:
+            with self._lock:
+                if self._kwarg_responses is None:
+                    self._kwarg_responses = self._build_dispatch_table()
+        return self._kwarg_responses
+
+    def _build_dispatch_table(self):
+        """
+        Extend each basic kw_arg that comes from the yaml "conditionals" into a
+        series of many keyword args, one for each supported SQL or OP known to
+        KeywordHandler.
+        """
+        kwarg_responses = {}                     # Contain alchemy functions
+        kw_handler = KeywordHandler(self.node()) # Handler for sql binding
+        op_names = kw_handler.supported_ops()    # Supported comparison ops
+        sql_names = kw_handler.supported_sql()   # Supported sql attributes
+
+        for base_arg in self.known_args:
+
+            # Remove case-sensitivity of conditional column names.
+            base_arg = base_arg.lower()
+
+            # For each alchemy attribute, bind that attribute of the array's
+            # alchemy-based version of base_arg to a new keyword arg name that
+            # augments base_arg with the sql attribute name.
+            for sql_name in sql_names:
+                compound_arg = base_arg + self._kw_delimiter + sql_name
+                kwarg_responses[compound_arg] = (
+                    kw_handler.sql_bind(base_arg, sql_name))
+
+            # For each regular comparison operator, "op", supported, bind a
+            # lambda (from KeywordHandler) that will perform op(base_arg, val)
+            # whenever passed "val" as an argument.
+            for op_name in op_names:
+                if op_name == "": # Special case of "==" bound to base_arg.
+                    compound_arg = base_arg
+                else:
+                    compound_arg = base_arg + self._kw_delimiter + op_name
+                kwarg_responses[compound_arg] = (
+                    kw_handler.op_bind(base_arg, op_name))
+
+        return kwarg_responses
+
+    def where_clause(self, kwargs):
+        """
+        Translate user-supplied keyword arguments into a single alchemy WHERE
+        condition.
+
+        Params
+        ------
+        kwargs: dict of the keyword arguments passed to the generated function.
+
+        Returns
+        -------
+        select_arg: The AND of all bound conditions, or None when no keyword
+        arguments were given, denoting an unconditional query.
+        """
+        kwarg_responses = self.dispatch_table()
+        alchemy_where_statements = []          # Contain WHERE clauses
+
+        # Look up the appropriate bound response for each keyword, and invoke
+        # it on the user supplied value. This generates a bound alchemy WHERE
+        # condition.
+        for user_supplied_kw, user_supplied_val in kwargs.iteritems():
+            lower_kw = user_supplied_kw.lower()
+
+            # Fetch the function to use in response to this keyword.
+            try:
+                response_function = kwarg_responses[lower_kw]
+            except KeyError as key_error:
+                message = (self._invalid_kwarg_msg +
+                           "unrecognized keyword argument '{}'")
+                raise TypeError(message.format(lower_kw))
+
+            # Depending on what type of sequence the user supplied value is,
+            # call the response function on the value's contents.
+            if isinstance(user_supplied_val, (tuple, list, set)):
+                where_condition = response_function(*user_supplied_val)
+            elif isinstance(user_supplied_val, dict):
+                where_condition = response_function(**user_supplied_val)
+            else:
+                where_condition = response_function(user_supplied_val)
+            # TODO: should the arg unpacking above handle numpy arrays or
+            # Pandas?
+
+            alchemy_where_statements.append(where_condition)
+
+        # Combine all of the WHERE conditionals with AND. If there are no
+        # conditions, use None to denote running an unconditional query.
+        select_arg = (sql.and_(*alchemy_where_statements)
+                      if alchemy_where_statements else None)
+        return select_arg
+
+    def cache(self, use_cache=None):
+        """
+        Return the `ResultCache` for a call, or None when its results are not
+        cached: use_cache as given by the caller, or `cached` when it is None.
+        """
+        if use_cache is None:
+            use_cache = self.cached
+        if not use_cache or self.source_path is None:
+            return None
+        if self._cache is None:
+            self._cache = result_cache.default_cache()
+        return self._cache
+
+    def cache_key(self, kwargs):
+        """
+        Return the result cache key for the keyword arguments kwargs: a hash
+        of the yaml contents and of kwargs, whose names are case-insensitive.
+        Together they determine the SQL, so the key is computed without
+        connecting to the database.
+        """
+        if self._source is None:
+            with open(self.source_path, 'r') as source_file:
+                self._source = source_file.read()
+        arguments = dict((name.lower(), value)
+                         for name, value in kwargs.items())
+        return result_cache.cache_key(self._source, arguments)
+
+    def keyset_condition(self, order_by, after):
+        """
+        Return the condition selecting the rows that come after the key
+        `after` in the order of the columns order_by, spelled out as
+        `a > x OR (a = x AND b > y) OR ...` since SQL Server does not compare
+        row values.
+        """
+        columns = [sql.column(name) for name in order_by]
+        alternatives = []
+        for position, (column, value) in enumerate(zip(columns, after)):
+            preceding = [columns[i] == after[i] for i in range(position)]
+            alternatives.append(sql.and_(*(preceding + [column > value])))
+        return sql.or_(*alternatives)
+
+    def page_statement(self, select_arg, order_by, page_size, after=None):
+        """
+        Return the statement selecting the page_size rows following the key
+        after (or the first page_size rows when after is None), ordered by the
+        columns order_by, among those satisfying select_arg.
+        """
+        condition = select_arg
+        if after is not None:
+            keyset = self.keyset_condition(order_by, after)
+            condition = (keyset if condition is None
+                         else sql.and_(condition, keyset))
+        statement = execution.node_statement(self.node(), condition)
+        return (statement.order_by(*[sql.column(name) for name in order_by])
+                         .limit(page_size))
+
+    def _execute_page(self, statement, retries):
+        """
+        Execute the statement of one page on the shared engine, retrying when
+        the connection is lost. Pages are keyed, so a retry returns the same
+        rows.
+        """
+        attempt = 0
+        while True:
+            try:
+                return execution.execute_frame(self.node().engine, statement,
+                                               self.url)
+            except exc.DBAPIError as error:
+                lost = (error.connection_invalidated or
+                        isinstance(error, exc.OperationalError))
+                if not lost or attempt >= retries:
+                    raise
+                time.sleep(self._RETRY_DELAY * 2 ** attempt)
+                attempt += 1
+
+    def iter_pages(self, page_size=10000, order_by=None, after=None,
+                   retries=_PAGE_RETRIES, **kwargs):
+        """
+        Iterate over the result of the query with keyword arguments kwargs
+        in pages of at most page_size rows, each fetched by its own bounded
+        query that starts after the last key seen. Only one page is held in
+        memory at a time, and no connection is held between pages.
+
+        Pages are not cached, and are not affected by `use_cache` or
+        `refresh_cache`.
+
+        Params
+        ------
+        page_size: Maximum number of rows per page.
+
+        order_by: Column name, or list of column names, giving the order in
+        which rows are paged. Together they must identify a row uniquely, as
+        rows sharing the key of the last row of a page are skipped.
+
+        after: Optional key, a tuple of values of the order_by columns, such
+        as the `after` of a previously yielded `Page`. Iteration starts with
+        the rows following it, which resumes an interrupted iteration.
+
+        retries: Number of times a page is retried when its database
+        connection is lost.
+
+        kwargs: Keyword arguments of the generated function.
+
+        Returns
+        -------
+        Iterator of `Page`s, the last one possibly shorter than page_size.
+
+        Examples
+        --------
+            for frame, after in data.econ_data.iter_pages(
+                    page_size=50000, order_by=["seccode", "date_"]):
+                process(frame)
+                checkpoint(after)
+        """
+        if not order_by:
+            raise ValueError("iter_pages requires the columns to order by.")
+        if isinstance(order_by, six.string_types):
+            order_by = [order_by]
+        order_by = list(order_by)
+        if after is not None:
+            after = tuple(after)
+            if len(after) != len(order_by):
+                raise ValueError("after must have one value per order_by "
+                                 "column.")
+
+        kwargs.pop(self._USE_CACHE, None)
+        kwargs.pop(self._REFRESH_CACHE, None)
+        select_arg = self.where_clause(kwargs)
+
+        while True:
+            statement = self.page_statement(select_arg, order_by, page_size,
+                                            after)
+            frame = self._execute_page(statement, retries)
+            if not len(frame):
+                return
+
+            # Frame columns carry the case given by the database.
+            names = dict((name.lower(), name) for name in frame.columns)
+            last = frame.iloc[-1]
+            after = tuple(_key_value(last[names.get(name.lower(), name)])
+                          for name in order_by)
+            yield Page(frame, after)
+
+            if len(frame) < page_size:
+                return
+
+    def reset(self):
+        """
+        Drop the compiled state so that the next call rebuilds it. Only the
+        calling thread's node handle is dropped.
+        """
+        with self._lock:
+            self._kwarg_responses = None
+            self._source = None
+        self._local.arr = None
+
+    def __call__(self, **kwargs):
+        """
+        Return the result of the array client's selection using the WHERE
+        conditions built from kwargs, served from the result cache when
+        possible.
+        """
+        use_cache = kwargs.pop(self._USE_CACHE, None)
+        refresh_cache = kwargs.pop(self._REFRESH_CACHE, False)
+
+        with instruments.span(self.url, CALL) as call:
+            with instruments.span(self.url, COMPILE):
+                cache = self.cache(use_cache)
+                key = self.cache_key(kwargs) if cache is not None else None
+
+            result = None
+            if key is not None and not refresh_cache:
+                with instruments.span(self.url, CACHE_MISS) as lookup:
+                    result = cache.get(key)
+                    if result is not None:
+                        lookup.phase = CACHE_HIT
+                        lookup.measure(result)
+
+            if result is None:
+                with instruments.span(self.url, COMPILE):
+                    select_arg = self.where_clause(kwargs)
+                with instruments.span(self.url, SELECT) as select:
+                    result = select.measure(self.node().select(select_arg))
+                if key is not None:
+                    with instruments.span(self.url, CACHE_WRITE):
+                        result = cache.put(key, result)
+            return call.measure(result)
+
+
 if __name__ == "__main__":
 
 
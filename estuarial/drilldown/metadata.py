@@ -6,6 +6,8 @@ from os.path import join as pjoin
 from sqlalchemy.sql import column, and_, or_
 from estuarial.util.config.config import Config
 from estuarial.array.arraymanagementclient import ArrayManagementClient
+from estuarial.array.execution import select_in
+from estuarial.array.item_catalog import default_catalog
 from estuarial.util.dateparsing import parsedate, end_of_month
 from estuarial.util.munging import lower_columns
 
@@ -101,20 +103,12 @@ class TRMETA(ArrayManagementClient):
 
     def get_rkd_items(self):
         '''retrieve rkd items dataframe and add enumeration'''
-        index_name = 'COA'
-        items = self.aclient['/RKD/items.yaml'].select()
-        for i in items[index_name]:
-            thisitem = items[items[index_name]==i]
-            setattr(items,i,thisitem)
-        return items
+        # Rows per COA code are available as attributes, e.g. items.MRSB.
+        return default_catalog().enumeration('rkd', 'COA')
 
     def get_ibes_measures(self):
-        index_name = 'Measure'
-        items = self.aclient['/IBES/items.yaml'].select()
-        for i in items[index_name]:
-            thisitem = items[items[index_name]==i]
-            setattr(items,i,thisitem)
-        return items
+        '''retrieve ibes measures dataframe and add enumeration'''
+        return default_catalog().enumeration('ibes', 'Measure')
 
     def to_rkdcode(self, seccodes=None, tickers=None, CntryCode='USA'):
         """
@@ -132,16 +126,12 @@ class TRMETA(ArrayManagementClient):
         arr = self.aclient[url]
 
         if tickers is None:
-            data = arr.select(
-                and_(arr.seccode.in_(seccodes),
-                     arr.cntrycode==CntryCode),
-                    )
+            data = select_in(self.aclient, url, 'seccode', seccodes,
+                             conditions=[arr.cntrycode==CntryCode])
 
         if seccodes is None:
-            data = arr.select(
-                and_(arr.ticker.in_(tickers),
-                     arr.cntrycode==CntryCode),
-                    )
+            data = select_in(self.aclient, url, 'ticker', tickers,
+                             conditions=[arr.cntrycode==CntryCode])
         data = lower_columns(data)
         return data
 
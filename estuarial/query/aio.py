@@ -0,0 +1,157 @@
+"""
+Concurrent front-end for the blocking query interfaces.
+
+Every call is run on a bounded thread pool and returned as a
+`concurrent.futures.Future`, so that many pulls can be fanned out and
+collected:
+
+    trqad = AsyncTRQAD(max_workers=8)
+    ohlc = trqad.datastream(universe, dates)
+    fundamentals = trqad.fundamentals(universe, ['EPS'], dates, 'WORLDSCOPE')
+    ohlc, fundamentals = ohlc.result(), fundamentals.result()
+
+Methods of types created by `QueryHandler.create_type_from_yaml` are wrapped
+the same way with `AsyncProxy`:
+
+    queries = AsyncProxy(MarketIndex()._constituent_queries)
+    spx = queries.spx_universe(iticker='SPX_IDX', date_='2013-12-31')
+
+On Python 3 the futures can be awaited with `asyncio.wrap_future`.
+
+Database connections are shared through the pooled array clients, so the
+number of concurrent queries is also bounded by their pool size.
+
+Requires the `futures` package on Python 2.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import functools
+import threading
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    raise ImportError("estuarial.query.aio requires the 'futures' package "
+                      "on Python 2.")
+
+from estuarial.util.config.config import Config
+from estuarial.query.trqad import TRQAD
+from estuarial.drilldown.metadata import TRMETA
+
+# Default for the 'AsyncWorkers' entry of the ESTUARIAL section of
+# estuarial.ini, the number of calls run concurrently.
+_DEFAULT_WORKERS = 5
+
+
+class AsyncExecutor(object):
+    """
+    Runs blocking calls on a bounded thread pool, returning futures.
+    """
+
+    def __init__(self, max_workers=None):
+        """
+        Params
+        ------
+        max_workers: Maximum number of calls run at once. Defaults to the
+        configured number of workers.
+
+        Returns
+        -------
+        None.
+        """
+        if max_workers is None:
+            max_workers = int(Config().get('ESTUARIAL', 'AsyncWorkers',
+                                           _DEFAULT_WORKERS))
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def run(self, function, *args, **kwargs):
+        """
+        Schedule function(*args, **kwargs) on the pool and return a
+        `concurrent.futures.Future` of its result.
+        """
+        return self._executor.submit(functools.partial(function, *args,
+                                                       **kwargs))
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting calls, optionally waiting for running ones.
+        """
+        self._executor.shutdown(wait=wait)
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def default_executor():
+    """
+    Return the process-wide `AsyncExecutor`, creating it on first use.
+    """
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = AsyncExecutor()
+    return _default_executor
+
+
+class AsyncProxy(object):
+    """
+    Exposes the methods of a blocking object as functions returning
+    futures. Other attributes are returned unchanged; properties are
+    evaluated, blocking, when accessed.
+    """
+
+    def __init__(self, obj, executor=None, max_workers=None):
+        """
+        Params
+        ------
+        obj: The blocking object, e.g. a `TRQAD` or an instance of a type
+        created by `QueryHandler.create_type_from_yaml`.
+
+        executor: Optional `AsyncExecutor` to run calls on. Defaults to a new
+        one when max_workers is given and to the shared one otherwise.
+
+        max_workers: Optional bound on concurrent calls through this proxy.
+
+        Returns
+        -------
+        None.
+        """
+        if executor is None:
+            executor = (AsyncExecutor(max_workers) if max_workers is not None
+                        else default_executor())
+        self.obj = obj
+        self.executor = executor
+
+    def __getattr__(self, name):
+        if name in ('obj', 'executor'):
+            raise AttributeError(name)
+        attribute = getattr(self.obj, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def run(*args, **kwargs):
+            return self.executor.run(attribute, *args, **kwargs)
+        return run
+
+
+class AsyncTRQAD(AsyncProxy):
+    """
+    Concurrent version of `estuarial.query.trqad.TRQAD`.
+    """
+
+    def __init__(self, executor=None, max_workers=None):
+        super(AsyncTRQAD, self).__init__(TRQAD(), executor, max_workers)
+
+
+class AsyncTRMETA(AsyncProxy):
+    """
+    Concurrent version of `estuarial.drilldown.metadata.TRMETA`.
+    """
+
+    def __init__(self, executor=None, max_workers=None):
+        super(AsyncTRMETA, self).__init__(TRMETA(), executor, max_workers)
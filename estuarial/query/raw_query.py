@@ -1,6 +1,10 @@
 from __future__ import print_function, division, absolute_import
 
+from sqlalchemy import sql as alchemy_sql
 from estuarial.array.arraymanagementclient import ArrayManagementClient
+from estuarial.util.columnar import ColumnarWriter
+from estuarial.util.instrumentation import (instruments, CALL, EXECUTE, FETCH,
+                                            FRAME)
 import pandas as pd
 
 class RAW_QUERY(ArrayManagementClient):
@@ -13,34 +17,144 @@ class RAW_QUERY(ArrayManagementClient):
 
     '''
 
+    # Default number of rows per chunk when streaming results.
+    _CHUNKSIZE = 50000
+
     def __init__(self):
         super(RAW_QUERY, self).__init__()
 
-    def raw_query(self, sql=None):
+    def raw_query(self, sql=None, chunksize=None):
         """
         Raw SQL Query
 
         :type query: string
         :param query: raw sql query
 
+        :type chunksize: int
+        :param chunksize: if given, return an iterator of DataFrames of at
+        most this many rows instead of a single DataFrame (see
+        `iter_raw_query`)
+
+        """
+        if chunksize is not None:
+            return self.iter_raw_query(sql, chunksize=chunksize)
+
+        with instruments.span('raw_query', CALL) as call:
+            #just a random url (must be valid)
+            url = '/FUNDAMENTALS/WORLDSCOPE/wsitems.yaml'
+            arr = self.aclient[url]
+
+            with instruments.span('raw_query', EXECUTE):
+                cur = arr.session.execute(sql)
+
+            with instruments.span('raw_query', FETCH) as fetch:
+                cur.description = cur._cursor_description()
+                cols = [col[0] for col in cur.description]
+
+                data = cur.fetchall()
+                fetch.rows = len(data)
+
+            with instruments.span('raw_query', FRAME) as frame:
+                df = pd.DataFrame.from_records(data)
+                df.columns = cols
+                frame.measure(df)
+
+            return call.measure(df)
+
+    def iter_raw_query(self, sql=None, chunksize=_CHUNKSIZE, dtypes=None):
         """
+        Raw SQL Query, streamed as DataFrame chunks fetched with `fetchmany`
+        so that only one chunk of rows is held in memory at a time.
 
-        #just a random url (must be valid)
-        url = '/FUNDAMENTALS/WORLDSCOPE/wsitems.yaml'
-        arr = self.aclient[url]
+        Column dtypes are fixed by the first chunk, updated with dtypes, so
+        that every chunk has the same schema, e.g. a column that is entirely
+        NULL within a later chunk is still returned as float or datetime.
 
-        cur = arr.session.execute(sql)
+        :type query: string
+        :param query: raw sql query
 
-        cur.description = cur._cursor_description()
-        cols = [col[0] for col in cur.description]
+        :type chunksize: int
+        :param chunksize: maximum number of rows per DataFrame
 
-        data = cur.fetchall()
+        :type dtypes: dict
+        :param dtypes: optional column name to dtype overrides, applied to
+        every chunk, e.g. {'code': 'float64'} for an integer column that may
+        contain NULLs
 
-        df = pd.DataFrame.from_records(data)
-        df.columns = cols
+        :rtype: iterator of `pandas.DataFrame`
+        :return: DataFrames of at most chunksize rows, in result order
 
+        """
+        overrides = dict(dtypes or {})
+        dtypes = None
+        connection = self.aclient.engine().connect()
+        try:
+            with instruments.span('iter_raw_query', EXECUTE):
+                result = connection.execution_options(
+                    stream_results=True).execute(alchemy_sql.text(sql))
+            cols = list(result.keys())
+
+            while True:
+                with instruments.span('iter_raw_query', FETCH) as fetch:
+                    data = result.fetchmany(chunksize)
+                    fetch.rows = len(data)
+                if not data:
+                    break
+
+                with instruments.span('iter_raw_query', FRAME) as frame:
+                    df = pd.DataFrame.from_records(data, columns=cols)
+                    if dtypes is None:
+                        dtypes = df.dtypes.to_dict()
+                        dtypes.update(overrides)
+                    df = frame.measure(self._fix_dtypes(df, dtypes))
+                yield df
+        finally:
+            connection.close()
+
+    def _fix_dtypes(self, df, dtypes):
+        """
+        Cast the columns of a chunk to the dtypes fixed for the stream.
+        """
+        for col, dtype in dtypes.items():
+            if df[col].dtype == dtype:
+                continue
+            try:
+                df[col] = df[col].astype(dtype)
+            except (TypeError, ValueError):
+                message = ("Column '{}' of a later chunk cannot be cast to "
+                           "'{}' as fixed by the first chunk. Pass an explicit "
+                           "dtype for it through 'dtypes'.")
+                raise TypeError(message.format(col, dtype))
         return df
 
+    def raw_query_to_store(self, sql, path, chunksize=_CHUNKSIZE, dtypes=None):
+        """
+        Raw SQL Query, written chunk by chunk to a columnar store on disk
+        without materializing the full result. Read it back, in whole or by
+        column, with `estuarial.util.columnar.ColumnarStore`.
+
+        :type query: string
+        :param query: raw sql query
+
+        :type path: string
+        :param path: directory of the columnar store to (re)create
+
+        :type chunksize: int
+        :param chunksize: maximum number of rows held in memory at once
+
+        :type dtypes: dict
+        :param dtypes: optional column name to dtype overrides
+
+        :rtype: int
+        :return: number of rows written
+
+        """
+        with ColumnarWriter(path, metadata={'query': sql}) as writer:
+            for df in self.iter_raw_query(sql, chunksize=chunksize,
+                                          dtypes=dtypes):
+                writer.append(df)
+        return writer.rows
+
 
 
 # Kind of hate the spelling
@@ -52,3 +166,8 @@ class RAW_QUERY(ArrayManagementClient):
 # '''
 #
 # rquery.raw_query(sql)
+#
+# for chunk in rquery.raw_query(sql, chunksize=10000):
+#     print(chunk.shape)
+#
+# rquery.raw_query_to_store('select * from wsndata', '/tmp/wsndata')
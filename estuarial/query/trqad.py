@@ -9,6 +9,7 @@ from estuarial.util.config.config import Config
 from estuarial.util.munging import worldscope_align
 from estuarial.util.dateparsing import parsedate
 from estuarial.array.arraymanagementclient import ArrayManagementClient
+from estuarial.array.interval_cache import select_in_range
 import posixpath
 
 class TRQAD(ArrayManagementClient):
@@ -93,12 +94,12 @@ class TRQAD(ArrayManagementClient):
             print('the url: {}'.format(url))
             arr = self.aclient[url]
 
-            data = arr.select(
-                and_(arr.seccode.in_(universe),
-                     arr.item.in_(metrics),
-                     arr.freq==freq),
-                date_1=start,
-                date_2=stop)
+            data = select_in_range(self.aclient, url, 'seccode', universe,
+                                   start, stop,
+                                   conditions=[arr.item.in_(metrics),
+                                               arr.freq==freq],
+                                   date_1=start,
+                                   date_2=stop)
 
             if align:
                 data = worldscope_align(data)
@@ -109,12 +110,11 @@ class TRQAD(ArrayManagementClient):
             url = posixpath.join('/FUNDAMENTALS',DB,df_file)
             arr = self.aclient[url]
 
-            data = arr.select(
-                and_(arr.code.in_(universe),
-                     arr.coa.in_(metrics),
-                     ),
-                sourcedate_1=start,
-                sourcedate_2=stop)
+            data = select_in_range(self.aclient, url, 'code', universe,
+                                   start, stop,
+                                   conditions=[arr.coa.in_(metrics)],
+                                   sourcedate_1=start,
+                                   sourcedate_2=stop)
 
         return data
 
@@ -135,12 +135,11 @@ class TRQAD(ArrayManagementClient):
 
         """
 
-        arr = self.aclient['/DATASTREAM/datastream_basic.yaml']
+        url = '/DATASTREAM/datastream_basic.yaml'
         start,stop = parsedate(dt_list)
 
-        df = arr.select(and_(arr.seccode.in_(universe),
-                             arr.marketdate >= start,
-                             arr.marketdate <= stop))
+        df = select_in_range(self.aclient, url, 'seccode', universe,
+                             start, stop, cached=True)
         return df
 
 
@@ -0,0 +1,159 @@
+"""
+Unit tests for chunked IN-list execution.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import shutil
+import decimal
+import datetime
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.sql import column
+from estuarial.array import execution
+
+class TestExecution(unittest.TestCase):
+    """
+    Exercise the chunk planning and statement building of the execution
+    layer without needing a database connection, and chunked selections on
+    a SQLite database.
+    """
+
+    class Node(object):
+        """
+        Minimal stand-in exposing the attributes of a date-caching node.
+        """
+        query = "select seccode, item, date_ as date from wsndata"
+        fields = ["seccode", "item", "date"]
+
+    def test_chunk(self):
+        """
+        Chunks preserve order, drop duplicates and respect the size limit.
+        """
+        values = [5, 1, 5, 3, 2, 1, 4]
+        chunks = execution.chunk(values, 2)
+        self.assertEqual(chunks, [[5, 1], [3, 2], [4]])
+        self.assertEqual(execution.chunk([], 2), [])
+
+    def test_parameter_count(self):
+        """
+        Bound parameters of the extra conditions are counted.
+        """
+        conditions = [column("item").in_([1, 2, 3]), column("freq") == "Q"]
+        self.assertEqual(execution.parameter_count(conditions), 4)
+        self.assertEqual(execution.parameter_count([]), 0)
+
+    def test_date_range_condition(self):
+        """
+        Date keywords map onto the node's date conditional.
+        """
+        node = self.Node()
+        condition = execution.date_range_condition(
+            node, {"date_1": "2000-01-01", "date_2": "2001-01-01"})
+        self.assertIn("date >=", str(condition))
+        self.assertIn("date <=", str(condition))
+        self.assertIsNone(execution.date_range_condition(node, {}))
+
+        open_ended = str(execution.date_range_condition(
+            node, {"date_1": "2000-01-01"}))
+        self.assertIn("date >=", open_ended)
+        self.assertNotIn("date <=", open_ended)
+        open_ended = str(execution.date_range_condition(
+            node, {"date_1": None, "date_2": "2001-01-01"}))
+        self.assertNotIn("date >=", open_ended)
+        self.assertIn("date <=", open_ended)
+
+    def test_normalize_frame(self):
+        """
+        Dates and decimals from the driver get the backend's dtypes, and the
+        index is reset.
+        """
+        frame = pd.DataFrame({
+            "date": [datetime.date(2000, 1, 3), None],
+            "value_": [decimal.Decimal("1.5"), None],
+            "name": ["a", "b"],
+            "flag": [True, False]}, index=[7, 8])
+        result = execution.normalize_frame(frame)
+        self.assertEqual(result.index.tolist(), [0, 1])
+        self.assertEqual(result.date.dtype, np.dtype("datetime64[ns]"))
+        self.assertEqual(result.value_.dtype, np.float64)
+        self.assertTrue(np.isnan(result.value_[1]))
+        self.assertEqual(result.name.dtype, object)
+        self.assertEqual(result.flag.dtype, bool)
+
+    def test_node_statement(self):
+        """
+        The yaml query is wrapped as a sub-select and filtered.
+        """
+        node = self.Node()
+        statement = execution.node_statement(node, column("item") == 1)
+        text = str(statement)
+        self.assertIn(node.query, text)
+        self.assertIn("WHERE item =", text)
+
+    class CodeNode(object):
+        """
+        Stand-in for a node without a date conditional, whose `select`
+        must not be used for chunked queries.
+        """
+        query = "select seccode, ticker, price from codes"
+        fields = ["seccode", "ticker"]
+        seccode = column("seccode")
+
+        def select(self, *args, **kwargs):
+            raise AssertionError("chunked queries bypass the node")
+
+    class Client(object):
+        """
+        Stand-in for the pooled array client.
+        """
+        pool_size = 3
+
+        def __init__(self, engine, node):
+            self._engine = engine
+            self.node = node
+
+        def __getitem__(self, url):
+            return self.node
+
+        def engine(self):
+            return self._engine
+
+    def test_select_in(self):
+        """
+        Chunked selections on a node without a date conditional return the
+        chunks in order with consistent dtypes.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            engine = create_engine("sqlite:///" +
+                                   os.path.join(tmp_dir, "codes.db"))
+            engine.execute("create table codes (seccode integer, "
+                           "ticker text, price real)")
+            for seccode in range(1, 11):
+                price = None if seccode in (1, 3, 5) else seccode * 1.5
+                engine.execute("insert into codes values (?, ?, ?)",
+                               (seccode, "T{}".format(seccode), price))
+            client = self.Client(engine, self.CodeNode())
+
+            result = execution.select_in(client, "/codes.yaml", "seccode",
+                                         [9, 2, 7, 1, 5, 3, 10, 2],
+                                         chunk_size=3)
+            seccodes = result.seccode.tolist()
+            self.assertEqual([sorted(seccodes[:3]), sorted(seccodes[3:6]),
+                              seccodes[6:]], [[2, 7, 9], [1, 3, 5], [10]])
+            self.assertEqual(result.index.tolist(), list(range(7)))
+            self.assertEqual(result.price.dtype, np.float64)
+            self.assertEqual(result.price.isnull().sum(), 3)
+
+            direct = execution.select_in(client, "/codes.yaml", "seccode",
+                                         [4], direct=True)
+            self.assertEqual(direct.ticker.tolist(), ["T4"])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+if __name__ == "__main__":
+    unittest.main()
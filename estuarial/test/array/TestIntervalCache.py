@@ -0,0 +1,179 @@
+"""
+Unit tests for the date-range-aware interval cache.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import pandas as pd
+from estuarial.array import interval_cache
+
+day = pd.Timestamp
+
+class TestIntervalCache(unittest.TestCase):
+    """
+    Exercise the interval arithmetic, and check that repeated and extended
+    requests only fetch uncovered date ranges. The database is replaced by
+    an in-memory table.
+    """
+
+    class Node(object):
+        """
+        Minimal stand-in exposing the attributes of a date-caching node.
+        """
+        query = "select seccode, marketdate, close_ from prices"
+        fields = ["seccode", "marketdate"]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache = interval_cache.IntervalCache(self.tmp_dir, buckets=2)
+        self.aclient = {"/prices.yaml": self.Node()}
+
+        dates = pd.date_range("2000-01-03", "2000-03-31", freq="B")
+        self.table = pd.DataFrame(
+            {"seccode": [1] * len(dates) + [2] * len(dates),
+             "marketdate": list(dates) * 2,
+             "close_": list(range(2 * len(dates)))},
+            columns=["seccode", "marketdate", "close_"]
+        )
+
+        self.fetches = []
+        self.original_select_in = interval_cache.select_in
+        interval_cache.select_in = self.fake_select_in
+
+    def tearDown(self):
+        interval_cache.select_in = self.original_select_in
+        shutil.rmtree(self.tmp_dir)
+
+    def fake_select_in(self, aclient, url, column_name, values,
+                       conditions=(), direct=False):
+        """
+        Answer a member and date range query from self.table, recording the
+        requested range.
+        """
+        date_condition = conditions[-1]
+        start = date_condition.clauses[0].right.value
+        end = date_condition.clauses[1].right.value
+        self.fetches.append((sorted(values), start, end))
+
+        rows = (self.table.seccode.isin(values) &
+                (self.table.marketdate >= start) &
+                (self.table.marketdate <= end))
+        return self.table[rows].reset_index(drop=True)
+
+    def expected(self, start, end):
+        rows = ((self.table.marketdate >= start) &
+                (self.table.marketdate <= end))
+        return self.table[rows].reset_index(drop=True)
+
+    def test_merge_intervals(self):
+        """
+        Overlapping and adjacent intervals are joined.
+        """
+        intervals = [(day("2000-02-01"), day("2000-02-10")),
+                     (day("2000-01-01"), day("2000-01-31")),
+                     (day("2000-03-01"), day("2000-03-05"))]
+        self.assertEqual(interval_cache.merge_intervals(intervals),
+                         [(day("2000-01-01"), day("2000-02-10")),
+                          (day("2000-03-01"), day("2000-03-05"))])
+
+    def test_missing_intervals(self):
+        """
+        Only the uncovered parts of a request are returned.
+        """
+        covered = [(day("2000-01-01"), day("2000-01-31")),
+                   (day("2000-03-01"), day("2000-03-31"))]
+        self.assertEqual(
+            interval_cache.missing_intervals(covered, day("1999-12-01"),
+                                             day("2000-04-02")),
+            [(day("1999-12-01"), day("1999-12-31")),
+             (day("2000-02-01"), day("2000-02-29")),
+             (day("2000-04-01"), day("2000-04-02"))])
+        self.assertEqual(
+            interval_cache.missing_intervals(covered, day("2000-01-05"),
+                                             day("2000-01-20")),
+            [])
+
+    def test_select_in(self):
+        """
+        A repeated request is served locally and an extended one only
+        fetches the extension.
+        """
+        start, end = day("2000-01-03"), day("2000-02-29")
+        result = self.cache.select_in(self.aclient, "/prices.yaml",
+                                      "seccode", [1, 2], start, end)
+        self.assertEqual(result.values.tolist(),
+                         self.expected(start, end).values.tolist())
+        self.assertEqual(len(self.fetches), 1)
+
+        self.cache.select_in(self.aclient, "/prices.yaml", "seccode",
+                             [1, 2], start, end)
+        self.assertEqual(len(self.fetches), 1)
+
+        end = day("2000-03-31")
+        result = self.cache.select_in(self.aclient, "/prices.yaml",
+                                      "seccode", [1, 2], start, end)
+        self.assertEqual(self.fetches[-1],
+                         ([1, 2], day("2000-03-01"), day("2000-03-31")))
+        self.assertEqual(result.values.tolist(),
+                         self.expected(start, end).values.tolist())
+
+    def test_empty(self):
+        """
+        A request matching no rows returns the columns of the query, whether
+        fetched or served locally.
+        """
+        for _ in range(2):
+            result = self.cache.select_in(self.aclient, "/prices.yaml",
+                                          "seccode", [3], day("2000-01-03"),
+                                          day("2000-01-31"))
+            self.assertEqual(len(result), 0)
+            self.assertEqual(result.columns.tolist(),
+                             ["seccode", "marketdate", "close_"])
+        self.assertEqual(len(self.fetches), 1)
+
+    def test_buckets(self):
+        """
+        Members share the stores of their buckets, and a seccode given as
+        text or a float is the same member.
+        """
+        start, end = day("2000-01-03"), day("2000-01-31")
+        self.cache.select_in(self.aclient, "/prices.yaml", "seccode",
+                             [1, 2, 3, 4, 5], start, end)
+        query_dir = os.path.join(self.tmp_dir, os.listdir(self.tmp_dir)[0])
+        self.assertTrue(len(os.listdir(query_dir)) <= 2)
+
+        result = self.cache.select_in(self.aclient, "/prices.yaml",
+                                      "seccode", ["2", 1.0], start, end)
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(result.seccode.unique().tolist(), [2, 1])
+        self.assertEqual(len(result), len(self.expected(start, end)))
+
+    def test_read_locked(self):
+        """
+        Reading a bucket waits for its writer, so a member is never missed
+        while its bucket is being replaced.
+        """
+        start, end = day("2000-01-03"), day("2000-01-31")
+        self.cache.select_in(self.aclient, "/prices.yaml", "seccode", [1],
+                             start, end)
+        query_key = os.listdir(self.tmp_dir)[0]
+        bucket = interval_cache.bucket_of(1, 2)
+
+        covered = []
+        reader = threading.Thread(target=lambda: covered.extend(
+            self.cache.covered(query_key, 1)))
+        with self.cache._locks.locked(self.cache._bucket_dir(query_key,
+                                                             bucket)):
+            reader.start()
+            time.sleep(0.2)
+            self.assertEqual(covered, [])
+        reader.join()
+        self.assertEqual(covered, [(start, end)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Unit tests for the shared item catalog.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from estuarial.array import item_catalog
+
+class TestItemCatalog(unittest.TestCase):
+    """
+    Check that item tables are fetched once, kept on disk across catalogs,
+    and refetched on refresh or expiry. The database is replaced by an
+    in-memory table.
+    """
+
+    class Node(object):
+        query = "select Number, Name from WSITEM"
+
+    class Client(object):
+        """
+        Stand-in for `ArrayManagementClient` resolving any url to a Node.
+        """
+        def __init__(self):
+            self.aclient = self
+
+        def __getitem__(self, url):
+            return TestItemCatalog.Node()
+
+        def engine(self):
+            return None
+
+        def close(self):
+            pass
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.table = pd.DataFrame({"Number": [2001, 1751],
+                                   "Name": ["CASH", "NET INCOME"]},
+                                  columns=["Number", "Name"])
+        self.fetches = 0
+
+        self.originals = (item_catalog.ArrayManagementClient,
+                          item_catalog.execute_frame)
+        item_catalog.ArrayManagementClient = self.Client
+        item_catalog.execute_frame = self.fake_execute_frame
+
+    def tearDown(self):
+        (item_catalog.ArrayManagementClient,
+         item_catalog.execute_frame) = self.originals
+        shutil.rmtree(self.tmp_dir)
+
+    def fake_execute_frame(self, engine, statement):
+        self.fetches += 1
+        return self.table.copy()
+
+    def test_items(self):
+        """
+        Tables are fetched once and shared through memory and disk.
+        """
+        catalog = item_catalog.ItemCatalog(self.tmp_dir, ttl=3600)
+        first = catalog.items("worldscope")
+        self.assertEqual(first.values.tolist(), self.table.values.tolist())
+        self.assertIs(catalog.items("worldscope"), first)
+        self.assertEqual(self.fetches, 1)
+
+        # A new catalog, e.g. in another process, reads the disk copy.
+        other = item_catalog.ItemCatalog(self.tmp_dir, ttl=3600)
+        self.assertEqual(other.items("worldscope").values.tolist(),
+                         self.table.values.tolist())
+        self.assertEqual(other.version("worldscope"),
+                         catalog.version("worldscope"))
+        self.assertEqual(self.fetches, 1)
+
+        self.assertRaises(KeyError, catalog.items, "unknown")
+
+    def test_refresh(self):
+        """
+        Refreshing refetches the table and updates its version.
+        """
+        catalog = item_catalog.ItemCatalog(self.tmp_dir, ttl=3600)
+        version = catalog.version("rkd")
+
+        self.table.loc[2] = [3019, "GOODWILL"]
+        catalog.refresh("rkd")
+        self.assertEqual(self.fetches, 2)
+        self.assertEqual(len(catalog.items("rkd")), 3)
+        self.assertNotEqual(catalog.version("rkd"), version)
+
+    def test_expiry(self):
+        """
+        Tables older than the time-to-live are refetched.
+        """
+        catalog = item_catalog.ItemCatalog(self.tmp_dir, ttl=-1)
+        catalog.items("worldscope")
+        catalog.items("worldscope")
+        self.assertEqual(self.fetches, 2)
+
+    def test_enumeration(self):
+        """
+        Rows are looked up by code as attributes, and the enumeration is
+        shared until the table version changes.
+        """
+        self.table.loc[2] = [2002, "CASH"]
+        catalog = item_catalog.ItemCatalog(self.tmp_dir, ttl=3600)
+        items = catalog.enumeration("rkd", "Name")
+
+        self.assertEqual(items.CASH.Number.tolist(), [2001, 2002])
+        self.assertEqual(items.Number.tolist(), [2001, 1751, 2002])
+        self.assertIn("CASH", dir(items))
+        self.assertRaises(AttributeError, getattr, items, "GOODWILL")
+        self.assertIs(catalog.enumeration("rkd", "Name"), items)
+
+        self.table.loc[3] = [3019, "GOODWILL"]
+        catalog.refresh("rkd")
+        self.assertEqual(catalog.enumeration("rkd", "Name").GOODWILL.Number
+                         .tolist(), [3019])
+
+if __name__ == "__main__":
+    unittest.main()
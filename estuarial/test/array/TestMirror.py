@@ -0,0 +1,199 @@
+"""
+Unit tests for the local price mirror.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+from estuarial.array import mirror
+
+day = pd.Timestamp
+
+class TestMirror(unittest.TestCase):
+    """
+    Check that the mirror partitions rows by bucket and year, answers from
+    the partitions and only fetches uncovered ranges. The database is
+    replaced by an in-memory table.
+    """
+
+    URL = "/DATASTREAM/ohlc.yaml"
+
+    class Node(object):
+        """
+        Minimal stand-in exposing the attributes of a date-caching node.
+        """
+        query = "select seccode, marketdate, close_ from prices"
+        fields = ["seccode", "marketdate"]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.mirror = mirror.PriceMirror(self.tmp_dir, buckets=4)
+        self.aclient = {self.URL: self.Node()}
+
+        dates = pd.date_range("2009-11-02", "2011-02-28", freq="B")
+        seccodes = [3, 11, 42, 7]
+        self.table = pd.DataFrame(
+            {"seccode": np.repeat(seccodes, len(dates)),
+             "marketdate": np.tile(dates.values, len(seccodes)),
+             "close_": np.arange(len(seccodes) * len(dates), dtype=float)},
+            columns=["seccode", "marketdate", "close_"]
+        )
+
+        self.fetches = []
+        self.original_select_in = mirror.select_in
+        mirror.select_in = self.fake_select_in
+
+    def tearDown(self):
+        mirror.select_in = self.original_select_in
+        shutil.rmtree(self.tmp_dir)
+
+    def fake_select_in(self, aclient, url, column_name, values,
+                       conditions=(), direct=False):
+        """
+        Answer a member and date range query from self.table, recording the
+        requested range.
+        """
+        date_condition = conditions[-1]
+        start = date_condition.clauses[0].right.value
+        end = date_condition.clauses[1].right.value
+        self.fetches.append((sorted(values), start, end))
+
+        rows = (self.table.seccode.isin(values) &
+                (self.table.marketdate >= start) &
+                (self.table.marketdate <= end))
+        return self.table[rows].reset_index(drop=True)
+
+    def expected(self, seccodes, start, end):
+        frames = []
+        for seccode in seccodes:
+            table = self.table
+            rows = ((table.seccode == seccode) & (table.marketdate >= start) &
+                    (table.marketdate <= end))
+            frames.append(table[rows])
+        return pd.concat(frames, ignore_index=True)
+
+    def select(self, seccodes, start, end):
+        return self.mirror.select_in(self.aclient, self.URL, "seccode",
+                                     seccodes, start, end)
+
+    def test_select_in(self):
+        """
+        Rows come back in the order of the seccodes, and repeated requests
+        are answered from the partitions.
+        """
+        start, end = day("2009-12-01"), day("2010-06-30")
+        result = self.select([42, 3, 7], start, end)
+        assert_frame_equal(result, self.expected([42, 3, 7], start, end))
+        self.assertEqual(self.fetches, [([3, 7, 42], start, end)])
+
+        # Another mirror on the same directory, e.g. another worker.
+        other = mirror.PriceMirror(self.tmp_dir, buckets=4)
+        again = other.select_in(self.aclient, self.URL, "seccode", [3],
+                                "2010-01-01", "2010-01-31")
+        assert_frame_equal(again, self.expected([3], day("2010-01-01"),
+                                                day("2010-01-31")))
+        self.assertEqual(len(self.fetches), 1)
+
+    def test_partitions(self):
+        """
+        Partitions are laid out by bucket and year.
+        """
+        self.mirror.sync(self.aclient, self.URL, [3, 11, 42, 7],
+                         "2009-11-02", "2011-02-28")
+        query_dir = os.path.join(self.tmp_dir, os.listdir(self.tmp_dir)[0])
+
+        partitions = 0
+        for bucket_name in os.listdir(query_dir):
+            if not bucket_name.startswith("bucket="):
+                continue
+            bucket = int(bucket_name.split("=")[1])
+            years = [name for name in
+                     os.listdir(os.path.join(query_dir, bucket_name))
+                     if name.startswith("year=")]
+            self.assertEqual(sorted(years),
+                             ["year=2009", "year=2010", "year=2011"])
+            partitions += len(years)
+
+            frame = self.mirror._read(os.path.basename(query_dir), bucket,
+                                      [3, 11, 42, 7], day("2011-01-01"),
+                                      day("2011-12-31"), "seccode",
+                                      "marketdate")
+            for seccode in pd.concat(frame).seccode.unique():
+                self.assertEqual(mirror.bucket_of(seccode, 4), bucket)
+        self.assertTrue(partitions >= 3)
+
+    def test_gaps(self):
+        """
+        Extending a range fetches only the uncovered dates, across years.
+        """
+        self.select([3, 11], "2009-11-02", "2010-06-30")
+        self.select([3, 11], "2009-11-02", "2011-01-31")
+        self.assertEqual(self.fetches[1],
+                         ([3, 11], day("2010-07-01"), day("2011-01-31")))
+
+        result = self.select([11, 3], "2010-06-01", "2011-01-31")
+        assert_frame_equal(result, self.expected([11, 3], day("2010-06-01"),
+                                                 day("2011-01-31")))
+        self.assertEqual(len(self.fetches), 2)
+
+    def test_members(self):
+        """
+        A seccode given as text, float or numpy integer is the same member.
+        """
+        start, end = day("2010-01-01"), day("2010-03-31")
+        self.select([3, 42], start, end)
+        result = self.select(["3", 42.0, np.int64(3)], start, end)
+        assert_frame_equal(result, self.expected([3, 42], start, end))
+        self.assertEqual(len(self.fetches), 1)
+        self.assertEqual(mirror.bucket_of("42", 4), mirror.bucket_of(42.0, 4))
+
+    def test_read_locked(self):
+        """
+        Reading a bucket waits for its writer.
+        """
+        start, end = day("2010-01-01"), day("2010-03-31")
+        self.select([3], start, end)
+        query_key = self.mirror.query_key(self.Node(), self.URL, "seccode")
+        bucket = mirror.bucket_of(3, 4)
+
+        frames = []
+        reader = threading.Thread(target=lambda: frames.extend(
+            self.mirror._read(query_key, bucket, [3], start, end, "seccode",
+                              "marketdate")))
+        with self.mirror._locked(query_key, bucket):
+            reader.start()
+            time.sleep(0.2)
+            self.assertEqual(frames, [])
+        reader.join()
+        assert_frame_equal(pd.concat(frames, ignore_index=True),
+                           self.expected([3], start, end))
+
+    def test_empty(self):
+        """
+        A request matching no rows returns the columns of the query, whether
+        fetched or served locally.
+        """
+        for _ in range(2):
+            result = self.select([99], "2010-01-01", "2010-01-31")
+            self.assertEqual(len(result), 0)
+            self.assertEqual(result.columns.tolist(),
+                             ["seccode", "marketdate", "close_"])
+        self.assertEqual(len(self.fetches), 1)
+
+    def test_serves(self):
+        """
+        Only whole mirrored queries are served.
+        """
+        self.assertTrue(mirror.serves(self.URL, "SECCODE", []))
+        self.assertFalse(mirror.serves(self.URL, "seccode", ["condition"]))
+        self.assertFalse(mirror.serves("/prices.yaml", "seccode", []))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Unit tests for the pooled array client registry.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import threading
+import unittest
+from estuarial.array.registry import registry, PooledArrayClient
+from estuarial.array.arraymanagementclient import ArrayManagementClient
+
+class TestRegistry(unittest.TestCase):
+    """
+    Check that ArrayManagementClient instances share one pooled client and
+    that closing behaves as documented.
+    """
+
+    def setUp(self):
+        """
+        Start each test from an empty registry.
+        """
+        registry.close_all()
+        self.example_url = '/UNIVERSE_SQL/dowjones_universe.yaml'
+
+    def tearDown(self):
+        registry.close_all()
+
+    def test_shared_client(self):
+        """
+        Two clients for the same catalog share the same pooled client.
+        """
+        first = ArrayManagementClient()
+        second = ArrayManagementClient()
+        self.assertIsInstance(first.aclient, PooledArrayClient)
+        self.assertIs(first.aclient, second.aclient)
+
+    def test_node_reuse(self):
+        """
+        Nodes are resolved once per thread and bound to the shared engine.
+        """
+        client = ArrayManagementClient()
+        first_node = client.aclient[self.example_url]
+        second_node = ArrayManagementClient().aclient[self.example_url]
+        self.assertIs(first_node, second_node)
+        self.assertIs(first_node.engine, client.aclient.engine())
+
+    def test_close(self):
+        """
+        Closing a client drops its reference, closing its last client closes
+        the pooled client, and closing the registry forces a new pooled
+        client to be built.
+        """
+        with ArrayManagementClient() as client:
+            pooled = client.aclient
+            other = ArrayManagementClient()
+        self.assertIsNone(client.aclient)
+        self.assertIs(other.aclient, pooled)
+        pooled[self.example_url]
+
+        other.close()
+        self.assertRaises(ValueError, pooled.__getitem__, self.example_url)
+        self.assertIsNot(ArrayManagementClient().aclient, pooled)
+
+        pooled = ArrayManagementClient().aclient
+        registry.close_all()
+        self.assertRaises(ValueError, pooled.__getitem__, self.example_url)
+
+    def test_set_client_factory(self):
+        """
+        Clients built after setting a factory come from it, and the previous
+        factory is returned for restoring.
+        """
+        created = []
+
+        def factory(basepath, localdatapath):
+            created.append((basepath, localdatapath))
+            return object()
+
+        previous = registry.set_client_factory(factory)
+        try:
+            client = registry.acquire("/catalog", "/local")
+            self.assertEqual(created, [("/catalog", "/local")])
+            self.assertIs(registry.acquire("/catalog", "/local"), client)
+            self.assertEqual(len(created), 1)
+        finally:
+            registry.set_client_factory(previous)
+        self.assertIs(registry.client_factory, previous)
+
+    def test_release(self):
+        """
+        A pooled client is closed once every acquisition of it is released,
+        and releasing a client closed by the registry is ignored.
+        """
+        previous = registry.set_client_factory(
+            lambda basepath, localdatapath: object())
+        try:
+            first = registry.acquire("/catalog", "/local")
+            registry.acquire("/catalog", "/local")
+            registry.release(first)
+            self.assertIs(registry.acquire("/catalog", "/local"), first)
+            registry.release(first)
+            registry.release(first)
+            self.assertRaises(ValueError, first.__getitem__, self.example_url)
+
+            second = registry.acquire("/catalog", "/local")
+            self.assertIsNot(second, first)
+            registry.release(first)
+            self.assertIs(registry.acquire("/catalog", "/local"), second)
+        finally:
+            registry.set_client_factory(previous)
+
+    def test_store_locks(self):
+        """
+        Nodes of one yaml share the lock of their store across threads, and
+        nodes of different yamls do not.
+        """
+        class Client(object):
+            def __getitem__(self, url):
+                return Node(url)
+
+        class Node(object):
+            def __init__(self, url):
+                self.url = url
+
+            def cache_path(self):
+                return "/cache/" + self.url
+
+        previous = registry.set_client_factory(
+            lambda basepath, localdatapath: Client())
+        try:
+            client = registry.acquire("/catalog", "/local")
+            nodes = []
+            thread = threading.Thread(
+                target=lambda: nodes.append(client["/a.yaml"]))
+            thread.start()
+            thread.join()
+            self.assertIsNot(client["/a.yaml"], nodes[0])
+            self.assertIs(client["/a.yaml"].lock, nodes[0].lock)
+            self.assertIsNot(client["/b.yaml"].lock, nodes[0].lock)
+        finally:
+            registry.set_client_factory(previous)
+
+if __name__ == "__main__":
+    unittest.main()
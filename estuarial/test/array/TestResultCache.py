@@ -0,0 +1,119 @@
+"""
+Unit tests for the persistent query result cache.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import time
+import shutil
+import decimal
+import datetime
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+from estuarial.array import result_cache
+
+class TestResultCache(unittest.TestCase):
+    """
+    Exercise keying, storage, expiry and eviction of `ResultCache` in a
+    temporary directory.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.frame = pd.DataFrame({"code": [1, 2, 3],
+                                   "name": ["IBM", "AAPL", None],
+                                   "value": [1.5, 2.5, 3.5]},
+                                  columns=["code", "name", "value"],
+                                  index=[10, 11, 12])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_cache(self, max_bytes=2**20, max_age=3600):
+        return result_cache.ResultCache(self.tmp_dir, max_bytes=max_bytes,
+                                        max_age=max_age)
+
+    def test_cache_key(self):
+        """
+        Keys ignore dict order but depend on every part.
+        """
+        first = result_cache.cache_key("yaml", {"a": 1, "b": 2})
+        second = result_cache.cache_key("yaml", {"b": 2, "a": 1})
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, result_cache.cache_key("yaml", {"a": 1}))
+
+        date = datetime.date(2013, 12, 31)
+        self.assertEqual(result_cache.cache_key(date),
+                         result_cache.cache_key(datetime.date(2013, 12, 31)))
+
+    def test_canonical_key(self):
+        """
+        Large arrays are keyed by all of their values, and sets by their
+        members whatever their order.
+        """
+        seccodes = np.arange(5000)
+        changed = seccodes.copy()
+        changed[2500] = -1
+        self.assertNotEqual(result_cache.cache_key({"seccode": seccodes}),
+                            result_cache.cache_key({"seccode": changed}))
+        self.assertEqual(result_cache.cache_key({"seccode": seccodes}),
+                         result_cache.cache_key({"seccode": list(seccodes)}))
+
+        first = set("ticker{}".format(i) for i in range(100))
+        second = set(sorted(first, reverse=True))
+        self.assertEqual(result_cache.cache_key(first),
+                         result_cache.cache_key(second))
+
+    def test_round_trip(self):
+        """
+        Stored frames come back equal, with a default index.
+        """
+        cache = self.make_cache()
+        self.assertIsNone(cache.get("key"))
+
+        stored = cache.put("key", self.frame)
+        expected = self.frame.reset_index(drop=True)
+        assert_frame_equal(stored, expected)
+        assert_frame_equal(cache.get("key"), expected)
+
+        # Object columns come back from put as they will from get.
+        decimals = pd.DataFrame({"value": [decimal.Decimal("1.5"), None]})
+        stored = cache.put("decimals", decimals)
+        self.assertEqual(stored.value.dtype, np.float64)
+        assert_frame_equal(stored, cache.get("decimals"))
+
+    def test_expiry(self):
+        """
+        Entries older than max_age are misses and are removed.
+        """
+        cache = self.make_cache(max_age=0)
+        cache.put("key", self.frame)
+        time.sleep(0.01)
+        self.assertIsNone(cache.get("key"))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, "key")))
+
+    def test_lru_eviction(self):
+        """
+        The least recently used entry is evicted once the cache is full.
+        """
+        cache = self.make_cache()
+        cache.put("first", self.frame)
+        entry_size = cache.size()
+        cache.max_bytes = 2 * entry_size
+
+        cache.put("second", self.frame)
+        past = time.time() - 60
+        os.utime(os.path.join(self.tmp_dir, "first"), (past, past))
+        os.utime(os.path.join(self.tmp_dir, "second"), (past + 1, past + 1))
+        cache.get("first")
+
+        cache.put("third", self.frame)
+        self.assertIsNotNone(cache.get("first"))
+        self.assertIsNone(cache.get("second"))
+        self.assertIsNotNone(cache.get("third"))
+
+if __name__ == "__main__":
+    unittest.main()
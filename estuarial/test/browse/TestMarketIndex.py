@@ -5,6 +5,7 @@ Author: Ben Zaitlen and Ely Spears
 """
 import unittest
 import numpy as np
+import pandas
 from pandas.util.testing import assert_frame_equal 
 from estuarial.browse.market_index import MarketIndex
 
@@ -112,6 +113,55 @@ class TestMarketIndex(unittest.TestCase):
         self.assertTrue(len(djx_data) > 0, "Failed to retrieve DJX test data.")
 
 
+    def test_constituents_batch(self):
+        """
+        Check that batched retrieval matches per-index, per-date retrieval.
+        """
+        #TODO: this really needs a good mocking framework so that we don't
+        # rely on open DB connections to perform the test.
+        dates = ['2012-11-30', '2012-12-31']
+        batch = self.m.constituents_batch(['S&P 500', 'Dow Jones'], dates)
+        self.assertEqual(list(batch.index.names),
+                         list(self.m._BATCH_LEVELS))
+
+        for index in ('S&P 500', 'Dow Jones'):
+            for date in dates:
+                single = self.m.constituents(index, date, date)
+                batch_rows = batch.xs((index, pandas.Timestamp(date)),
+                                      level=(0, 1))
+                self.assertEqual(sorted(batch_rows.index),
+                                 sorted(single.SECCODE))
+
+
+    def test_constituents_batch_queries(self):
+        """
+        Check that batched retrieval issues one query per index family.
+        """
+        calls = []
+
+        class Queries(object):
+            def __getattr__(self, name):
+                def query(**kwargs):
+                    calls.append((name, kwargs))
+                    return pandas.DataFrame({
+                        "ITICKER": kwargs["iticker_in"][0],
+                        "DATE_": [kwargs["date__in"][0][0]] *
+                                 len(kwargs["iticker_in"][0]),
+                        "SECCODE": [1] * len(kwargs["iticker_in"][0])})
+                return query
+
+        m = MarketIndex.__new__(MarketIndex)
+        m._constituent_queries = Queries()
+        dates = ['2011-12-30', '2012-11-30', '2012-12-31']
+        batch = m.constituents_batch(['S&P 500', 'Dow Jones'], dates)
+        self.assertEqual(sorted(name for name, _ in calls),
+                         ['dowjones_universe', 'spx_universe'])
+        for _, kwargs in calls:
+            self.assertEqual(len(kwargs["date__in"][0]), 3)
+        self.assertEqual(sorted(batch.index.get_level_values(0)),
+                         ['Dow Jones', 'S&P 500'])
+
+
     def test___getitem__(self):
         """
         Check that call through __getitem__ are correctly interpreted as call 
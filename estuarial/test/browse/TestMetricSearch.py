@@ -0,0 +1,107 @@
+"""
+Unit tests for the item catalog search index.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from estuarial.browse import metric_search
+from estuarial.browse.metric_search import SearchIndex
+
+class TestMetricSearch(unittest.TestCase):
+    """
+    Check exact, prefix and fuzzy ranking, and that indices are persisted
+    and rebuilt with the catalog version.
+    """
+
+    class Catalog(object):
+        """
+        Stand-in for `ItemCatalog` serving one table.
+        """
+        def __init__(self, table):
+            self.table = table
+            self.version_id = "v1"
+
+        def items(self, name):
+            return self.table
+
+        def version(self, name):
+            return self.version_id
+
+    def setUp(self):
+        self.names = ["NET INCOME", "NET SALES OR REVENUES", "CASH",
+                      "CASH DIVIDENDS PAID - TOTAL", "INCOME TAXES"]
+        self.index = SearchIndex(self.names)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.table = pd.DataFrame({"Number": [1751, 1001, 2001, 4551, 1451],
+                                   "Name": self.names},
+                                  columns=["Number", "Name"])
+        self.catalog = self.Catalog(self.table)
+        self.originals = (metric_search.default_catalog,
+                          metric_search._INDEX_DIR)
+        metric_search.default_catalog = lambda: self.catalog
+        metric_search._INDEX_DIR = self.tmp_dir
+        metric_search._indices.clear()
+
+    def tearDown(self):
+        (metric_search.default_catalog,
+         metric_search._INDEX_DIR) = self.originals
+        metric_search._indices.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def rows(self, query, limit=None):
+        return [row for _, row in self.index.search(query, limit=limit)]
+
+    def test_search(self):
+        """
+        Rows matching every word rank first, shorter rows break ties, and
+        partial or misspelt words still match.
+        """
+        self.assertEqual(self.rows("net income")[0], 0)
+        self.assertEqual(self.rows("income"), [0, 4])
+        self.assertEqual(self.rows("cash"), [2, 3])
+        self.assertEqual(self.rows("cash div")[0], 3)
+        self.assertEqual(self.rows("revenu"), [1])
+        self.assertEqual(self.rows("dividnds"), [3])
+        self.assertEqual(self.rows("cash", limit=1), [2])
+        self.assertEqual(self.rows("goodwill"), [])
+        self.assertEqual(self.rows(""), [])
+
+        score, row = self.index.search("net income")[0]
+        self.assertEqual(score, 1.0)
+
+    def test_search_index(self):
+        """
+        Indices are persisted per catalog version and rebuilt on change.
+        """
+        index = metric_search.search_index("worldscope", path=self.tmp_dir)
+        self.assertIs(metric_search.search_index("worldscope",
+                                                 path=self.tmp_dir), index)
+        self.assertEqual(os.listdir(self.tmp_dir),
+                         ["search-worldscope-v1.pickle"])
+
+        # A new process loads the persisted index.
+        metric_search._indices.clear()
+        loaded = metric_search.search_index("worldscope", path=self.tmp_dir)
+        self.assertEqual(loaded.postings, index.postings)
+
+        self.catalog.version_id = "v2"
+        rebuilt = metric_search.search_index("worldscope", path=self.tmp_dir)
+        self.assertIsNot(rebuilt, loaded)
+        self.assertEqual(len(os.listdir(self.tmp_dir)), 2)
+
+    def test_find_items(self):
+        """
+        Matching catalog rows are returned best first with their scores.
+        """
+        found = metric_search.find_items("worldscope", "cash")
+        self.assertEqual(found.Number.tolist(), [2001, 4551])
+        self.assertEqual(found.score.tolist(), [1.0, 1.0])
+        self.assertTrue(metric_search.find_items("worldscope", "xyz").empty)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unit tests for the item code enumerations of the metrics manager.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import unittest
+import numpy as np
+import pandas as pd
+from estuarial.browse import metrics_manager
+from estuarial.browse.metrics_manager import WS, RKD
+
+class TestMetricsManager(unittest.TestCase):
+    """
+    Check that item codes resolve lazily as attributes from the catalog.
+    The catalog is replaced by in-memory tables.
+    """
+
+    class Catalog(object):
+        """
+        Stand-in for `ItemCatalog` counting table loads.
+        """
+        def __init__(self, tables):
+            self.tables = tables
+            self.loads = 0
+
+        def items(self, name):
+            self.loads += 1
+            return self.tables[name]
+
+        def version(self, name):
+            return "v1"
+
+    def setUp(self):
+        tables = {
+            "worldscope": pd.DataFrame({"Number": [2001, 1751],
+                                        "Name": ["CASH", "NET INCOME (LOSS)"]},
+                                       columns=["Number", "Name"]),
+            "rkd": pd.DataFrame({"COA": ["MRSB", "XNAN"],
+                                 "DESC_": ["Restaurants", np.nan]},
+                                columns=["COA", "DESC_"]),
+        }
+        self.catalog = self.Catalog(tables)
+        self.original = metrics_manager.default_catalog
+        metrics_manager.default_catalog = lambda: self.catalog
+        metrics_manager._metric_names.clear()
+
+        # Skip ArrayManagementClient.__init__ and its database connection.
+        self.ws = WS.__new__(WS)
+        self.rkd = RKD.__new__(RKD)
+
+    def tearDown(self):
+        metrics_manager.default_catalog = self.original
+        metrics_manager._metric_names.clear()
+
+    def test___getattr__(self):
+        """
+        Item codes resolve by sanitized description, or by code when the
+        description is missing, from a table loaded once.
+        """
+        self.assertEqual(self.ws.CASH, 2001)
+        self.assertEqual(self.ws.NET_INCOME_LOSS, 1751)
+        self.assertEqual(self.rkd.Restaurants, "MRSB")
+        self.assertEqual(self.rkd.XNAN, "XNAN")
+        self.assertEqual(self.ws.CASH, 2001)
+        self.assertEqual(self.catalog.loads, 2)
+
+        with self.assertRaises(AttributeError):
+            self.ws.GOODWILL
+        self.assertFalse(hasattr(self.ws, "__length_hint__"))
+
+    def test___dir__(self):
+        """
+        Item names are listed for tab completion next to the methods.
+        """
+        names = dir(self.ws)
+        self.assertIn("CASH", names)
+        self.assertIn("find_metrics", names)
+
+    def test_find_metrics_no_match(self):
+        """
+        A search matching nothing returns an empty frame.
+        """
+        empty = pd.DataFrame(columns=["Number", "Name"])
+        original = metrics_manager.find_items
+        metrics_manager.find_items = lambda catalog, name, limit: empty
+        self.ws.word_list = ["CASH", "INCOME"]
+        try:
+            found = self.ws.find_metrics("GODWILL")
+        finally:
+            metrics_manager.find_items = original
+        self.assertTrue(found.empty)
+        self.assertEqual(found.columns.tolist(), ["Number", "Name"])
+
+if __name__ == "__main__":
+    unittest.main()
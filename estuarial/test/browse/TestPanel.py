@@ -0,0 +1,172 @@
+"""
+Unit tests for the point-in-time panel of a universe.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import sql
+from estuarial.browse import panel
+from estuarial.browse.universe import Universe
+
+
+class TestPanel(unittest.TestCase):
+    """
+    Check the panel against a row by row as-of lookup, and that each source
+    is queried once with the universe seccodes. `select_in_range` is replaced
+    by in-memory tables.
+    """
+
+    class Client(object):
+        """
+        Stand-in for the array client, returning nodes with item and freq.
+        """
+        def __getitem__(self, url):
+            node = type("Node", (object,), {})()
+            node.item = sql.column("item")
+            node.freq = sql.column("freq")
+            return node
+
+    def setUp(self):
+        self.fundamentals = pd.DataFrame({
+            "ITEM": [1751, 1751, 1751, 1751, 2001, 2001, 1751, 1751],
+            "SECCODE": [10, 10, 10, 30, 10, 30, 99, 30],
+            "YEAR_": [2011, 2012, 2012, 2011, 2012, 2012, 2012, 2011],
+            "SEQ": [4, 1, 1, 4, 1, 1, 1, 4],
+            "VALUE_": [1., 2., 3., 4., 5., 6., 7., 8.],
+            "DDATE": pd.to_datetime(["2012-02-10", "2012-05-01", "2012-05-01",
+                                     None, "2012-04-15", "2012-03-01",
+                                     "2012-01-01", "2012-02-20"]),
+            "DATE": pd.to_datetime(["2011-12-31", "2012-12-31", "2012-12-31",
+                                    "2011-12-31", "2012-12-31", "2012-12-31",
+                                    "2012-12-31", "2011-12-31"]),
+            "FREQ": ["Q"] * 8})
+        # The second 2012 report of seccode 10 on 2012-05-01 is a restatement
+        # in seq 2 and must win over seq 1.
+        self.fundamentals.loc[2, "SEQ"] = 2
+        days = pd.date_range("2012-01-02", "2012-06-29", freq="B")
+        self.prices = pd.DataFrame({
+            "SECCODE": np.repeat([10, 20], len(days)),
+            "MARKETDATE": np.tile(days.values, 2),
+            "CLOSE_": np.arange(2 * len(days), dtype=float)})
+
+        self.calls = []
+        self.original = panel.select_in_range
+
+        def select(aclient, url, column_name, values, start, end,
+                   conditions=(), cached=False):
+            self.calls.append((url, values, start, end, cached))
+            if url == panel._FUNDAMENTALS_URL:
+                return self.fundamentals.copy()
+            return self.prices.copy()
+
+        panel.select_in_range = select
+
+        self.universe = Universe.__new__(Universe)
+        self.universe.data = pd.DataFrame({"seccode": [30, 10, 20, 10]})
+        self.universe._seccodes = None
+        self.universe.aclient = self.Client()
+        self.calendar = pd.date_range("2012-01-31", "2012-06-30", freq="M")
+
+    def tearDown(self):
+        panel.select_in_range = self.original
+
+    def expected(self, frame, code_column, date_column, value_column, code,
+                 when, max_age, tiebreak=()):
+        rows = frame[(frame[code_column] == code) &
+                     (frame[date_column] <= when) &
+                     (frame[date_column] >= when - pd.Timedelta(days=max_age))]
+        keys = [date_column] + list(tiebreak) + [value_column]
+        latest = max([tuple(values) for values in rows[keys].values.tolist()]
+                     or [(np.nan,)])
+        return latest[-1]
+
+    def test_panel(self):
+        """
+        Every cell holds the latest value available on its date.
+        """
+        result = self.universe.panel({"ni": 1751, "cash": 2001},
+                                     self.calendar)
+        self.assertEqual(list(result.columns),
+                         ["date", "seccode", "cash", "ni", "close_"])
+        self.assertEqual(len(result), len(self.calendar) * 3)
+        self.assertEqual([call[0] for call in self.calls],
+                         [panel._FUNDAMENTALS_URL, panel._PRICES_URL])
+        self.assertEqual(self.calls[0][1], [10, 20, 30])
+        self.assertEqual([call[4] for call in self.calls], [False, True])
+
+        self.check(result, self.fundamentals.DDATE)
+
+        self.assertEqual(result.ni[(result.seccode == 10) &
+                                   (result.date == "2012-05-31")].iloc[0], 3.)
+
+        # Reported 2012-02-20 (the row without a report date is dropped).
+        self.assertEqual(result.ni[(result.seccode == 30) &
+                                   (result.date == "2012-02-29")].iloc[0], 8.)
+
+    def test_report_lag(self):
+        """
+        Values without a report date become available report_lag days after
+        their fiscal period end.
+        """
+        result = self.universe.panel({"ni": 1751, "cash": 2001},
+                                     self.calendar, report_lag=45)
+        lag = pd.to_datetime(self.fundamentals.DATE) + np.timedelta64(45, "D")
+        self.check(result, self.fundamentals.DDATE.fillna(lag))
+
+        # 2011-12-31 plus 45 days is 2012-02-14.
+        self.assertTrue(np.isnan(result.ni[(result.seccode == 30) &
+                                           (result.date == "2012-01-31")]
+                                 .iloc[0]))
+        self.assertEqual(result.ni[(result.seccode == 30) &
+                                   (result.date == "2012-02-29")].iloc[0], 8.)
+
+    def check(self, result, available):
+        """
+        Compare result with a row by row as-of lookup of the fundamentals
+        available from the dates in available.
+        """
+        fundamentals = self.fundamentals.copy()
+        fundamentals["AVAILABLE"] = available
+        fundamentals = fundamentals[fundamentals.AVAILABLE.notnull()]
+        for row in result.itertuples(index=False):
+            date, code = row[0], int(row[1])
+            for item, value in [(2001, row[2]), (1751, row[3])]:
+                expected = self.expected(
+                    fundamentals[fundamentals.ITEM == item], "SECCODE",
+                    "AVAILABLE", "VALUE_", code, date, 366, ["YEAR_", "SEQ"])
+                np.testing.assert_equal(value, expected)
+            np.testing.assert_equal(row[4], self.expected(
+                self.prices, "SECCODE", "MARKETDATE", "CLOSE_", code, date, 7))
+
+    def test_compact(self):
+        """
+        float32 and categorical seccodes are returned on request, and the
+        seccodes are reused until the universe data changes.
+        """
+        result = self.universe.panel([1751], self.calendar, prices=(),
+                                     dtype="float32")
+        self.assertEqual(result[1751].dtype, np.float32)
+        if hasattr(pd.Categorical, "from_codes"):
+            self.assertEqual(str(result.seccode.dtype), "category")
+        self.assertEqual(len(self.calls), 1)
+
+        codes = self.universe.seccodes
+        self.assertTrue(self.universe.seccodes is codes)
+        self.universe.data = pd.DataFrame({"seccode": [5]})
+        self.assertEqual(self.universe.seccodes.tolist(), [5])
+
+    def test_asof_positions(self):
+        """
+        Targets before the first row, of unknown codes or beyond the age
+        limit have no position.
+        """
+        positions = panel.asof_positions(
+            np.array([1, 0, 1]), np.array([10, 5, 20]),
+            np.array([0, 0, 1, 1, 1, 2]), np.array([4, 9, 15, 25, 40, 30]),
+            max_age=10)
+        self.assertEqual(positions.tolist(), [-1, 1, 0, 2, -1, -1])
+
+if __name__ == "__main__":
+    unittest.main()
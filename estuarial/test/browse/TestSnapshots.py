@@ -0,0 +1,109 @@
+"""
+Unit tests for saving and loading universes.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+import pandas as pd
+from os.path import join as pjoin
+from pandas.util.testing import assert_frame_equal
+from estuarial.array.registry import registry
+from estuarial.browse import universe
+from estuarial.browse.universe import Universe, snapshot_key
+from estuarial.browse.snapshots import SnapshotStore
+
+
+class TestSnapshots(unittest.TestCase):
+    """
+    Check that a saved universe loads with its data and definition, and that
+    the store finds it by the content hash of that definition. The array
+    client is replaced through the registry.
+    """
+
+    class Client(object):
+        """
+        Stand-in for the array client.
+        """
+        def set_logging(self, log):
+            pass
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        registry.close_all()
+        self.previous = registry.set_client_factory(
+            lambda basepath, localdatapath: self.Client())
+        self.params = {"url": "/UNIVERSE_SQL/spx_universe.yaml",
+                       "iticker": "SPX_IDX", "date_": "2013-12-04"}
+        self.universe = Universe(pd.DataFrame({
+            "seccode": [3, 1, 2],
+            "ticker": ["C", "A", None],
+            "date_": pd.to_datetime(["2013-12-04"] * 3),
+            "close_": [1.5, 2.5, 3.5]},
+            columns=["seccode", "ticker", "date_", "close_"]),
+            "select * from spx", params=self.params,
+            as_of="2013-12-05 06:00")
+
+    def tearDown(self):
+        registry.close_all()
+        registry.set_client_factory(self.previous)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_load(self):
+        """
+        A loaded universe has the data, query, parameters and as-of time of
+        the saved one.
+        """
+        path = self.universe.save(pjoin(self.tmp_dir, "spx"))
+        loaded = Universe.load(path)
+        assert_frame_equal(loaded.data, self.universe.data)
+        self.assertEqual(loaded._sql, "select * from spx")
+        self.assertEqual(loaded.params, self.params)
+        self.assertEqual(loaded.as_of, pd.Timestamp("2013-12-05 06:00"))
+        self.assertEqual(loaded.key, self.universe.key)
+        self.assertEqual(loaded.seccodes.tolist(), [1, 2, 3])
+
+        original = universe.SNAPSHOT_VERSION
+        universe.SNAPSHOT_VERSION = original + 1
+        try:
+            self.assertRaises(ValueError, Universe.load, path)
+        finally:
+            universe.SNAPSHOT_VERSION = original
+
+    def test_store(self):
+        """
+        The store returns the universe saved for a definition, and nothing
+        for other definitions.
+        """
+        store = SnapshotStore(pjoin(self.tmp_dir, "universes"))
+        key = snapshot_key("select * from spx", self.params)
+        self.assertTrue(store.get(key) is None)
+        saved = store.put(self.universe)
+        assert_frame_equal(store.put(self.universe).data, saved.data)
+        self.assertEqual(os.listdir(store.path), [key])
+        assert_frame_equal(store.get(key).data, self.universe.data)
+        self.assertEqual(saved.as_of, self.universe.as_of)
+
+        other = dict(self.params, date_="2014-01-02")
+        self.assertTrue(store.get(snapshot_key("select * from spx",
+                                               other)) is None)
+        store.clear()
+        self.assertTrue(store.get(key) is None)
+
+    def test_max_age(self):
+        """
+        A universe older than the given age is removed and not returned.
+        """
+        store = SnapshotStore(pjoin(self.tmp_dir, "universes"))
+        store.put(self.universe)
+        key = self.universe.key
+        self.assertTrue(store.get(key, datetime.timedelta(days=36500))
+                        is not None)
+        self.assertTrue(store.get(key, datetime.timedelta(days=1)) is None)
+        self.assertEqual(os.listdir(store.path), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Unit tests for building many universes at once.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+import pandas as pd
+from sqlalchemy import sql
+from estuarial.array.registry import registry
+from estuarial.browse import snapshots, universe_builder
+from estuarial.browse.universe_builder import UniverseBuilder
+
+
+class TestUniverseBuilder(unittest.TestCase):
+    """
+    Check that each membership yaml is queried once and that the universes
+    are split from the shared result. The array client is replaced through
+    the registry and `select_in` by in-memory tables.
+    """
+
+    class Client(object):
+        """
+        Stand-in for the array client returning nodes with the conditionals
+        of the universe yamls.
+        """
+        def __getitem__(self, url):
+            node = type("Node", (object,), {})()
+            for name in ["statuscode", "typecode", "iticker"]:
+                setattr(node, name, sql.column(name))
+            node.query = url
+            return node
+
+        def set_logging(self, log):
+            pass
+
+    def setUp(self):
+        self.tables = {
+            universe_builder._COUNTRY_URL: pd.DataFrame({
+                "SECCODE": [1, 2, 3, 4],
+                "CTRYTRADEDIN": ["US", "CA ", "US", "GB"]}),
+            "/UNIVERSE_SQL/spx_universe.yaml": pd.DataFrame({
+                "ITICKER": ["SPX_IDX"] * 4,
+                "DATE_": pd.to_datetime(["2013-12-04", "2013-12-04",
+                                         "2014-01-02", "2014-01-02"]),
+                "SECCODE": [1, 2, 1, 3]}),
+            "/UNIVERSE_SQL/dowjones_universe.yaml": pd.DataFrame({
+                "ITICKER": ["DJX_IDX"],
+                "DATE_": pd.to_datetime(["2013-12-04"]),
+                "SECCODE": [5]})}
+        self.calls = []
+        self.original = universe_builder.select_in
+
+        def select(aclient, url, column_name, values, conditions=()):
+            self.calls.append((url, column_name, values))
+            return self.tables[url].copy()
+
+        universe_builder.select_in = select
+        registry.close_all()
+        self.previous = registry.set_client_factory(
+            lambda basepath, localdatapath: self.Client())
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = snapshots._default_store
+        snapshots._default_store = snapshots.SnapshotStore(self.tmp_dir)
+
+    def tearDown(self):
+        universe_builder.select_in = self.original
+        registry.close_all()
+        registry.set_client_factory(self.previous)
+        snapshots._default_store = self.store
+        shutil.rmtree(self.tmp_dir)
+
+    def test_countries(self):
+        """
+        One query returns the universe of every country.
+        """
+        universes = UniverseBuilder.countries(["US", "CA", "FR"])
+        self.assertEqual(self.calls, [(universe_builder._COUNTRY_URL,
+                                       "ctrytradedin", ["CA", "FR", "US"])])
+        self.assertEqual(universes["US"].data.seccode.tolist(), [1, 3])
+        self.assertEqual(universes["CA"].data.seccode.tolist(), [2])
+        self.assertEqual(len(universes["FR"].data), 0)
+        self.assertEqual(len(os.listdir(self.tmp_dir)), 2)
+        self.assertEqual(UniverseBuilder.us(snapshots=False)
+                         .data.seccode.tolist(), [1, 3])
+
+    def test_indices(self):
+        """
+        One query per index yaml returns the universe of every pair.
+        """
+        pairs = [("SPX_IDX", "2013-12-04"), ("SPX_IDX", "2014-01-02"),
+                 ("DJX_IDX", "2013-12-04")]
+        universes = UniverseBuilder.indices(pairs)
+        self.assertEqual(sorted(call[0] for call in self.calls),
+                         ["/UNIVERSE_SQL/dowjones_universe.yaml",
+                          "/UNIVERSE_SQL/spx_universe.yaml"])
+        self.assertEqual([universes[pair].data.seccode.tolist()
+                          for pair in pairs], [[1, 2], [1, 3], [5]])
+        self.assertRaises(KeyError, UniverseBuilder.indices,
+                          [("NDX_IDX", "2013-12-04")])
+
+    def test_snapshots(self):
+        """
+        Universes already built are loaded from the snapshot store, and only
+        the others are queried.
+        """
+        UniverseBuilder.indices([("SPX_IDX", "2013-12-04")])
+        self.assertEqual(len(self.calls), 1)
+        universes = UniverseBuilder.indices([("SPX_IDX", "2013-12-04"),
+                                             ("SPX_IDX", "2014-01-02")])
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.calls[1][2], [pd.Timestamp("2014-01-02")])
+        loaded = universes[("SPX_IDX", "2013-12-04")]
+        self.assertEqual(loaded.data.seccode.tolist(), [1, 2])
+        self.assertEqual(loaded.params["date_"], "2013-12-04")
+
+        UniverseBuilder.spx_idx("2014-01-02")
+        UniverseBuilder.countries(["US"], snapshots=False)
+        UniverseBuilder.countries(["US"], snapshots=False)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_recent(self):
+        """
+        Universes of recent dates are only loaded for a day after they were
+        built.
+        """
+        today = datetime.date.today().isoformat()
+        self.tables["/UNIVERSE_SQL/spx_universe.yaml"] = pd.DataFrame({
+            "ITICKER": ["SPX_IDX"], "DATE_": pd.to_datetime([today]),
+            "SECCODE": [1]})
+        UniverseBuilder.spx_idx(today)
+        UniverseBuilder.spx_idx(today)
+        self.assertEqual(len(self.calls), 1)
+
+        original = universe_builder._RECENT_AGE
+        universe_builder._RECENT_AGE = datetime.timedelta(0)
+        try:
+            universe = UniverseBuilder.spx_idx(today)
+        finally:
+            universe_builder._RECENT_AGE = original
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(universe.data.seccode.tolist(), [1])
+
+if __name__ == "__main__":
+    unittest.main()
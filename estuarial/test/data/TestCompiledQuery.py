@@ -0,0 +1,86 @@
+"""
+Unit tests for the result caching of generated query functions.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from sqlalchemy import sql
+from pandas.util.testing import assert_frame_equal
+from estuarial.array.result_cache import ResultCache
+from estuarial.data.query_handler import _CompiledQuery
+
+
+class TestCompiledQuery(unittest.TestCase):
+    """
+    Check that results are only cached when the yaml or the caller asks for
+    it, and that a cached call needs no array node.
+    """
+
+    class Node(object):
+        """
+        Stand-in for an array node counting its selections.
+        """
+        def __init__(self):
+            self.selects = 0
+
+        def select(self, select_arg):
+            self.selects += 1
+            return pd.DataFrame({"code": [1, 2]}, index=[5, 6])
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp_dir, "ws.yaml")
+        with open(self.source, "w") as source:
+            source.write("SQL: {ws: {query: select code from ws}}")
+        self.cache = ResultCache(os.path.join(self.tmp_dir, "cache"))
+        self.node = self.Node()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def make_query(self, cached):
+        query = _CompiledQuery("/test/ws.yaml", ["code"], "_", "",
+                               source_path=self.source, cache=self.cache,
+                               cached=cached)
+        query._local.arr = self.node
+        query._kwarg_responses = {
+            "code": lambda value: sql.column("code") == value}
+        return query
+
+    def test_opt_in(self):
+        """
+        Calls are cached when the yaml or the caller asks for it.
+        """
+        query = self.make_query(cached=False)
+        query(code=1)
+        query(code=1)
+        self.assertEqual(self.node.selects, 2)
+
+        query(code=1, use_cache=True)
+        query(CODE=1, use_cache=True)
+        self.assertEqual(self.node.selects, 3)
+
+        cached = self.make_query(cached=True)
+        cached(code=1)
+        cached(code=1, use_cache=False)
+        self.assertEqual(self.node.selects, 4)
+
+    def test_hit_without_node(self):
+        """
+        A cached result is served without resolving the array node, and
+        comes back as it was first returned.
+        """
+        query = self.make_query(cached=True)
+        first = query(code=2)
+        self.assertEqual(first.index.tolist(), [0, 1])
+
+        query._local.arr = None
+        query.node = None
+        assert_frame_equal(query(code=2), first)
+
+if __name__ == "__main__":
+    unittest.main()
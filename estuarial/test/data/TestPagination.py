@@ -0,0 +1,114 @@
+"""
+Unit tests for the keyset pagination of generated query functions.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import unittest
+import pandas as pd
+from sqlalchemy import create_engine, sql, exc
+from sqlalchemy.pool import StaticPool
+from pandas.util.testing import assert_frame_equal
+from estuarial.array import execution
+from estuarial.data.query_handler import _CompiledQuery
+
+
+class TestPagination(unittest.TestCase):
+    """
+    Check that pages cover the query result exactly once, in order, that an
+    iteration resumes from a key, and that lost connections are retried. The
+    array node is replaced by an in-memory SQLite table.
+    """
+
+    class Node(object):
+        """
+        Minimal stand-in for an array node bound to the shared engine.
+        """
+        query = "select code, date_, value_ from ws"
+
+        def __init__(self, engine):
+            self.engine = engine
+
+    def setUp(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool,
+                               connect_args={"check_same_thread": False})
+        self.table = pd.DataFrame({
+            "code": [3, 1, 2, 1, 3, 2, 1, 2, 3, 1, 2] * 2,
+            "date_": ["2010-01-{:02d}".format(day) for day in range(1, 23)],
+            "value_": [float(value) for value in range(22)]},
+            columns=["code", "date_", "value_"])
+        connection = engine.connect()
+        connection.execute("create table ws (code integer, date_ text, "
+                           "value_ real)")
+        connection.execute("insert into ws values (?, ?, ?)",
+                           [tuple(row) for row in self.table.values.tolist()])
+        connection.close()
+
+        self.query = _CompiledQuery("/test/ws.yaml", ["code"], "_", "")
+        self.query._local.arr = self.Node(engine)
+        self.query._kwarg_responses = {
+            "code": lambda value: sql.column("code") == value,
+            "code_gt": lambda value: sql.column("code") > value}
+        self.query._RETRY_DELAY = 0
+
+    def expected(self, rows):
+        positions = sorted(range(len(self.table)),
+                           key=lambda row: (self.table.code[row],
+                                            self.table.date_[row]))
+        return self.table.iloc[positions][rows].reset_index(drop=True)
+
+    def test_pages(self):
+        """
+        Pages are bounded, ordered and together return every row once.
+        """
+        pages = list(self.query.iter_pages(page_size=5,
+                                           order_by=["code", "date_"]))
+        self.assertEqual([len(page.frame) for page in pages], [5, 5, 5, 5, 2])
+        result = pd.concat([page.frame for page in pages], ignore_index=True)
+        assert_frame_equal(result, self.expected(slice(None)))
+        self.assertEqual(pages[0].after, (1, "2010-01-13"))
+
+        filtered = list(self.query.iter_pages(page_size=10, order_by="date_",
+                                              code_gt=1))
+        self.assertEqual(sum(len(page.frame) for page in filtered), 14)
+        self.assertTrue((filtered[0].frame.code > 1).all())
+
+    def test_resume(self):
+        """
+        Passing the key of a page resumes with the rows following it.
+        """
+        pages = self.query.iter_pages(page_size=4, order_by=["code", "date_"])
+        first = next(pages)
+        resumed = list(self.query.iter_pages(page_size=100,
+                                             order_by=["code", "date_"],
+                                             after=first.after))
+        self.assertEqual(len(resumed), 1)
+        assert_frame_equal(resumed[0].frame, self.expected(slice(4, None)))
+        self.assertRaises(ValueError, next,
+                          self.query.iter_pages(order_by=["code"],
+                                                after=(1, "2010-01-01")))
+
+    def test_retry(self):
+        """
+        A page whose connection is lost is fetched again.
+        """
+        original = execution.execute_frame
+        failures = []
+
+        def flaky(engine, statement, query="statement"):
+            if not failures:
+                failures.append(statement)
+                raise exc.OperationalError("select", {},
+                                           Exception("connection lost"))
+            return original(engine, statement, query)
+
+        execution.execute_frame = flaky
+        try:
+            pages = list(self.query.iter_pages(page_size=10,
+                                               order_by=["code", "date_"]))
+        finally:
+            execution.execute_frame = original
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(sum(len(page.frame) for page in pages), 22)
+
+if __name__ == "__main__":
+    unittest.main()
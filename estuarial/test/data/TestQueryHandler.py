@@ -206,6 +206,50 @@ class TestQueryHandler(unittest.TestCase):
         self.safe_remove(self.expected_autogen_directory)
 
 
+    def test__publish_queries_unchanged_source(self):
+        """
+        Checks that publishing an unchanged composite yaml again does not
+        rewrite its autogen files, and that removed files are republished.
+        """
+        self.safe_remove(self.expected_autogen_directory)
+        query_files = self.query_handler._publish_queries(
+            self.custom_sql_test_file)[0]
+
+        # Backdate the files so that any rewrite would be visible.
+        for file_path in query_files.values():
+            os.utime(file_path, (0, 0))
+
+        self.query_handler._publish_queries(self.custom_sql_test_file)
+        for file_path in query_files.values():
+            self.assertEqual(os.path.getmtime(file_path), 0)
+
+        removed_file = query_files.values()[0]
+        os.remove(removed_file)
+        self.query_handler._publish_queries(self.custom_sql_test_file)
+        self.assertTrue(os.path.exists(removed_file))
+
+        self.safe_remove(self.expected_autogen_directory)
+
+
+    def test_create_type_from_yaml_cached(self):
+        """
+        Checks that creating a type twice from the same yaml reuses the type,
+        unless its autogen files were removed in between.
+        """
+        first = self.query_handler.create_type_from_yaml(
+            self.custom_sql_test_file)
+        second = QueryHandler().create_type_from_yaml(
+            self.custom_sql_test_file)
+        self.assertIs(first, second)
+
+        self.safe_remove(self.expected_autogen_directory)
+        third = self.query_handler.create_type_from_yaml(
+            self.custom_sql_test_file)
+        self.assertIsNot(first, third)
+
+        self.safe_remove(self.expected_autogen_directory)
+
+
     def test__publish_docstring(self):
         """
         Check that when dosctrings are autogenerated from Yaml, the function
@@ -348,6 +392,45 @@ class TestQueryHandler(unittest.TestCase):
         self.safe_remove(self.expected_autogen_directory)
 
 
+    def test__function_factory_compiles_once(self):
+        """
+        Check that the keyword dispatch table of a created function is built
+        on first use and reused by later calls rather than rebuilt per call.
+        """
+        (query_files, # Dict of (function name, autogen file) pairs.
+         type_name,   # Name of the created class.
+         type_data,   # Contents of the original composite yaml.
+         func_names   # List of function names from the yaml file.
+         ) = self.query_handler._publish_queries(self.custom_sql_test_file)
+
+        for f_name, f_file in query_files.iteritems():
+            known_args, function_doc = (
+                self.query_handler._publish_docstring(type_data[f_name])
+            )
+            test_function = self.query_handler._function_factory(f_file,
+                                                                 f_name,
+                                                                 known_args)
+            compiled_query = test_function.compiled_query
+
+            # Nothing is built until the function is first called.
+            self.assertIsNone(compiled_query._kwarg_responses)
+
+            first_table = compiled_query.dispatch_table()
+            second_table = compiled_query.dispatch_table()
+            self.assertIs(first_table, second_table)
+
+            # Every conditional is reachable through the dispatch table.
+            for base_arg in known_args:
+                self.assertIn(base_arg.lower(), first_table)
+
+            # Resetting forces the next call to rebuild the table.
+            compiled_query.reset()
+            self.assertIsNone(compiled_query._kwarg_responses)
+
+        # Clean up the created autogen files.
+        self.safe_remove(self.expected_autogen_directory)
+
+
     def test_create_type_from_yaml(self):
         """
         Check that a Python class is created from a composite yaml url. Inspect
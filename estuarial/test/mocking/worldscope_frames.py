@@ -0,0 +1,45 @@
+"""
+Synthetic Worldscope frames for the alignment tests and benchmarks.
+
+    frame = make_worldscope_frame(10**5)
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+import pandas as pd
+
+
+def make_worldscope_frame(rows, seed=0):
+    """
+    Synthetic Worldscope rows mixing reported dates, fiscal year ends only
+    and rows with neither. Dates are object columns holding `np.nan` for
+    missing values, as the alignment expects.
+    """
+    random = np.random.RandomState(seed)
+    dates = pd.date_range("1990-01-31", periods=300, freq="M")
+    ddate = np.empty(rows, dtype=object)
+    fdate = np.empty(rows, dtype=object)
+
+    kind = random.randint(0, 3, rows)
+    kind[0] = 1
+    for row in range(rows):
+        if kind[row] == 0:
+            ddate[row] = dates[random.randint(300)]
+            fdate[row] = np.nan
+        elif kind[row] == 1:
+            ddate[row] = np.nan
+            fdate[row] = dates[random.randint(300)]
+        else:
+            ddate[row] = np.nan
+            fdate[row] = np.nan
+
+    return pd.DataFrame(
+        {"seccode": random.randint(0, 50, rows),
+         "seq": random.randint(1, 5, rows),
+         "ddate": pd.Series(ddate, dtype=object),
+         "fdate": pd.Series(fdate, dtype=object),
+         "value_": random.rand(rows)},
+        columns=["seccode", "seq", "ddate", "fdate", "value_"]
+    )
@@ -0,0 +1,62 @@
+"""
+Unit tests for the concurrent front-end.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import time
+import threading
+import unittest
+from estuarial.query import aio
+
+
+class TestAio(unittest.TestCase):
+    """
+    Run a blocking stand-in through `AsyncProxy` and check that calls are
+    concurrent up to the worker limit.
+    """
+
+    class Blocking(object):
+        """
+        Stand-in for a query interface whose calls block for a while.
+        """
+        label = "blocking"
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.running = 0
+            self.peak = 0
+
+        def query(self, value, delay=0.05):
+            with self.lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            time.sleep(delay)
+            with self.lock:
+                self.running -= 1
+            return value * 2
+
+    def test_gather(self):
+        """
+        Results come back in order and calls overlap.
+        """
+        blocking = self.Blocking()
+        proxy = aio.AsyncProxy(blocking, max_workers=4)
+        try:
+            calls = [proxy.query(value) for value in range(8)]
+            results = [call.result() for call in calls]
+        finally:
+            proxy.executor.shutdown()
+
+        self.assertEqual(results, [value * 2 for value in range(8)])
+        self.assertEqual(blocking.peak, 4)
+
+    def test_attributes(self):
+        """
+        Non-callable attributes are passed through unchanged.
+        """
+        proxy = aio.AsyncProxy(self.Blocking(), max_workers=1)
+        self.assertEqual(proxy.label, "blocking")
+        proxy.executor.shutdown()
+
+if __name__ == "__main__":
+    unittest.main()
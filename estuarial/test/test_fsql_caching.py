@@ -1,6 +1,7 @@
 from estuarial.query.trqad import TRQAD
 from sqlalchemy.sql import column, and_, or_
 from estuarial.browse.universe_builder import UniverseBuilder
+from estuarial.array.execution import select_in
 
 tr = TRQAD()
 c = tr.aclient
@@ -13,24 +14,21 @@ universe = spx.data.seccode.tolist()[:20]
  [14316, 14343, 18740, 24305, 25392],
  [26099, 27913, 32530, 36947, 37133]]
 
-chunksize = 2000
-chunks = [universe[start:start+chunksize] 
-          for start in range(0, len(universe), chunksize)]
-
 item = 1705
 freq = 'Q'
 
-arr = c['/WORLDSCOPE/worldscope_metrics.fsql']
-df = [arr.select(and_(arr.seccode.in_(chunk), 
-                      arr.item==item, 
-                      arr.freq==freq))
-      for chunk in chunks]
+url = '/FUNDAMENTALS/WORLDSCOPE/worldscope_fundamentals.yaml'
+arr = c[url]
+df = select_in(c, url, 'seccode', universe,
+               conditions=[arr.item==item, arr.freq==freq],
+               date_1='2000-01-01', date_2='2013-12-31')
 
+# Large universes are split into parameter-safe chunks and run in parallel.
 us = UniverseBuilder.us()
 universe = us.data.seccode.tolist()
-chunksize = 2000
-chunks = [universe[start:start+chunksize] 
-          for start in range(0, len(universe), chunksize)]
+df = select_in(c, url, 'seccode', universe,
+               conditions=[arr.item==item, arr.freq==freq],
+               date_1='2000-01-01', date_2='2013-12-31')
 
 us = UniverseBuilder.us()
 ca = UniverseBuilder.ca()
@@ -0,0 +1,117 @@
+"""
+Test the returns analytics provided by estuarial.util.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import datetime
+import unittest
+import numpy as np
+import pandas as pd
+from estuarial.util import analytics
+
+
+class TestAnalytics(unittest.TestCase):
+    """
+    Check the vectorized returns pipeline against direct per-security
+    computations.
+    """
+
+    def test_clean_delistings(self):
+        """
+        Records before the last date of their month lose their return, and
+        every record is moved to that month-end.
+        """
+        raw = pd.DataFrame(
+            {"Code": [1, 2, 1, 2],
+             "Date_": [datetime.date(2013, 1, 31), datetime.date(2013, 1, 15),
+                       datetime.date(2013, 2, 28), datetime.date(2013, 2, 28)],
+             "TotRet": [10.0, 20.0, 11.0, 21.0]},
+            columns=["Code", "Date_", "TotRet"])
+
+        cleaned = analytics.clean_delistings(raw)
+        self.assertEqual(cleaned.columns.tolist(),
+                         ["AdjDate", "Code", "TotRet"])
+        self.assertEqual(cleaned.AdjDate.tolist(),
+                         [datetime.date(2013, 1, 31)] * 2 +
+                         [datetime.date(2013, 2, 28)] * 2)
+        self.assertTrue(np.isnan(cleaned.TotRet[1]))
+        self.assertEqual(cleaned.TotRet[[0, 2, 3]].tolist(),
+                         [10.0, 11.0, 21.0])
+        self.assertEqual(raw.TotRet[1], 20.0)
+
+    def test_adjust_period_returns(self):
+        """
+        Period returns chain consecutive cumulative returns per identifier,
+        whatever the row order.
+        """
+        dates = pd.date_range("2013-01-31", periods=3, freq="M")
+        raw = pd.DataFrame(
+            {"Code": [2, 1, 1, 2, 1, 2],
+             "AdjDate": [dates[1], dates[2], dates[0],
+                         dates[0], dates[1], dates[2]],
+             "TotRet": [5.0, 21.0, 0.0, 0.0, 10.0, 2.0]},
+            columns=["Code", "AdjDate", "TotRet"])
+
+        adjusted = analytics.adjust_period_returns(raw)
+        monthly = adjusted.TotalReturnMonthly.values
+        expected = [0.05, 1.21 / 1.1 - 1, np.nan,
+                    np.nan, 0.1, 1.02 / 1.05 - 1]
+        np.testing.assert_allclose(monthly, expected)
+
+    def test_rolling_ols(self):
+        """
+        Rolling beta and t-statistics match a direct least-squares fit of
+        each window, skipping missing observations.
+        """
+        random = np.random.RandomState(0)
+        groups = np.repeat([1, 2, 3], [40, 25, 8])
+        x = random.normal(0, 0.05, len(groups))
+        y = 0.01 + 1.3 * x + random.normal(0, 0.02, len(groups))
+        y[[5, 50]] = np.nan
+
+        result = analytics.rolling_ols(groups, x, y, window=12,
+                                       min_periods=6)
+
+        for row in range(len(groups)):
+            in_group = np.flatnonzero((groups == groups[row]) &
+                                      ~np.isnan(y))
+            history = in_group[in_group <= row][-12:]
+            if np.isnan(y[row]) or len(history) < 6:
+                self.assertTrue(np.isnan(result["beta"][row]))
+                continue
+
+            design = np.column_stack((np.ones(len(history)), x[history]))
+            coefs, residuals = np.linalg.lstsq(design, y[history],
+                                               rcond=-1)[:2]
+            sigma2 = residuals[0] / (len(history) - 2)
+            covariance = sigma2 * np.linalg.inv(design.T.dot(design))
+            tstat = coefs[1] / np.sqrt(covariance[1, 1])
+
+            self.assertAlmostEqual(result["alpha"][row], coefs[0])
+            self.assertAlmostEqual(result["beta"][row], coefs[1])
+            self.assertAlmostEqual(result["beta_tstat"][row], tstat, places=6)
+            self.assertEqual(result["nobs"][row], len(history))
+
+    def test_rolling_beta(self):
+        """
+        Beta columns are added to the frame sorted by identifier and date.
+        """
+        dates = pd.date_range("2010-01-31", periods=30, freq="M")
+        random = np.random.RandomState(1)
+        market = random.normal(0, 0.04, len(dates))
+        frames = []
+        for code, beta in ((7, 0.5), (3, 1.5)):
+            frames.append(pd.DataFrame(
+                {"Code": code, "AdjDate": dates, "ExcessMarket": market,
+                 "RiskFreeRate": 0.001,
+                 "TotalReturnMonthly": 0.001 + beta * market}))
+        returns = pd.concat(frames, ignore_index=True)
+
+        betas = analytics.rolling_beta(returns, window=24, min_periods=12)
+        self.assertEqual(betas.Code.tolist(), [3] * 30 + [7] * 30)
+        self.assertTrue(np.isnan(betas.Beta.values[:11]).all())
+        np.testing.assert_allclose(betas.Beta.values[11:30], 1.5)
+        np.testing.assert_allclose(betas.Beta.values[41:60], 0.5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Test the columnar on-disk format provided by estuarial.util.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+from estuarial.util import columnar
+
+
+class TestColumnar(unittest.TestCase):
+    """
+    Round-trip DataFrames through ColumnarWriter and ColumnarStore.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "store")
+        self.first = pd.DataFrame(
+            {"code": [1, 2, 3],
+             "name": ["IBM", None, "AAPL"],
+             "date": pd.to_datetime(["2013-01-31", "2013-02-28", None]),
+             "value": [1.5, np.nan, 2.5]},
+            columns=["code", "name", "date", "value"]
+        )
+        self.second = pd.DataFrame(
+            {"code": [4],
+             "name": ["MSFT"],
+             "date": pd.to_datetime(["2013-03-29"]),
+             "value": [3.5]},
+            columns=["code", "name", "date", "value"]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        """
+        Appended chunks read back as one frame with the same dtypes.
+        """
+        with columnar.ColumnarWriter(self.path, {"query": "q"}) as writer:
+            writer.append(self.first)
+            writer.append(self.second)
+
+        store = columnar.ColumnarStore(self.path)
+        self.assertEqual(store.rows, 4)
+        self.assertEqual(store.metadata, {"query": "q"})
+
+        expected = pd.concat([self.first, self.second], ignore_index=True)
+        assert_frame_equal(store.to_frame(), expected)
+
+    def test_row_selection(self):
+        """
+        Columns can be read memory-mapped and filtered by a row mask.
+        """
+        columnar.write_frame(self.path, self.first)
+        store = columnar.ColumnarStore(self.path)
+
+        codes = store.column("code")
+        self.assertIsInstance(codes, np.memmap)
+
+        rows = codes >= 2
+        frame = store.to_frame(columns=["code", "name"], rows=rows)
+        self.assertEqual(frame.code.tolist(), [2, 3])
+        self.assertEqual(frame.name.tolist(), [None, "AAPL"])
+
+    def test_mismatched_chunk(self):
+        """
+        Chunks must have the columns fixed by the first chunk.
+        """
+        writer = columnar.ColumnarWriter(self.path)
+        writer.append(self.first)
+        self.assertRaises(ValueError, writer.append, self.first[["code"]])
+
+    def test_mixed_columns(self):
+        """
+        Object columns that are neither numbers nor dates are stored as text,
+        as are later non-string values of a column fixed as strings.
+        """
+        mixed = pd.DataFrame({"code": ["A", 2], "name": ["IBM", "MSFT"]},
+                             columns=["code", "name"])
+        with columnar.ColumnarWriter(self.path) as writer:
+            writer.append(mixed)
+            writer.append(pd.DataFrame({"code": ["C"], "name": [7]},
+                                       columns=["code", "name"]))
+
+        frame = columnar.ColumnarStore(self.path).to_frame()
+        self.assertEqual(frame.code.tolist(), ["A", "2", "C"])
+        self.assertEqual(frame.name.tolist(), ["IBM", "MSFT", "7"])
+
+    def test_refuses_non_store(self):
+        """
+        An unrelated non-empty directory is never cleared.
+        """
+        with open(os.path.join(self.tmp_dir, "keep.txt"), "w") as keep:
+            keep.write("keep")
+        self.assertRaises(ValueError, columnar.ColumnarWriter, self.tmp_dir)
+
+if __name__ == "__main__":
+    unittest.main()
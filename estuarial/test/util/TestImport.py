@@ -0,0 +1,91 @@
+"""
+Test that importing estuarial has no side effects, and that the user
+directory and log file are set up on first use instead.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+import subprocess
+from os.path import join as pjoin
+import estuarial
+from estuarial.util import logger
+from estuarial.util.config import config
+
+
+class TestImport(unittest.TestCase):
+    """
+    Check that nothing is written on import, and what is written later.
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.user_dir = pjoin(self.tmp_dir, ".estuarial")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_import(self):
+        """
+        Importing the query modules in a fresh interpreter writes nothing to
+        the home directory and does not load the array backend.
+        """
+        root = os.path.dirname(os.path.dirname(
+            os.path.abspath(estuarial.__file__)))
+        environment = dict(os.environ, HOME=self.tmp_dir,
+                           USERPROFILE=self.tmp_dir, PYTHONPATH=root)
+        script = ("import sys, estuarial.query.trqad, "
+                  "estuarial.browse.market_index; "
+                  "print('arraymanagement.client' in sys.modules)")
+        output = subprocess.check_output([sys.executable, "-c", script],
+                                         env=environment, cwd=self.tmp_dir)
+        self.assertEqual(output.decode("ascii").strip(), "False")
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    def test_ensure_user_config(self):
+        """
+        The catalog config and ini are copied once, including into a user
+        directory that already holds other files.
+        """
+        originals = (config.UserConfigDir, config.UserConfigPath,
+                     config._user_config_ready)
+        config.UserConfigDir = self.user_dir
+        config.UserConfigPath = pjoin(self.user_dir, "estuarial.ini")
+        config._user_config_ready = False
+        os.makedirs(pjoin(self.user_dir, "estuarial-logs"))
+        try:
+            config.ensure_user_config()
+            self.assertTrue(os.path.isfile(config.UserConfigPath))
+            self.assertTrue(os.path.isfile(pjoin(self.user_dir, "datalib",
+                                                 "config.py")))
+
+            shutil.rmtree(self.user_dir)
+            config.ensure_user_config()
+            self.assertFalse(os.path.exists(self.user_dir))
+        finally:
+            (config.UserConfigDir, config.UserConfigPath,
+             config._user_config_ready) = originals
+
+    def test_log_file(self):
+        """
+        The log directory and file are created by the first record.
+        """
+        original = logger.ESTUARIAL_LOG_DIR
+        logger.ESTUARIAL_LOG_DIR = pjoin(self.user_dir, "estuarial-logs")
+        handler = logger.DailyFileHandler()
+        try:
+            self.assertFalse(os.path.exists(self.user_dir))
+            handler.emit(logging.makeLogRecord({"msg": "first record"}))
+            handler.flush()
+            with open(logger.DailyFileHandler.path()) as log_file:
+                self.assertEqual(log_file.read().strip(), "first record")
+        finally:
+            handler.close()
+            logger.ESTUARIAL_LOG_DIR = original
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+Unit tests for the date-sliced metric indexers of a universe.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import time
+import unittest
+import numpy as np
+import pandas as pd
+from sqlalchemy import sql
+from pandas.util.testing import assert_frame_equal
+from estuarial.util import indexing
+
+
+class TestIndexing(unittest.TestCase):
+    """
+    Check that price slices go through the interval cache, that fundamentals
+    are kept in memory for a bounded time and size, and that metrics of one
+    source share a query.
+    `select_in_range` and `select_in` are replaced by an in-memory table.
+    """
+
+    class Client(object):
+        """
+        Stand-in for the array client, returning nodes with a date
+        conditional and item and freq columns.
+        """
+        def __getitem__(self, url):
+            node = type("Node", (object,), {})()
+            node.fields = ["seccode", "marketdate"]
+            node.item = sql.column("item")
+            node.freq = sql.column("freq")
+            return node
+
+    class Universe(object):
+        """
+        Stand-in for `Universe` exposing its seccodes and client.
+        """
+        def __init__(self, seccodes, aclient):
+            self.seccodes = np.array(seccodes)
+            self.aclient = aclient
+
+    def setUp(self):
+        days = pd.date_range("2013-01-01", "2013-12-31")
+        self.table = pd.DataFrame({
+            "SECCODE": np.repeat([7, 3], len(days)),
+            "MARKETDATE": np.tile(days.values, 2),
+            "CLOSE_": np.arange(2 * len(days), dtype=float)},
+            columns=["SECCODE", "MARKETDATE", "CLOSE_"])
+
+        self.calls = []
+        self.originals = indexing.select_in_range, indexing.select_in
+
+        def select_in_range(aclient, url, column_name, values, start, end,
+                            conditions=(), cached=False, **date_kwargs):
+            self.calls.append(("range", url, values, conditions, cached))
+            return self.rows(values, start, end)
+
+        def select_in(aclient, url, column_name, values, conditions=(),
+                      direct=False):
+            self.calls.append(("in", url, values, conditions, direct))
+            dates = conditions[-1]
+            return self.rows(values, dates.clauses[0].right.value,
+                             dates.clauses[1].right.value)
+
+        indexing.select_in_range = select_in_range
+        indexing.select_in = select_in
+        self.universe = self.Universe([3, 7], self.Client())
+        self.ohlc = indexing._OHLCIndexer(self.universe, "ohlc")
+
+    def tearDown(self):
+        indexing.select_in_range, indexing.select_in = self.originals
+
+    def rows(self, values, start, end):
+        table = self.table
+        return table[table.SECCODE.isin(values) &
+                     (table.MARKETDATE >= start) &
+                     (table.MARKETDATE <= end)].reset_index(drop=True)
+
+    def expected(self, start, stop):
+        table = self.table
+        rows = table[(table.MARKETDATE >= start) & (table.MARKETDATE <= stop)]
+        order = np.lexsort([rows.MARKETDATE.values, rows.SECCODE.values])
+        return rows.take(order).reset_index(drop=True)
+
+    def test_prices(self):
+        """
+        Price slices go through the interval cache, ordered by member and
+        date.
+        """
+        result = self.ohlc["2013-02-01":"2013-06-30"]
+        assert_frame_equal(result, self.expected("2013-02-01", "2013-06-30"))
+        self.ohlc["2013-03-01":"2013-03-31"]
+        self.assertEqual([call[0] for call in self.calls], ["range"] * 2)
+        self.assertTrue(all(call[4] for call in self.calls))
+
+    def dates(self, call):
+        """
+        Return the (start, end) of the date condition of a direct call.
+        """
+        dates = call[3][-1]
+        return dates.clauses[0].right.value, dates.clauses[1].right.value
+
+    def test_fundamentals(self):
+        """
+        Fundamentals are queried directly on the database with the item,
+        frequency and date conditions. Sub-ranges of the fetched rows are
+        answered in memory and overlapping ranges only query the delta.
+        """
+        cash = indexing._MetricIndexer(self.universe, "cash")
+        result = cash["2013-01-01":"2013-01-31"]
+        assert_frame_equal(result, self.expected("2013-01-01", "2013-01-31"))
+        self.assertEqual([call[:2] for call in self.calls],
+                         [("in", cash.url)])
+        self.assertTrue(self.calls[0][4])
+        self.assertEqual(len(self.calls[0][3]), 3)
+
+        result = cash["2013-01-10":"2013-01-20"]
+        assert_frame_equal(result, self.expected("2013-01-10", "2013-01-20"))
+        self.assertEqual(len(self.calls), 1)
+
+        result = cash["2013-01-15":"2013-02-15"]
+        assert_frame_equal(result, self.expected("2013-01-15", "2013-02-15"))
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.dates(self.calls[1]),
+                         (pd.Timestamp("2013-02-01"),
+                          pd.Timestamp("2013-02-15")))
+
+    def test_fundamentals_bounds(self):
+        """
+        Kept fundamentals are refetched once too old, and not kept beyond
+        the row limit.
+        """
+        cash = indexing._MetricIndexer(self.universe, "cash")
+        cash.max_age = 0
+        cash["2013-01-01":"2013-01-31"]
+        time.sleep(0.01)
+        cash["2013-01-01":"2013-01-31"]
+        self.assertEqual(len(self.calls), 2)
+
+        cash = indexing._MetricIndexer(self.universe, "cash")
+        cash.max_rows = 10
+        result = cash["2013-01-01":"2013-01-31"]
+        self.assertEqual(len(result), 62)
+        cash["2013-01-01":"2013-01-31"]
+        self.assertEqual(len(self.calls), 4)
+        cash.clear()
+        self.assertTrue(cash._rows is None)
+
+    def test_universe_change(self):
+        """
+        Replacing the universe's seccodes changes the members queried.
+        """
+        self.ohlc["2013-01-01":"2013-01-31"]
+        self.universe.seccodes = np.array([7])
+        result = self.ohlc["2013-01-01":"2013-01-31"]
+        self.assertEqual(self.calls[-1][2], [7])
+        self.assertEqual(set(result.SECCODE), set([7]))
+
+    def test_registry(self):
+        """
+        Metrics of one source requested together are fetched by one query,
+        and registered metrics become universe attributes.
+        """
+        indexing.register_metric("eps", 5201)
+        try:
+            self.assertEqual(indexing.resolve_metric("eps")[1], 5201)
+            self.assertEqual(dict(indexing.get_metrics_list())["eps"],
+                             indexing._MetricIndexer)
+
+            metrics = indexing._MetricSelector(self.universe)
+            combined = metrics["cash", "ni", "eps"]
+            self.assertTrue(metrics["eps", "ni", "cash"] is combined)
+            self.assertEqual(combined.items, [1751, 2001, 5201])
+            combined["2013-01-01":"2013-01-31"]
+            self.assertEqual(len(self.calls), 1)
+            items, freq = [str(condition.compile(
+                compile_kwargs={"literal_binds": True}))
+                for condition in self.calls[0][3][:2]]
+            self.assertEqual(items, "item IN (1751, 2001, 5201)")
+            self.assertEqual(freq, "freq = 'Q'")
+        finally:
+            indexing._metrics.pop("eps", None)
+        self.assertRaises(KeyError, indexing.register_metric, "x", 1, "none")
+
+if __name__ == "__main__":
+    unittest.main()
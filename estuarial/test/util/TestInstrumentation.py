@@ -0,0 +1,108 @@
+"""
+Unit tests for the query instrumentation.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import unittest
+from sqlalchemy import create_engine, sql
+from estuarial.util import instrumentation
+from estuarial.util.instrumentation import Instrumentation, Event
+from estuarial.array import execution
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Check that spans reach callbacks and the rolling statistics, and that the
+    direct execution path reports its phases.
+    """
+
+    def setUp(self):
+        self.instruments = Instrumentation()
+        self.events = []
+
+    def test_inactive(self):
+        """
+        Nothing is timed without callbacks or statistics.
+        """
+        emitted = []
+        self.instruments.emit = emitted.append
+        with self.instruments.span("query", instrumentation.FETCH) as span:
+            span.rows = 3
+        self.assertFalse(self.instruments.active)
+        self.assertEqual(emitted, [])
+
+    def test_callbacks(self):
+        """
+        Subscribed callbacks receive events, failing ones are skipped and
+        unsubscribed ones no longer called.
+        """
+        def failing(event):
+            raise RuntimeError("callback failure")
+
+        self.instruments.subscribe(failing)
+        self.instruments.subscribe(self.events.append)
+        with self.instruments.span("query", instrumentation.CACHE_MISS) as span:
+            span.phase = instrumentation.CACHE_HIT
+            span.rows = 3
+
+        self.assertEqual(len(self.events), 1)
+        event = self.events[0]
+        self.assertIsInstance(event, Event)
+        self.assertEqual((event.query, event.phase, event.rows),
+                         ("query", instrumentation.CACHE_HIT, 3))
+        self.assertTrue(event.seconds >= 0)
+
+        self.instruments.unsubscribe(self.events.append)
+        with self.instruments.span("query", instrumentation.FETCH):
+            pass
+        self.assertEqual(len(self.events), 1)
+
+    def test_stats(self):
+        """
+        The statistics table has one row per query and phase, and shares of
+        the query time that leave out whole calls.
+        """
+        stats = self.instruments.enable_stats(window=2)
+        for seconds in (1.0, 3.0, 5.0):
+            self.instruments.emit(Event("q", instrumentation.EXECUTE, 0,
+                                        seconds, None, None))
+            self.instruments.emit(Event("q", instrumentation.FRAME, 0, 1.0,
+                                        10, 80))
+            self.instruments.emit(Event("q", instrumentation.CALL, 0,
+                                        seconds + 1.0, 10, 80))
+
+        table = stats.table()
+        execute = table.loc[("q", instrumentation.EXECUTE)]
+        self.assertEqual(execute["count"], 3)
+        self.assertAlmostEqual(execute["mean_ms"], 4000.0)
+        self.assertAlmostEqual(execute["max_ms"], 5000.0)
+        self.assertAlmostEqual(execute["share"], 0.8)
+        frame = table.loc[("q", instrumentation.FRAME)]
+        self.assertEqual((frame["rows"], frame["bytes"]), (20, 160))
+        self.assertTrue(table["share"].isnull()[("q", instrumentation.CALL)])
+
+    def test_execute_frame(self):
+        """
+        Direct execution reports execute, fetch and frame phases.
+        """
+        original = execution.instruments
+        execution.instruments = self.instruments
+        self.instruments.subscribe(self.events.append)
+        try:
+            engine = create_engine("sqlite://")
+            statement = sql.select([sql.literal_column("1").label("one")])
+            frame = execution.execute_frame(engine, statement, "one.yaml")
+        finally:
+            execution.instruments = original
+
+        self.assertEqual(list(frame["one"]), [1])
+        self.assertEqual([(event.query, event.phase) for event in self.events],
+                         [("one.yaml", instrumentation.EXECUTE),
+                          ("one.yaml", instrumentation.FETCH),
+                          ("one.yaml", instrumentation.FRAME)])
+        self.assertEqual(self.events[1].rows, 1)
+        self.assertEqual(self.events[2].nbytes,
+                         instrumentation.frame_bytes(frame))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Test the munging helpers provided by estuarial.util.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+import unittest
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+from estuarial.util import munging
+from estuarial.test.mocking.worldscope_frames import make_worldscope_frame
+
+
+class TestMunging(unittest.TestCase):
+    """
+    Compare the vectorized `worldscope_align` against the row-wise loop.
+    """
+
+    def test_worldscope_align_matches_rowwise(self):
+        """
+        Both implementations fill the same report dates.
+        """
+        for rows, seed in [(10, 0), (500, 1), (2000, 2)]:
+            frame = make_worldscope_frame(rows, seed)
+            expected = munging._worldscope_align_rowwise(frame.copy())
+            result = munging.worldscope_align(frame.copy())
+            assert_frame_equal(result, expected)
+
+    def test_worldscope_align_index(self):
+        """
+        Alignment does not depend on a default integer index.
+        """
+        frame = make_worldscope_frame(200, 3)
+        frame.index = frame.index * 7 + 3
+        expected = munging._worldscope_align_rowwise(frame.copy())
+        assert_frame_equal(munging.worldscope_align(frame.copy()), expected)
+
+    def test_worldscope_align_month_ends(self):
+        """
+        Month arithmetic clamps to the end of shorter months.
+        """
+        frame = pd.DataFrame(
+            {"seq": [1, 2],
+             "ddate": pd.Series([np.nan, np.nan], dtype=object),
+             "fdate": pd.Series([pd.Timestamp("2013-05-31"), np.nan],
+                                dtype=object)},
+            columns=["seq", "ddate", "fdate"]
+        )
+        result = munging.worldscope_align(frame)
+        self.assertEqual(result.ddate.tolist(),
+                         [pd.Timestamp("2013-02-28"),
+                          pd.Timestamp("2013-11-30")])
+
+    def test_worldscope_align_without_fiscal_year(self):
+        """
+        Rows with no dates before any fiscal year end cannot be aligned.
+        """
+        frame = pd.DataFrame(
+            {"seq": [1],
+             "ddate": pd.Series([np.nan], dtype=object),
+             "fdate": pd.Series([np.nan], dtype=object)},
+            columns=["seq", "ddate", "fdate"]
+        )
+        self.assertRaises(ValueError, munging.worldscope_align, frame)
+
+if __name__ == "__main__":
+    unittest.main()
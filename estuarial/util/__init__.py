@@ -1 +1 @@
-from . import config, logger, munging, indexing
+from . import config, logger, munging, indexing, columnar
@@ -0,0 +1,173 @@
+"""
+Vectorized returns analytics: month-end cleaning of raw total return
+series, period returns from cumulative ones, and rolling single-factor OLS
+(beta and t-statistics) for every security in one pass.
+
+These started out as the per-group helpers of the beta quintile demo.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+import pandas as pd
+
+def _group_starts(groups):
+    """
+    Given group labels sorted so that equal labels are contiguous, return
+    for every row the position of the first row of its group.
+    """
+    groups = np.asarray(groups)
+    n = len(groups)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = groups[1:] != groups[:-1]
+    starts = np.where(new_group, np.arange(n), 0)
+    return np.maximum.accumulate(starts)
+
+def clean_delistings(monthly_raw_returns, date_column="Date_",
+                     returns_column="TotRet"):
+    """
+    Keep only records as-of the last available date in their month, which
+    is the latest date of any record in that month. Returns of the other
+    records (e.g. securities that delisted mid-month) are set to NaN, and
+    every record gets an `AdjDate` moved to that month-end date.
+
+    `AdjDate` holds datetime64 values when the date column does, and
+    `datetime.date` values otherwise. The input frame is not modified.
+    """
+    original_columns = monthly_raw_returns.columns.values.tolist()
+    original_columns.remove(date_column)
+
+    dates = pd.DatetimeIndex(monthly_raw_returns[date_column].values)
+    days = np.asarray(dates.day)
+    year_month = 100 * np.asarray(dates.year) + np.asarray(dates.month)
+
+    max_day = pd.Series(days).groupby(year_month).transform('max').values
+    at_max = days == max_day
+
+    cleaned = monthly_raw_returns.copy()
+    returns = cleaned[returns_column].values.astype(float)
+    returns[~at_max] = np.nan
+    cleaned[returns_column] = returns
+
+    shift = (max_day - days).astype('timedelta64[D]')
+    adjusted = dates.values + shift
+    if not np.issubdtype(monthly_raw_returns[date_column].dtype,
+                         np.datetime64):
+        adjusted = pd.DatetimeIndex(adjusted).date
+    cleaned["AdjDate"] = adjusted
+
+    return cleaned[["AdjDate"] + original_columns]
+
+def adjust_period_returns(monthly_raw_returns, date_column="AdjDate",
+                          identifier_column="Code", returns_column="TotRet"):
+    """
+    Given cumulative returns in percent (gross from inception) that fall on
+    month-ends, add a `TotalReturnMonthly` column of period-by-period
+    returns, (1 + r_new) / (1 + r_old) - 1 for consecutive dates of each
+    identifier. The first period of each identifier is NaN.
+    """
+    identifiers = monthly_raw_returns[identifier_column].values
+    dates = monthly_raw_returns[date_column].values
+    order = np.lexsort((dates, identifiers))
+
+    returns = monthly_raw_returns[returns_column].values[order] / 100.0
+    previous = np.empty_like(returns)
+    previous[0:1] = np.nan
+    previous[1:] = returns[:-1]
+    previous[_group_starts(identifiers[order]) == np.arange(len(order))] = (
+        np.nan)
+
+    period_returns = np.empty(len(order))
+    period_returns[order] = (returns - previous) / (1.0 + previous)
+
+    adjusted = monthly_raw_returns.copy()
+    adjusted["TotalReturnMonthly"] = period_returns
+    return adjusted
+
+def rolling_ols(groups, x, y, window=60, min_periods=12):
+    """
+    Rolling regression y = alpha + beta * x over the last `window` valid
+    observations of each group, for all groups at once.
+
+    Rows must be sorted by group and then by date. Rows where x or y is NaN
+    are skipped, both as observations and as results (NaN). Windows with
+    fewer than `min_periods` observations give NaN.
+
+    The window sums of x, y, x*x, x*y and y*y are differences of cumulative
+    sums, so the cost is linear in the number of rows whatever the window.
+
+    Returns a dict of arrays aligned with the rows: "alpha", "beta",
+    "beta_tstat" and "nobs".
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    groups = np.asarray(groups)
+
+    n_rows = len(x)
+    result = dict((name, np.nan * np.ones(n_rows))
+                  for name in ("alpha", "beta", "beta_tstat", "nobs"))
+
+    valid = np.isfinite(x) & np.isfinite(y)
+    rows = np.flatnonzero(valid)
+    if len(rows) == 0:
+        return result
+    xv, yv = x[rows], y[rows]
+
+    # Position of the first observation of each window, within the valid
+    # observations, clipped to the start of the group.
+    positions = np.arange(len(rows))
+    starts = np.maximum(_group_starts(groups[rows]), positions - window + 1)
+
+    def window_sum(values):
+        totals = np.concatenate(([0.0], np.cumsum(values)))
+        return totals[positions + 1] - totals[starts]
+
+    nobs = (positions - starts + 1).astype(float)
+    sx, sy = window_sum(xv), window_sum(yv)
+    sxx, sxy = window_sum(xv * xv), window_sum(xv * yv)
+    syy = window_sum(yv * yv)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_var = sxx - sx * sx / nobs
+        xy_cov = sxy - sx * sy / nobs
+        y_var = syy - sy * sy / nobs
+
+        beta = xy_cov / x_var
+        alpha = (sy - beta * sx) / nobs
+        residual = np.maximum(y_var - beta * xy_cov, 0.0)
+        beta_se = np.sqrt(residual / (nobs - 2) / x_var)
+        beta_tstat = beta / beta_se
+
+    enough = (nobs >= max(min_periods, 3)) & (x_var > 0)
+    for name, values in (("alpha", alpha), ("beta", beta),
+                         ("beta_tstat", beta_tstat), ("nobs", nobs)):
+        result[name][rows[enough]] = values[enough]
+    return result
+
+def rolling_beta(returns, date_column="AdjDate", identifier_column="Code",
+                 returns_column="TotalReturnMonthly",
+                 risk_free_column="RiskFreeRate",
+                 market_column="ExcessMarket", window=60, min_periods=12):
+    """
+    Add `Beta` and `Beta_tstat` columns from a rolling regression of each
+    identifier's excess returns on the excess market return, using the
+    last `window` monthly observations (at least `min_periods`).
+
+    The frame is returned sorted by identifier and date.
+    """
+    order = np.lexsort((returns[date_column].values,
+                        returns[identifier_column].values))
+    returns = returns.iloc[order].copy()
+
+    excess = (returns[returns_column].values -
+              returns[risk_free_column].values)
+    ols = rolling_ols(returns[identifier_column].values,
+                      returns[market_column].values, excess,
+                      window=window, min_periods=min_periods)
+
+    returns["Beta"] = ols["beta"]
+    returns["Beta_tstat"] = ols["beta_tstat"]
+    return returns
@@ -0,0 +1,327 @@
+"""
+Minimal columnar on-disk format for DataFrames.
+
+A store is a directory holding one raw binary file per column plus a json
+schema. Fixed-width columns (numbers, booleans, datetimes) can be memory-
+mapped, so readers only touch the pages of the columns and rows they use,
+and writers can append chunk by chunk without holding the full frame.
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import json
+import six
+import datetime
+import numpy as np
+import pandas as pd
+from os.path import join as pjoin
+
+# Bumped whenever the on-disk layout changes incompatibly.
+FORMAT_VERSION = 1
+
+_SCHEMA_FILE = "_schema.json"
+_VALUES_EXT = ".values"    # Fixed-width data, or utf-8 bytes for strings
+_OFFSETS_EXT = ".offsets"  # int64 end offset of each string
+_MASK_EXT = ".mask"        # uint8 null flags for strings
+
+_FIXED = "fixed"
+_STRING = "string"
+
+
+def _column_kind(series):
+    """
+    Decide how a column is stored, returning a (kind, dtype string) pair.
+    Object columns holding only strings are stored as strings; any other
+    object column is stored as float64 if it can be converted (e.g. database
+    decimals), as datetime64 if it holds dates, and as the text of its values
+    otherwise (e.g. strings mixed with numbers).
+    """
+    if series.dtype.kind != 'O':
+        return _FIXED, series.dtype.str
+
+    values = series.dropna()
+    if all(isinstance(v, six.string_types) for v in values):
+        return _STRING, None
+
+    try:
+        values.astype(np.float64)
+        return _FIXED, np.dtype(np.float64).str
+    except (TypeError, ValueError):
+        pass
+
+    if all(isinstance(v, (datetime.date, np.datetime64)) for v in values):
+        return _FIXED, np.dtype('datetime64[ns]').str
+    return _STRING, None
+
+
+def _fixed_values(series, dtype):
+    """
+    Return the column as a contiguous array of dtype.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'M' and series.dtype.kind == 'O':
+        series = pd.to_datetime(series)
+    return np.ascontiguousarray(series.values.astype(dtype))
+
+
+def _encode(value):
+    """
+    Return the utf-8 bytes for a string value, or for the text of any other
+    value, e.g. a number in a later chunk of a column the first chunk fixed
+    as strings.
+    """
+    if not isinstance(value, six.string_types):
+        value = six.text_type(value)
+    if isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def _decode(value):
+    """
+    Return the native string for stored bytes.
+    """
+    if six.PY3:
+        return value.decode('utf-8')
+    return value
+
+
+class ColumnarWriter(object):
+    """
+    Appends DataFrame chunks to a columnar store. The column layout is fixed
+    by the first chunk.
+
+    Examples
+    --------
+        with ColumnarWriter(path) as writer:
+            for chunk in chunks:
+                writer.append(chunk)
+    """
+
+    def __init__(self, path, metadata=None):
+        """
+        Params
+        ------
+        path: Directory for the store. It is created if needed, and an
+        existing store there is replaced. A non-empty directory that is not a
+        store is refused rather than cleared.
+
+        metadata: Optional json-serializable dict saved with the schema.
+
+        Returns
+        -------
+        None.
+        """
+        self.path = path
+        self.metadata = metadata or {}
+        self.rows = 0
+        self._columns = None
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        existing = os.listdir(path)
+        if existing and _SCHEMA_FILE not in existing:
+            message = "Refusing to replace non-store directory {}"
+            raise ValueError(message.format(path))
+        for name in existing:
+            os.remove(pjoin(path, name))
+
+    def _file(self, position, ext):
+        return pjoin(self.path, "{}{}".format(position, ext))
+
+    def append(self, frame):
+        """
+        Write the rows of frame to the end of the store.
+        """
+        if self._columns is None:
+            self._columns = [
+                dict(zip(("name", "kind", "dtype"),
+                         (str(name),) + _column_kind(frame[name])))
+                for name in frame.columns
+            ]
+
+        names = [column["name"] for column in self._columns]
+        if [str(name) for name in frame.columns] != names:
+            message = "Chunk columns {} do not match store columns {}"
+            raise ValueError(message.format(list(frame.columns), names))
+
+        for position, column in enumerate(self._columns):
+            series = frame.iloc[:, position]
+
+            if column["kind"] == _FIXED:
+                values = _fixed_values(series, column["dtype"])
+                with open(self._file(position, _VALUES_EXT), 'ab') as out:
+                    values.tofile(out)
+                continue
+
+            mask = series.isnull().values
+            encoded = [b"" if null else _encode(value)
+                       for value, null in zip(series.values, mask)]
+            lengths = np.array([len(value) for value in encoded],
+                               dtype=np.int64)
+            start = self._string_bytes(position)
+            offsets = start + np.cumsum(lengths)
+
+            with open(self._file(position, _VALUES_EXT), 'ab') as out:
+                out.write(b"".join(encoded))
+            with open(self._file(position, _OFFSETS_EXT), 'ab') as out:
+                offsets.astype(np.int64).tofile(out)
+            with open(self._file(position, _MASK_EXT), 'ab') as out:
+                mask.astype(np.uint8).tofile(out)
+
+        self.rows += len(frame)
+        self._write_schema()
+
+    def _string_bytes(self, position):
+        """
+        Return the number of string bytes already written for a column.
+        """
+        path = self._file(position, _VALUES_EXT)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _write_schema(self):
+        """
+        Write the schema atomically so readers never see a partial one.
+        """
+        schema = {"version": FORMAT_VERSION,
+                  "rows": self.rows,
+                  "columns": self._columns,
+                  "metadata": self.metadata}
+
+        temp_path = pjoin(self.path, _SCHEMA_FILE + ".tmp")
+        with open(temp_path, 'w') as out:
+            json.dump(schema, out)
+        os.rename(temp_path, pjoin(self.path, _SCHEMA_FILE))
+
+    def close(self):
+        """
+        Finish the store. A store that received no chunks is left empty.
+        """
+        if self._columns is None:
+            self._columns = []
+            self._write_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ColumnarStore(object):
+    """
+    Read access to a store written by `ColumnarWriter`.
+    """
+
+    def __init__(self, path):
+        """
+        Params
+        ------
+        path: Directory of an existing store.
+
+        Returns
+        -------
+        None.
+        """
+        self.path = path
+        with open(pjoin(path, _SCHEMA_FILE)) as schema_file:
+            schema = json.load(schema_file)
+
+        if schema["version"] != FORMAT_VERSION:
+            message = "Store {} has format version {}, expected {}"
+            raise ValueError(message.format(path, schema["version"],
+                                            FORMAT_VERSION))
+
+        self.rows = schema["rows"]
+        self.metadata = schema["metadata"]
+        self._columns = schema["columns"]
+        self._positions = dict((column["name"], position)
+                               for position, column
+                               in enumerate(self._columns))
+
+    @property
+    def columns(self):
+        """
+        List of the stored column names.
+        """
+        return [column["name"] for column in self._columns]
+
+    def _file(self, position, ext):
+        return pjoin(self.path, "{}{}".format(position, ext))
+
+    def _map(self, position, ext, dtype):
+        """
+        Memory-map one column file, or return an empty array for no rows.
+        """
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(position, ext), dtype=dtype, mode='r',
+                         shape=(self.rows,))
+
+    def column(self, name, rows=None):
+        """
+        Return one column as an array.
+
+        Params
+        ------
+        name: The column name.
+
+        rows: Optional boolean mask or integer positions selecting rows. Only
+        the selected rows are decoded.
+
+        Returns
+        -------
+        A read-only memory-mapped array for fixed-width columns when rows is
+        None, otherwise an in-memory array.
+        """
+        position = self._positions[name]
+        column = self._columns[position]
+
+        if column["kind"] == _FIXED:
+            values = self._map(position, _VALUES_EXT, np.dtype(column["dtype"]))
+            return values if rows is None else np.asarray(values[rows])
+
+        ends = self._map(position, _OFFSETS_EXT, np.int64)
+        mask = self._map(position, _MASK_EXT, np.uint8)
+        starts = np.concatenate(([0], ends[:-1])) if self.rows else ends
+        indices = np.arange(self.rows)
+        if rows is not None:
+            indices = indices[rows]
+
+        data = np.memmap(self._file(position, _VALUES_EXT), dtype=np.uint8,
+                         mode='r') if self.rows and ends[-1] else b""
+        values = np.empty(len(indices), dtype=object)
+        for out, index in enumerate(indices):
+            if mask[index]:
+                values[out] = None
+            else:
+                raw = data[starts[index]:ends[index]]
+                values[out] = _decode(bytes(bytearray(raw)))
+        return values
+
+    def to_frame(self, columns=None, rows=None):
+        """
+        Materialize the selected columns and rows as a DataFrame.
+        """
+        columns = self.columns if columns is None else columns
+        data = dict((name, self.column(name, rows)) for name in columns)
+        return pd.DataFrame(data, columns=columns)
+
+
+def write_frame(path, frame, metadata=None):
+    """
+    Write a whole DataFrame as a columnar store at path.
+    """
+    with ColumnarWriter(path, metadata=metadata) as writer:
+        writer.append(frame)
+    return path
+
+
+def read_frame(path, columns=None):
+    """
+    Read a columnar store at path into a DataFrame.
+    """
+    return ColumnarStore(path).to_frame(columns=columns)
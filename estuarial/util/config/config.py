@@ -1,5 +1,8 @@
 import os
 import six
+import shutil
+import logging
+import threading
 from os.path import dirname
 from os.path import join as pjoin
 from six.moves import configparser
@@ -23,6 +26,42 @@ UserConfigPath = pjoin(expanduser('~'), '.estuarial', 'estuarial.ini')
 UserConfigDir = pjoin(expanduser('~'), '.estuarial')
 EstuarialConfigLocations.insert(0, UserConfigPath)
 
+# Catalog config copied to the user directory for local changes.
+DatalibDir = pjoin(dirname(__file__), '..', '..', 'data', 'catalog',
+                   'SQL_DATA', 'datalib')
+
+_user_config_ready = False
+_user_config_lock = threading.Lock()
+
+
+def ensure_user_config():
+    """
+    Copy the catalog config and the default estuarial.ini into ~/.estuarial
+    the first time they are needed, i.e. when the first array client is
+    constructed, rather than when estuarial is imported. Each is copied if
+    it is missing, even when the directory already holds other files such
+    as logs or caches.
+
+    On a read-only home directory a warning is logged and the packaged
+    defaults are used.
+    """
+    global _user_config_ready
+    if _user_config_ready:
+        return
+    with _user_config_lock:
+        if _user_config_ready:
+            return
+        try:
+            datalib = pjoin(UserConfigDir, 'datalib')
+            if not os.path.exists(datalib):
+                shutil.copytree(DatalibDir, datalib)
+            if not os.path.exists(UserConfigPath):
+                shutil.copyfile(EstuarialConfigPath, UserConfigPath)
+        except (IOError, OSError) as error:
+            logging.getLogger('estuarial').warning(
+                "Could not create %s: %s", UserConfigDir, error)
+        _user_config_ready = True
+
 class Config(configparser.SafeConfigParser):
 
     def __init__(self, path=None,):
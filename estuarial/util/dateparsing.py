@@ -48,7 +48,7 @@ def check_end(dates):
         start,stop = dates
 
         if stop == 9223372036854775807 or stop == None:
-            now = datetime.datetime.utcnow().strftime('%Y-%m-%d')
+            now = dt.datetime.utcnow().strftime('%Y-%m-%d')
             return [start,now]
         else:
             return [start,stop]
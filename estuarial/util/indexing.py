@@ -1,19 +1,181 @@
+import six
+import time
 import datetime
+import threading
+import numpy as np
+import pandas as pd
+from collections import namedtuple
 from sqlalchemy.sql import column, and_, or_
 from estuarial.array.arraymanagementclient import ArrayManagementClient
+from estuarial.array.execution import date_column, select_in
+from estuarial.array.execution import date_range_condition
+from estuarial.array.interval_cache import (select_in_range, _frame_column,
+                                            merge_intervals,
+                                            missing_intervals, _RESOLUTION)
+from estuarial.util.config.config import Config
 from estuarial.util.dateparsing import check_date
 
+_WORLDSCOPE_URL = '/FUNDAMENTALS/WORLDSCOPE/worldscope_fundamentals.yaml'
+_RKD_URL = '/FUNDAMENTALS/RKD/rkd_fundamentals.yaml'
+_RKD_CODES_URL = '/ENTITYMANAGEMENT/seccode_to_rkd_code.yaml'
+
+class MetricSource(namedtuple('MetricSource', ['name', 'url', 'item_column',
+                                               'member_column', 'conditions',
+                                               'catalog', 'members'])):
+    """
+    A query of item values over universe members, e.g. Worldscope.
+
+    url is the yaml query, item_column the column the item codes apply to
+    and member_column the conditional the universe members apply to.
+    conditions maps further columns to the values they must equal, catalog
+    names the item catalog (see `metrics_manager.metric_names`) resolving
+    item names, and members, if not None, maps
+    `members(aclient, seccodes)` to the values of member_column.
+    """
+    __slots__ = ()
+
+_sources = {}
+_metrics = {}
+_registry_lock = threading.Lock()
+
+def register_source(name, url, item_column, member_column='seccode',
+                    conditions=None, catalog=None, members=None):
+    """
+    Register the item query `name`, replacing any of the same name. See
+    `MetricSource` for the arguments.
+    """
+    source = MetricSource(name, url, item_column, member_column,
+                          dict(conditions or {}), catalog, members)
+    with _registry_lock:
+        _sources[name] = source
+    return source
+
+def register_metric(name, item, source='worldscope'):
+    """
+    Register item of source as the metric `name`, available as
+    `universe.<name>[start:stop]` and in `universe.metrics[...]`.
+    """
+    with _registry_lock:
+        if source not in _sources:
+            raise KeyError("Unknown metric source '{}'".format(source))
+        _metrics[name] = (source, item)
+
+def registered_metrics():
+    """
+    Return {name: (source name, item)} of the registered metrics.
+    """
+    with _registry_lock:
+        return dict(_metrics)
+
+def resolve_metric(name):
+    """
+    Return the (source, item) of a metric: a registered name, an item name
+    of a source's catalog (e.g. 'Cash__Short_Term_Investments'), or a
+    (source name, item) pair.
+    """
+    with _registry_lock:
+        if isinstance(name, tuple):
+            source_name, item = name
+            return _sources[source_name], item
+        if name in _metrics:
+            source_name, item = _metrics[name]
+            return _sources[source_name], item
+        sources = [_sources[key] for key in sorted(_sources)]
+
+    # Imported here as the metrics manager needs the array backend.
+    from estuarial.browse.metrics_manager import metric_names
+    for source in sources:
+        if source.catalog is not None:
+            names = metric_names(source.catalog)
+            if name in names:
+                return source, names[name]
+    raise KeyError("Unknown metric '{}'".format(name))
+
+def _rkd_codes(aclient, seccodes):
+    """
+    Return the RKD codes of the seccodes.
+    """
+    codes = select_in(aclient, _RKD_CODES_URL, 'seccode', seccodes)
+    if not len(codes):
+        return []
+    codes = codes[_frame_column(codes, 'rkd_code')].dropna()
+    return sorted(set(int(code) for code in codes))
+
+register_source('worldscope', _WORLDSCOPE_URL, 'item',
+                conditions={'freq': 'Q'}, catalog='worldscope')
+register_source('rkd', _RKD_URL, 'coa', member_column='code',
+                catalog='rkd', members=_rkd_codes)
+
+register_metric('cash', 2001)
+register_metric('ni', 1751)
+
 # the supported metrics
 def get_metrics_list():
-    return [('ohlc', _OHLCIndexer),
-            ('cash', _CASHIndexer),
-            ('ni', _NIIndexer)]
+    return ([('ohlc', _OHLCIndexer)] +
+            [(name, _MetricIndexer) for name in sorted(registered_metrics())])
 
 class _TRUniverseIndexer(ArrayManagementClient):
+    """
+    Date-sliced access to a query over the members of a universe, e.g.
+    universe.ohlc['2013-01-01':'2014-01-01'].
+
+    Queries marked `cached`, i.e. prices, go through the interval cache, so
+    slicing within an earlier window is answered locally and widening it
+    only queries the added dates. For other queries, i.e. fundamentals, the
+    indexer keeps the rows it has fetched in memory with the date ranges
+    they cover: a slice within them is answered in memory and an
+    overlapping slice only queries the dates not yet fetched. As
+    fundamentals are restated and reported late, the kept rows are dropped
+    once they are older than `SliceCacheAge` seconds, and they are not kept
+    beyond `SliceCacheRows` rows. They are also dropped when the universe's
+    seccodes change, or by `clear`.
+    """
+
+    url = None
+    member_column = 'seccode'
+    # Whether the query goes through the interval cache (see
+    # `select_in_range`).
+    cached = False
+
+    # Defaults for the 'SliceCacheRows' and 'SliceCacheAge' (seconds) entries
+    # of the ESTUARIAL section of estuarial.ini.
+    _DEFAULT_SLICE_ROWS = 1000000
+    _DEFAULT_SLICE_AGE = 3600
 
     def __init__(self, obj, name):
         self.obj = obj
         self.name = name
+        config = Config()
+        self.max_rows = int(config.get('ESTUARIAL', 'SliceCacheRows',
+                                       self._DEFAULT_SLICE_ROWS))
+        self.max_age = float(config.get('ESTUARIAL', 'SliceCacheAge',
+                                        self._DEFAULT_SLICE_AGE))
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Forget the universe members, e.g. the RKD codes looked up for them,
+        and the rows kept in memory.
+        """
+        self._seccodes = None
+        self._members = None
+        self._forget()
+
+    def _forget(self):
+        """
+        Drop the rows kept in memory.
+        """
+        self._rows = None
+        self._covered = []
+        self._fetched_at = None
+
+    def conditions(self, arr):
+        """
+        Return the alchemy conditions, besides members and dates, of the
+        query at `url`.
+        """
+        return []
 
     def _check_end(self,stop):
         '''[X:] results in the two following possibilities'''
@@ -24,79 +186,193 @@ class _TRUniverseIndexer(ArrayManagementClient):
         else:
             return stop
 
+    def _universe(self):
+        """
+        Return the universe members as a list, recomputed only when the
+        universe's seccodes change.
+        """
+        seccodes = self.obj.seccodes
+        if seccodes is not self._seccodes:
+            self.clear()
+            self._seccodes = seccodes
+            self._members = seccodes.tolist()
+        return self._members
+
+    def _select(self, members, start, stop):
+        """
+        Query the rows of members between start and stop.
+        """
+        aclient = self.obj.aclient
+        arr = aclient[self.url]
+        conditions = self.conditions(arr)
+        if self.cached:
+            return select_in_range(aclient, self.url, self.member_column,
+                                   members, start, stop,
+                                   conditions=conditions, cached=True)
+
+        # Bypass the array backend's own caches as well.
+        conditions.append(date_range_condition(
+            arr, {"date_1": start, "date_2": stop}))
+        return select_in(aclient, self.url, self.member_column, members,
+                         conditions=conditions, direct=True)
+
+    def _kept(self, members, start, stop, date_name):
+        """
+        Return the rows between start and stop from the rows kept in
+        memory, querying only the dates they do not cover. Callers hold the
+        lock.
+        """
+        if (self._fetched_at is not None and
+                time.time() - self._fetched_at > self.max_age):
+            self._forget()
+
+        gaps = missing_intervals(self._covered, start, stop)
+        if gaps:
+            fetched = [self._select(members, gap_start, gap_end)
+                       for gap_start, gap_end in gaps]
+            self._merge([rows for rows in fetched if len(rows.columns)],
+                        gaps, date_name)
+        rows = self._rows
+        if rows is None:
+            return pd.DataFrame()
+        if len(rows) > self.max_rows:
+            self._forget()
+
+        dates = rows[_frame_column(rows, date_name)]
+        within = ((dates >= start) & (dates <= stop)).values
+        return rows[within].reset_index(drop=True)
+
+    def _merge(self, fetched, gaps, date_name):
+        """
+        Add the rows fetched over gaps to the kept rows, replacing kept rows
+        within the gaps (e.g. a partial today), ordered by member and date.
+        """
+        frames = fetched
+        if self._rows is not None:
+            dates = self._rows[_frame_column(self._rows, date_name)]
+            stale = np.zeros(len(dates), dtype=bool)
+            for start, stop in gaps:
+                stale |= ((dates >= start) & (dates <= stop)).values
+            frames = [self._rows[~stale]] + fetched
+
+        if frames:
+            rows = pd.concat(frames, ignore_index=True)
+            date_col = _frame_column(rows, date_name)
+            rows[date_col] = pd.to_datetime(rows[date_col])
+            members = rows[_frame_column(rows, self.member_column)]
+            order = np.lexsort([rows[date_col].values, members.values])
+            self._rows = rows.take(order).reset_index(drop=True)
+        if self._fetched_at is None:
+            self._fetched_at = time.time()
+
+        # Data for today may still be arriving, so do not mark it covered.
+        horizon = pd.Timestamp(datetime.date.today()) - _RESOLUTION
+        gaps = [(start, min(stop, horizon))
+                for start, stop in gaps if start <= horizon]
+        self._covered = merge_intervals(self._covered + gaps)
+
     def __getitem__(self, index):
         if isinstance(index, slice):
-            start = index.start
-            stop = inde.stop
-            start, stop = check_date([start,stop])
-            return start, stop
+            start, stop = check_date([index.start, index.stop])
+            start, stop = pd.Timestamp(start), pd.Timestamp(stop)
+            date_name = date_column(self.obj.aclient[self.url])
+
+            with self._lock:
+                members = self._universe()
+                if not self.cached:
+                    return self._kept(members, start, stop, date_name)
+            rows = self._select(members, start, stop)
+            if not len(rows):
+                return rows
+
+            date_col = _frame_column(rows, date_name)
+            rows[date_col] = pd.to_datetime(rows[date_col])
+            members = rows[_frame_column(rows, self.member_column)]
+            order = np.lexsort([rows[date_col].values, members.values])
+            return rows.take(order).reset_index(drop=True)
         else:
             raise TypeError("index must be datetime slice")
 
 class _OHLCIndexer(_TRUniverseIndexer):
 
-    def __getitem__(self, index):
-        if isinstance(index, slice):
-            start = index.start
-            stop = (index.stop)
-
-            start,stop = check_date([start,stop])
-
-            universe = self.obj.data.seccode.tolist()
-            arr = self.obj.aclient['/DATASTREAM/ohlc.yaml']
-            ohlc = arr.select(and_(arr.seccode.in_(universe)),
-                               date_1 = start,
-                               date_2 = stop,
-                               )
-            return ohlc
-        else:
-            raise TypeError("index must be datetime slice")
+    url = '/DATASTREAM/ohlc.yaml'
+    cached = True
 
-class _CASHIndexer(_TRUniverseIndexer):
+class _MetricIndexer(_TRUniverseIndexer):
+    """
+    Items of one `MetricSource`, fetched by a single `IN` query, e.g.
+    universe.cash['2013-01-01':'2014-01-01'] or
+    universe.metrics['cash', 'ni'][start:stop].
+    """
 
-    def __getitem__(self, index):
-        if isinstance(index, slice):
-            start = index.start
-            stop = (index.stop)
-
-            start,stop = check_date([start,stop])
-
-            universe = self.obj.data.seccode.tolist()
-            item = 2001 # cash
-            freq = 'Q'  # Quarterly Maybe use step for this?
-            ws_query_loc = '/FUNDAMENTALS/WORLDSCOPE/worldscope_fundamentals.yaml'
-            arr = self.obj.aclient[ws_query_loc]
-
-            cash = arr.select(and_(arr.seccode.in_(universe),
-                                   arr.item == item,
-                                   arr.freq == freq
-                                  ),
-                               date_1 = start,
-                               date_2 = stop
-                             )
-            return cash
+    def __init__(self, obj, name, source=None, items=None):
+        if source is None:
+            source, item = resolve_metric(name)
+            items = [item]
+        self.source = source
+        self.items = sorted(set(items))
+        self.url = source.url
+        self.member_column = source.member_column
+        super(_MetricIndexer, self).__init__(obj, name)
+
+    def conditions(self, arr):
+        item = getattr(arr, self.source.item_column)
+        if len(self.items) == 1:
+            conditions = [item == self.items[0]]
         else:
-            raise TypeError("index must be datetime slice")
+            conditions = [item.in_(self.items)]
+        for name, value in sorted(self.source.conditions.items()):
+            conditions.append(getattr(arr, name) == value)
+        return conditions
+
+    def _universe(self):
+        if self.obj.seccodes is not self._seccodes:
+            members = super(_MetricIndexer, self)._universe()
+            if self.source.members is not None:
+                self._members = self.source.members(self.obj.aclient,
+                                                    members)
+        return self._members
+
+class _MetricSelector(object):
+    """
+    universe.metrics[name, ...] returns one indexer per source for the
+    metrics, so that metrics of the same source are fetched together. Names
+    are as accepted by `resolve_metric`, e.g.
+    universe.metrics['cash', 'ni', ('rkd', 'SREV')].
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+        self._indexers = {}
+
+    def __getitem__(self, names):
+        if isinstance(names, six.string_types):
+            names = [names]
 
-class _NIIndexer(_TRUniverseIndexer):
+        by_source = {}
+        for name in names:
+            source, item = resolve_metric(name)
+            by_source.setdefault(source.name, (source, set()))[1].add(item)
+        indexers = []
+        for key in sorted(by_source):
+            source, items = by_source[key]
+            key = (key, tuple(sorted(items)))
+            if key not in self._indexers:
+                self._indexers[key] = _MetricIndexer(
+                    self.obj, source.name, source, items)
+            indexers.append(self._indexers[key])
+        if len(indexers) == 1:
+            return indexers[0]
+        return _CombinedIndexer(indexers)
+
+class _CombinedIndexer(object):
+    """
+    Slices several indexers, concatenating their rows.
+    """
+
+    def __init__(self, indexers):
+        self.indexers = indexers
 
     def __getitem__(self, index):
-        if isinstance(index, slice):
-            start = index.start
-            stop = (index.stop)
-
-            start,stop = check_date([start,stop])
-            universe = self.obj.data.seccode.tolist()
-            item = 1751 # net income
-            freq = 'Q'  # Quarterly Maybe use step for this?
-            ni_query_loc = '/FUNDAMENTALS/WORLDSCOPE/worldscope_fundamentals.yaml'
-            arr = self.obj.aclient[ni_query_loc]
-            cash = arr.select(and_(arr.seccode.in_(universe),
-                                   arr.item == item,
-                                   arr.freq == freq,),
-                               date_1 = start,
-                               date_2 = stop,
-                             )
-            return cash
-        else:
-            raise TypeError("index must be datetime slice")
+        return pd.concat([indexer[index] for indexer in self.indexers],
+                         ignore_index=True)
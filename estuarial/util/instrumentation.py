@@ -0,0 +1,272 @@
+"""
+Instrumentation of the query path.
+
+Queries report how long each phase of their work took as `Event`s: client
+construction, SQL compilation, database execution, fetching rows, building
+the DataFrame and result cache lookups. Events go to the callbacks registered
+with `instruments.subscribe`, and to an in-memory table of rolling statistics
+once `instruments.enable_stats` is called. Nothing is timed while there is
+neither.
+
+    instruments.enable_stats()
+    df = RAW_QUERY().raw_query("select * from wsitem")
+    print(instruments.stats.table())
+
+Author: Ben Zaitlen and Ely Spears
+"""
+from __future__ import print_function, division, absolute_import
+
+import time
+import logging
+import threading
+import collections
+import numpy as np
+import pandas as pd
+from timeit import default_timer
+
+# Phases reported by the query path.
+CLIENT = "client"          # Acquiring the pooled array client.
+COMPILE = "compile"        # Building the WHERE clause and cache key.
+EXECUTE = "execute"        # Sending the statement to the database.
+FETCH = "fetch"            # Pulling the result rows.
+FRAME = "frame"            # Building the DataFrame from the rows.
+SELECT = "select"          # An array node select: execute, fetch and frame
+                           # inside the array backend, not separable.
+CACHE_HIT = "cache_hit"    # Reading a result from the result cache.
+CACHE_MISS = "cache_miss"  # Looking up a result that was not cached.
+CACHE_WRITE = "cache_write"
+CALL = "call"              # A whole call, including all of the above.
+
+class Event(collections.namedtuple(
+        "Event", ["query", "phase", "start", "seconds", "rows", "nbytes"])):
+    """
+    One timed phase of a query.
+
+    query: String naming the query, e.g. its yaml url or 'raw_query'.
+
+    phase: One of the phase names of this module.
+
+    start: Wall-clock time at which the phase began, as from `time.time`.
+
+    seconds: Duration of the phase.
+
+    rows: Number of rows involved, or None when not known.
+
+    nbytes: Size in bytes of the data involved, or None when not known.
+    """
+    __slots__ = ()
+
+
+log = logging.getLogger('estuarial')
+
+
+def frame_bytes(frame):
+    """
+    Return the size in bytes of the columns and index of a DataFrame. Object
+    columns count their pointers only, not the objects referenced.
+    """
+    return (frame.index.values.nbytes +
+            sum(frame[column].values.nbytes for column in frame.columns))
+
+
+def log_event(event):
+    """
+    Callback writing events to the estuarial logger at debug level.
+    """
+    log.debug("%s %s %.1fms rows=%s bytes=%s", event.query, event.phase,
+              1000 * event.seconds, event.rows, event.nbytes)
+
+
+class RollingStats(object):
+    """
+    Statistics of the last `window` events of each (query, phase) pair.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._events = {}
+        self._counts = collections.Counter()
+
+    def add(self, event):
+        key = (event.query, event.phase)
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                events = self._events[key] = collections.deque(
+                    maxlen=self.window)
+            events.append(event)
+            self._counts[key] += 1
+
+    def table(self):
+        """
+        Return a DataFrame indexed by query and phase with the total number of
+        events and, over the window, their mean, median, 95th percentile and
+        maximum duration in milliseconds, their share of the window's time
+        spent in the query's phases, and their total rows and bytes.
+        """
+        with self._lock:
+            snapshot = [(key, list(events), self._counts[key])
+                        for key, events in self._events.items()]
+
+        columns = ["count", "mean_ms", "p50_ms", "p95_ms", "max_ms", "share",
+                   "rows", "bytes"]
+        records, index = [], []
+        for (query, phase), events, count in sorted(snapshot):
+            milliseconds = 1000 * np.array([event.seconds for event in events])
+            records.append([
+                count, milliseconds.mean(), np.percentile(milliseconds, 50),
+                np.percentile(milliseconds, 95), milliseconds.max(),
+                milliseconds.sum(),
+                sum(event.rows or 0 for event in events),
+                sum(event.nbytes or 0 for event in events)])
+            index.append((query, phase))
+
+        if not records:
+            return pd.DataFrame(columns=columns)
+        table = pd.DataFrame(records, columns=columns,
+                             index=pd.MultiIndex.from_tuples(
+                                 index, names=["query", "phase"]))
+
+        # Whole calls contain the other phases, so leave them out of the
+        # shares, which then say where the time of a query goes.
+        phases = table.index.get_level_values("phase") != CALL
+        queries = table.index.get_level_values("query")
+        totals = table["share"][phases].groupby(queries[phases]).sum()
+        table["share"] = [share / totals[query] if is_phase and totals[query]
+                          else np.nan for share, query, is_phase
+                          in zip(table["share"], queries, phases)]
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._counts.clear()
+
+
+class _Span(object):
+    """
+    Context manager timing one phase. Set `rows` and `nbytes`, or call
+    `measure` on the resulting frame, inside the block to report them. The
+    phase may also be changed inside the block, e.g. once a cache lookup
+    turns out to be a hit.
+    """
+    __slots__ = ("instrumentation", "query", "phase", "rows", "nbytes",
+                 "_start", "_timer")
+
+    def __init__(self, instrumentation, query, phase):
+        self.instrumentation = instrumentation
+        self.query = query
+        self.phase = phase
+        self.rows = None
+        self.nbytes = None
+        self._timer = None
+
+    def __enter__(self):
+        if self.instrumentation.active:
+            self._start = time.time()
+            self._timer = default_timer()
+        return self
+
+    def measure(self, frame):
+        """
+        Report the rows and bytes of frame, when the phase is being timed.
+        Returns frame.
+        """
+        if self._timer is not None:
+            self.rows = len(frame)
+            self.nbytes = frame_bytes(frame)
+        return frame
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._timer is not None and exc_type is None:
+            self.instrumentation.emit(Event(
+                self.query, self.phase, self._start,
+                default_timer() - self._timer, self.rows, self.nbytes))
+
+
+class Instrumentation(object):
+    """
+    Dispatches query events to registered callbacks and the optional rolling
+    statistics.
+
+    Callbacks are called synchronously in the thread running the query, so
+    they should be quick. Exceptions raised by a callback are logged and
+    otherwise ignored.
+
+    Examples
+    --------
+        events = []
+        instruments.subscribe(events.append)
+        with instruments.span('/DATASTREAM/ohlc.yaml', FETCH) as span:
+            rows = cursor.fetchall()
+            span.rows = len(rows)
+        instruments.unsubscribe(events.append)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = ()
+        self.stats = None
+
+    @property
+    def active(self):
+        """
+        Whether events are being recorded at all.
+        """
+        return bool(self._callbacks) or self.stats is not None
+
+    def subscribe(self, callback):
+        """
+        Call callback with every `Event` from now on. Returns callback.
+        """
+        with self._lock:
+            self._callbacks = self._callbacks + (callback,)
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        Stop calling callback. Unknown callbacks are ignored.
+        """
+        with self._lock:
+            self._callbacks = tuple(registered for registered
+                                    in self._callbacks
+                                    if registered != callback)
+
+    def enable_stats(self, window=1000):
+        """
+        Start collecting rolling statistics over the last window events of
+        each query and phase, replacing any collected so far.
+
+        Returns
+        -------
+        The `RollingStats`, also available as `stats`.
+        """
+        self.stats = RollingStats(window)
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
+    def span(self, query, phase):
+        """
+        Return a context manager timing phase of query.
+        """
+        return _Span(self, query, phase)
+
+    def emit(self, event):
+        """
+        Send event to the statistics and every callback.
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.add(event)
+        for callback in self._callbacks:
+            try:
+                callback(event)
+            except Exception:
+                log.exception("Instrumentation callback %r failed", callback)
+
+
+# The process-wide instrumentation used by the query path.
+instruments = Instrumentation()
@@ -1,36 +1,45 @@
 import os
-import shutil
 import logging
 import datetime
-import estuarial
-import estuarial.data as etdata
-from . import config as etconfig
+from .config.config import UserConfigDir
 
 from os.path import join as pjoin
-from os.path import dirname, split, realpath, exists
 
 log = logging.getLogger('estuarial')
 log.setLevel(logging.DEBUG)
 
-USER = os.path.expanduser('~')
-ESTUARIAL_DIR = pjoin(USER, '.estuarial')
+ESTUARIAL_DIR = UserConfigDir
 ESTUARIAL_LOG_DIR = pjoin(ESTUARIAL_DIR, 'estuarial-logs')
-now = datetime.datetime.utcnow().strftime('%Y-%m-%d')
 
-datalibdir = pjoin(dirname(etdata.__file__), 'catalog', 'SQL_DATA', 'datalib')
 
-if not os.path.exists(ESTUARIAL_DIR):
-    shutil.copytree(datalibdir, pjoin(ESTUARIAL_DIR, 'datalib'))
-    shutil.copyfile(pjoin(dirname(etconfig.__file__), 'estuarial.ini'),
-                    pjoin(ESTUARIAL_DIR,'estuarial.ini'))
-
-if not os.path.exists(ESTUARIAL_LOG_DIR):
-    os.makedirs(ESTUARIAL_LOG_DIR)
-
-DEBUG_FILE = pjoin(ESTUARIAL_LOG_DIR, 'estuarial-%s.log' % (now))
+class DailyFileHandler(logging.FileHandler):
+    """
+    File handler writing to estuarial-<utc date>.log in ESTUARIAL_LOG_DIR.
+    The directory and file are only created when the first record is
+    written, so importing estuarial touches no files. On a read-only home
+    directory records go to the console only.
+    """
+
+    def __init__(self):
+        logging.FileHandler.__init__(self, self.path(), delay=True)
+
+    @staticmethod
+    def path():
+        now = datetime.datetime.utcnow().strftime('%Y-%m-%d')
+        return pjoin(ESTUARIAL_LOG_DIR, 'estuarial-%s.log' % (now))
+
+    def _open(self):
+        self.baseFilename = os.path.abspath(self.path())
+        try:
+            if not os.path.exists(ESTUARIAL_LOG_DIR):
+                os.makedirs(ESTUARIAL_LOG_DIR)
+            return logging.FileHandler._open(self)
+        except (IOError, OSError):
+            self.setLevel(logging.CRITICAL + 1)
+            return open(os.devnull, self.mode)
 
 #create file handler which logs even debug messages
-fh = logging.FileHandler(DEBUG_FILE)
+fh = DailyFileHandler()
 fh.setLevel(logging.DEBUG)
 
 # create console handler with a higher log level
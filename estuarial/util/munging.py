@@ -1,9 +1,79 @@
 import numpy as np
+import pandas as pd
 from dateutil.relativedelta import relativedelta
 
-# Helper function to align worldscope data wih possibly 
+def _is_nan_object(series):
+    """
+    Boolean mask of the cells that hold the `np.nan` object itself, which is
+    what the `is np.nan` checks of the row-wise alignment test for.
+    """
+    return np.array([value is np.nan for value in series.values], dtype=bool)
+
+def _shift_months(dates, months):
+    """
+    Add a per-row number of months to dates, clamping to month ends as
+    `relativedelta` does. One vectorized offset is applied per distinct
+    month count, of which Worldscope sequences only produce a handful.
+
+    Returns an object array of Timestamps.
+    """
+    dates = np.asarray(dates, dtype=object)
+    months = np.asarray(months)
+    shifted = np.empty(len(dates), dtype=object)
+    for count in np.unique(months):
+        rows = (months == count)
+        offset_dates = (pd.DatetimeIndex(dates[rows]) +
+                        pd.DateOffset(months=int(count)))
+        shifted[rows] = offset_dates.astype(object).values
+    return shifted
+
+# Helper function to align worldscope data wih possibly
 # different reporting dates.
 def worldscope_align(df):
+    """
+    Fill missing report dates (ddate) of Worldscope rows.
+
+    Rows with a fiscal year end (fdate) get ddate shifted back from fdate by
+    4 - seq months; these rows also set the "last fiscal year" carried
+    forward, in row order, to later rows that have neither date, which get
+    that fiscal year end plus 3 * seq months.
+
+    Gives the same output as the original row-by-row loop (kept as
+    `_worldscope_align_rowwise`), including treating only cells holding the
+    `np.nan` object as missing.
+    """
+    ddate_missing = _is_nan_object(df['ddate'])
+    fdate_missing = _is_nan_object(df['fdate'])
+
+    has_fiscal = ddate_missing & ~fdate_missing
+    no_dates = ddate_missing & fdate_missing
+
+    seq = df['seq'].values
+    if not np.in1d(seq[has_fiscal], range(1, 5)).all():
+        raise AssertionError("Worldscope seq must be in 1..4 to align ddate.")
+
+    # Last fiscal year end seen so far, carried forward in row order.
+    fiscal = np.empty(len(df), dtype=object)
+    fiscal[has_fiscal] = df['fdate'].values[has_fiscal]
+    last_fisc_yr = pd.Series(fiscal).fillna(method='ffill').values
+
+    if pd.isnull(last_fisc_yr[no_dates]).any():
+        raise ValueError("Found rows without ddate or fdate before any row "
+                         "with a fiscal year end to align them to.")
+
+    if has_fiscal.any():
+        df.loc[has_fiscal, 'ddate'] = _shift_months(
+            df['fdate'].values[has_fiscal], -1 * (4 - seq[has_fiscal]))
+    if no_dates.any():
+        df.loc[no_dates, 'ddate'] = _shift_months(
+            last_fisc_yr[no_dates], 3 * seq[no_dates])
+    return df
+
+def _worldscope_align_rowwise(df):
+    """
+    Original row-by-row implementation of `worldscope_align`, kept as the
+    reference for tests and benchmarks.
+    """
     for count, row in df.iterrows():
         if row['ddate'] is np.nan and row['fdate'] is not np.nan:
             assert row['seq'] in range(1, 5)
@@ -65,4 +65,5 @@ setup(name='estuarial',
                         'arraymanagement>0.0.1',
                         'pytables>=3.0.0',
                         'sqlalchemy>=0.9.1',
-                        'pyodbc>=3.0.7'])
+                        'pyodbc>=3.0.7',
+                        'futures'])